@@ -164,8 +164,10 @@ const AdminDashboard: React.FC<AdminDashboardProps> = ({ user, onLogout }) => {
     try {
       setLoading(true);
       if (editingEvent) {
-        // Update existing event
-        await apiService.updateEvent(editingEvent.event_id, eventData);
+        // Update existing event; a points change can also be applied to teams that already attended
+        const pointsChanged = eventData.points !== undefined && eventData.points !== editingEvent.points;
+        const retroactive = pointsChanged && confirm('Apply the points change to teams that already attended this event?');
+        await apiService.updateEvent(editingEvent.event_id, eventData, retroactive);
       } else {
         // Create new event
         const { event_name, points, secret_code } = eventData;
@@ -188,10 +190,11 @@ const AdminDashboard: React.FC<AdminDashboardProps> = ({ user, onLogout }) => {
 
   const handleDeleteEvent = async (eventId: string) => {
     if (!confirm('Are you sure you want to delete this event?')) return;
+    const retroactive = confirm('Also take back the points this event awarded to teams that attended?');
     
     try {
       setLoading(true);
-      await apiService.deleteEvent(eventId);
+      await apiService.deleteEvent(eventId, retroactive);
       await loadEvents(); // Refresh the events list
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to delete event');
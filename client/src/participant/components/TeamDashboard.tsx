@@ -15,6 +15,12 @@ interface Team {
   }>;
   points: number;
   events_participated: Array<any>;
+  participated_events?: Array<{
+    event_id: string;
+    event_name: string;
+    points: number;
+    scanned_at: string | null;
+  }>;
   qr_id?: string;
   join_code?: string;
 }
@@ -303,14 +309,27 @@ const TeamDashboard: React.FC<TeamDashboardProps> = ({ team, onTeamLeft }) => {
         <div className="bg-slate-900/50 border border-slate-800 rounded-2xl p-6">
           <h3 className="text-xl font-bold mb-4">Events Participated</h3>
           <div className="space-y-2">
-            {team.events_participated.map((event: any, index: number) => (
-              <div
-                key={index}
-                className="p-3 bg-slate-800/30 rounded-lg border border-slate-700/50 text-slate-300"
-              >
-                {typeof event === "string" ? event : event.event || "Unknown Event"}
-              </div>
-            ))}
+            {team.participated_events
+              ? team.participated_events.map((event, index) => (
+                  <div
+                    key={index}
+                    className="p-3 bg-slate-800/30 rounded-lg border border-slate-700/50 text-slate-300 flex justify-between"
+                  >
+                    <span>{event.event_name}</span>
+                    <span className="text-slate-400">
+                      +{event.points} pts
+                      {event.scanned_at && ` · ${new Date(event.scanned_at + "Z").toLocaleString()}`}
+                    </span>
+                  </div>
+                ))
+              : team.events_participated.map((event: any, index: number) => (
+                  <div
+                    key={index}
+                    className="p-3 bg-slate-800/30 rounded-lg border border-slate-700/50 text-slate-300"
+                  >
+                    {typeof event === "string" ? event : event.event || "Unknown Event"}
+                  </div>
+                ))}
           </div>
         </div>
       )}
@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useState, useRef } from "react";
 import { UserPlus, Users } from "lucide-react";
 
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL || "";
@@ -13,6 +13,8 @@ const TeamJoinCreate: React.FC<TeamJoinCreateProps> = ({ onTeamCreated }) => {
   const [joinCode, setJoinCode] = useState("");
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
+  // Reused when a join is resubmitted after a network error so the server replays the first result
+  const joinAttemptRef = useRef<{ code: string; key: string } | null>(null);
 
   const handleCreateTeam = async (e: React.FormEvent) => {
     e.preventDefault();
@@ -44,6 +46,15 @@ const TeamJoinCreate: React.FC<TeamJoinCreateProps> = ({ onTeamCreated }) => {
     }
   };
 
+  const joinAttemptKey = () => {
+    let attempt = joinAttemptRef.current;
+    if (!attempt || attempt.code !== joinCode) {
+      attempt = { code: joinCode, key: crypto.randomUUID() };
+      joinAttemptRef.current = attempt;
+    }
+    return attempt.key;
+  };
+
   const handleJoinTeam = async (e: React.FormEvent) => {
     e.preventDefault();
     setLoading(true);
@@ -54,12 +65,14 @@ const TeamJoinCreate: React.FC<TeamJoinCreateProps> = ({ onTeamCreated }) => {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          "Idempotency-Key": joinAttemptKey(),
         },
         credentials: "include",
         body: JSON.stringify({ join_code: joinCode }),
       });
 
       const data = await response.json();
+      joinAttemptRef.current = null;
 
       if (response.ok) {
         onTeamCreated(data.team);
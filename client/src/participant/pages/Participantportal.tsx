@@ -17,6 +17,12 @@ interface Team {
   }>;
   points: number;
   events_participated: Array<any>;
+  participated_events?: Array<{
+    event_id: string;
+    event_name: string;
+    points: number;
+    scanned_at: string | null;
+  }>;
   qr_id?: string;
   join_code?: string;
 }
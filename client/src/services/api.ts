@@ -213,7 +213,8 @@ class ApiService {
       points?: number;
       expired?: boolean;
       secret_code?: string;
-    }
+    },
+    retroactive = false
   ): Promise<{ message: string; event: Event }> {
     // Encrypt secret_code before sending to backend
     const dataToSend = { ...eventData };
@@ -221,7 +222,8 @@ class ApiService {
       dataToSend.secret_code = await encryptSecretCode(eventData.secret_code);
     }
     
-    const response = await this.makeRequest<{ message: string; event: Event }>(`/events/${eventId}`, {
+    const query = retroactive ? '?retroactive=true' : '';
+    const response = await this.makeRequest<{ message: string; event: Event }>(`/events/${eventId}${query}`, {
       method: 'PUT',
       body: JSON.stringify(dataToSend),
     });
@@ -236,8 +238,9 @@ class ApiService {
     };
   }
 
-  async deleteEvent(eventId: string): Promise<{ message: string }> {
-    return this.makeRequest(`/events/${eventId}`, {
+  async deleteEvent(eventId: string, retroactive = false): Promise<{ message: string }> {
+    const query = retroactive ? '?retroactive=true' : '';
+    return this.makeRequest(`/events/${eventId}${query}`, {
       method: 'DELETE',
     });
   }
@@ -1,7 +1,7 @@
-import React, { useState, useRef } from "react";
+import React, { useState, useRef, useEffect } from "react";
 import { Scanner } from "@yudiel/react-qr-scanner";
 import { Camera, Hash } from "lucide-react";
-import { scanTeamQR } from "../utils/api";
+import { scanTeamQR, ScanChannel } from "../utils/api";
 
 interface QRScannerProps {
   eventToken: string;
@@ -16,6 +16,16 @@ const QRScanner: React.FC<QRScannerProps> = ({ eventToken, eventName }) => {
   const [manualId, setManualId] = useState("");
   const lastScanRef = useRef<string>("");
   const lastScanTimeRef = useRef<number>(0);
+  const channelRef = useRef<ScanChannel | null>(null);
+
+  useEffect(() => {
+    const channel = new ScanChannel(eventToken);
+    channelRef.current = channel;
+    return () => {
+      channelRef.current = null;
+      channel.close();
+    };
+  }, [eventToken]);
 
   const processTeamId = async (teamId: string) => {
     if (!teamId || loading) return;
@@ -31,8 +41,11 @@ const QRScanner: React.FC<QRScannerProps> = ({ eventToken, eventName }) => {
     setScanResult(teamId);
 
     try {
-      const res = await scanTeamQR(teamId, eventToken);
-      setMessage(`✅ ${res.message} | Team Points: ${res.team_points}`);
+      // Use the open WebSocket when there is one; plain HTTPS otherwise
+      const channel = channelRef.current;
+      const res = channel?.open ? await channel.scan(teamId) : await scanTeamQR(teamId, eventToken);
+      // Pending scans were journaled during a database outage and have no points total yet
+      setMessage(res.pending ? `✅ ${res.message}` : `✅ ${res.message} | Team Points: ${res.team_points}`);
       
       setTimeout(() => {
         lastScanRef.current = "";
@@ -5,7 +5,8 @@ const API_BASE = import.meta.env.VITE_API_URL || "http://localhost:8000/api";
 axios.defaults.withCredentials = true;
 
 export const getEvents = async () => {
-  const res = await axios.get(`${API_BASE}/events`);
+  // The selector only shows names and ids
+  const res = await axios.get(`${API_BASE}/events`, { params: { fields: "event_id,event_name" } });
   console.log(res.data);
   return res.data.events;
 };
@@ -20,11 +21,79 @@ export const authorizeVolunteer = async (eventId: string, secretCode: string, to
   return res.data;
 };
 
+const SCAN_RETRIES = 2;
+
 export const scanTeamQR = async (teamId: string, eventToken: string) => {
-  const res = await axios.post(`${API_BASE}/volunteer/scan`, {
-    team_id: teamId
-  }, {
-    headers: { Authorization: `Bearer ${eventToken}` }
-  });
-  return res.data;
+  // Retries reuse the key, so the server replays the first result instead of scanning twice
+  const idempotencyKey = crypto.randomUUID();
+  for (let attempt = 0; ; attempt++) {
+    try {
+      const res = await axios.post(`${API_BASE}/volunteer/scan`, {
+        team_id: teamId
+      }, {
+        headers: { Authorization: `Bearer ${eventToken}`, "Idempotency-Key": idempotencyKey },
+        timeout: 10000
+      });
+      return res.data;
+    } catch (err: any) {
+      // Only retry when no response arrived (timeout / network drop) or the first attempt is still running
+      const retryable = !err.response || err.response.status === 409;
+      if (!retryable || attempt >= SCAN_RETRIES) throw err;
+      await new Promise((resolve) => setTimeout(resolve, 500 * (attempt + 1)));
+    }
+  }
 };
+
+type PendingScan = { resolve: (data: any) => void; reject: (err: any) => void };
+
+// Persistent /ws/volunteer/scan connection: the session and event token are checked once,
+// then each scan is a single frame matched to its result by correlation id.
+export class ScanChannel {
+  private socket: WebSocket;
+  private ready: Promise<void>;
+  private pending = new Map<number, PendingScan>();
+  private nextId = 0;
+  open = false;
+
+  constructor(eventToken: string) {
+    const wsBase = API_BASE.replace(/^http/, "ws").replace(/\/api\/?$/, "");
+    this.socket = new WebSocket(`${wsBase}/ws/volunteer/scan`);
+    this.ready = new Promise((resolve, reject) => {
+      this.socket.onopen = () => this.socket.send(JSON.stringify({ type: "auth", token: eventToken }));
+      this.socket.onmessage = (event) => {
+        const frame = JSON.parse(event.data);
+        if (frame.type === "ready") {
+          this.open = true;
+          resolve();
+          return;
+        }
+        const scan = this.pending.get(frame.id);
+        if (!scan) return;
+        this.pending.delete(frame.id);
+        // Same shape as an axios error so callers handle both transports alike
+        if (frame.ok) scan.resolve(frame);
+        else scan.reject({ response: { status: frame.status, data: { detail: frame.detail } } });
+      };
+      this.socket.onclose = () => {
+        this.open = false;
+        reject(new Error("Scan channel closed"));
+        this.pending.forEach((scan) => scan.reject(new Error("Scan channel closed")));
+        this.pending.clear();
+      };
+    });
+    this.ready.catch(() => undefined);
+  }
+
+  async scan(teamId: string) {
+    await this.ready;
+    const id = this.nextId++;
+    return new Promise<any>((resolve, reject) => {
+      this.pending.set(id, { resolve, reject });
+      this.socket.send(JSON.stringify({ id, team_id: teamId }));
+    });
+  }
+
+  close() {
+    this.socket.close();
+  }
+}
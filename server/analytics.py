@@ -0,0 +1,165 @@
+"""
+Participation analytics for admins, computed with NumPy.
+
+`load_participation` streams the teams collection once (only points and
+events_participated) into a team x event participation matrix, stored bit-packed (one
+bit per team and event), plus a points vector. Event ids are mapped to columns with one
+searchsorted over the whole attendance list rather than per document.
+
+`summarize` then derives, without per-team Python loops:
+- attendance per event and the points each event handed out,
+- co-attendance between events (how many teams attended both), from a chunked
+  matrix product so the unpacked matrix never has to exist in full,
+- the distribution of events per team,
+- points percentiles, a histogram, the Gini coefficient and the top 10% share.
+
+The endpoint caches the result until the next scan or event change invalidates it.
+"""
+from datetime import datetime
+
+import numpy as np
+
+POINTS_PERCENTILES = [10, 25, 50, 75, 90, 95, 99]
+# Teams unpacked per block of the co-attendance product (block x events float32)
+CO_ATTENDANCE_BLOCK = 4096
+
+
+class Participation:
+    __slots__ = ("event_ids", "event_names", "event_points", "packed", "team_count", "points")
+
+    def __init__(self, event_ids, event_names, event_points, packed, team_count, points):
+        self.event_ids = event_ids
+        self.event_names = event_names
+        self.event_points = event_points
+        self.packed = packed  # uint8 (teams, ceil(events / 8)), np.packbits along axis 1
+        self.team_count = team_count
+        self.points = points
+
+    def rows(self, start, stop):
+        """Dense 0/1 block of the participation matrix for teams [start, stop)"""
+        return np.unpackbits(self.packed[start:stop], axis=1, count=len(self.event_ids))
+
+
+async def load_participation(teams_collection, events_collection) -> Participation:
+    events = await events_collection.find({}, {"_id": 0, "event_id": 1, "event_name": 1, "points": 1}).to_list(None)
+    events.sort(key=lambda event: event["event_id"])
+    event_ids = np.array([event["event_id"] for event in events], dtype=str)
+
+    attended, per_team, points = [], [], []
+    async for team in teams_collection.find({}, {"_id": 0, "points": 1, "events_participated": 1}):
+        participated = team.get("events_participated") or []
+        attended.extend(participated)
+        per_team.append(len(participated))
+        points.append(team.get("points") or 0)
+
+    team_count = len(per_team)
+    # Set the bits straight into the packed layout (np.packbits order: most significant bit first)
+    packed = np.zeros((team_count, (len(events) + 7) // 8), dtype=np.uint8)
+    if attended and len(events):
+        team_rows = np.repeat(np.arange(team_count), per_team)
+        attended = np.array(attended, dtype=str)
+        columns = np.searchsorted(event_ids, attended)
+        # Events that were deleted since the scan have no column
+        known = columns < len(event_ids)
+        known[known] = event_ids[columns[known]] == attended[known]
+        team_rows, columns = team_rows[known], columns[known]
+        np.bitwise_or.at(packed, (team_rows, columns // 8), (0x80 >> (columns % 8)).astype(np.uint8))
+
+    return Participation(
+        event_ids=event_ids,
+        event_names=[event.get("event_name") for event in events],
+        event_points=np.array([event.get("points") or 0 for event in events], dtype=np.int64),
+        packed=packed,
+        team_count=team_count,
+        points=np.array(points, dtype=np.int64),
+    )
+
+
+def co_attendance(participation: Participation):
+    """
+    (events x events matrix of teams that attended both, events attended per team).
+    The diagonal of the matrix is the attendance of each event.
+    """
+    event_count = len(participation.event_ids)
+    totals = np.zeros((event_count, event_count), dtype=np.float64)
+    events_per_team = np.zeros(participation.team_count, dtype=np.int64)
+    for start in range(0, participation.team_count, CO_ATTENDANCE_BLOCK):
+        block = participation.rows(start, start + CO_ATTENDANCE_BLOCK).astype(np.float32)
+        totals += block.T @ block
+        events_per_team[start:start + len(block)] = block.sum(axis=1)
+    return np.rint(totals).astype(np.int64), events_per_team
+
+
+def gini(values: np.ndarray) -> float:
+    """0 when everyone has the same points, approaching 1 when one team has them all"""
+    if values.size == 0 or values.sum() <= 0:
+        return 0.0
+    ordered = np.sort(values).astype(np.float64)
+    ranks = np.arange(1, ordered.size + 1)
+    return float((2 * (ranks * ordered).sum()) / (ordered.size * ordered.sum()) - (ordered.size + 1) / ordered.size)
+
+
+def _histogram(values: np.ndarray, bins: int):
+    if values.size == 0:
+        return {"counts": [], "edges": []}
+    counts, edges = np.histogram(values, bins=bins)
+    return {"counts": counts.tolist(), "edges": [round(float(edge), 2) for edge in edges]}
+
+
+def summarize(participation: Participation, top_pairs: int = 20, histogram_bins: int = 20) -> dict:
+    co, events_per_team = co_attendance(participation)
+    attendance = np.diagonal(co).copy()
+    team_count = participation.team_count
+
+    # Strongest event pairs by shared teams; Jaccard = shared / attended either
+    upper_i, upper_j = np.triu_indices(len(attendance), k=1)
+    shared = co[upper_i, upper_j]
+    strongest = np.argsort(shared, kind="stable")[::-1][:top_pairs]
+    strongest = strongest[shared[strongest] > 0]
+    union = attendance[upper_i[strongest]] + attendance[upper_j[strongest]] - shared[strongest]
+
+    order = np.argsort(attendance, kind="stable")[::-1]
+    points = participation.points
+    sorted_points = np.sort(points)[::-1]
+    top_decile = sorted_points[:max(1, team_count // 10)] if team_count else sorted_points
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "teams": team_count,
+        "events": len(attendance),
+        "participation": {
+            "total_scans": int(attendance.sum()),
+            "teams_without_scans": int((events_per_team == 0).sum()),
+            "events_per_team": {
+                "mean": round(float(events_per_team.mean()), 2) if team_count else 0,
+                "median": float(np.median(events_per_team)) if team_count else 0,
+                "max": int(events_per_team.max()) if team_count else 0,
+                "histogram": _histogram(events_per_team, histogram_bins),
+            },
+        },
+        "event_engagement": [{
+            "event_id": participation.event_ids[column],
+            "event_name": participation.event_names[column],
+            "points": int(participation.event_points[column]),
+            "attendance": int(attendance[column]),
+            "attendance_share": round(float(attendance[column]) / team_count, 4) if team_count else 0,
+            "points_awarded": int(attendance[column] * participation.event_points[column]),
+        } for column in order.tolist()],
+        "co_attendance": [{
+            "events": [participation.event_ids[i], participation.event_ids[j]],
+            "event_names": [participation.event_names[i], participation.event_names[j]],
+            "teams": int(count),
+            "jaccard": round(float(count) / float(either), 4) if either else 0,
+        } for i, j, count, either in zip(upper_i[strongest].tolist(), upper_j[strongest].tolist(),
+                                          shared[strongest].tolist(), union.tolist())],
+        "points": {
+            "total": int(points.sum()),
+            "mean": round(float(points.mean()), 2) if team_count else 0,
+            "max": int(points.max()) if team_count else 0,
+            "percentiles": {str(p): float(v) for p, v in zip(POINTS_PERCENTILES, np.percentile(points, POINTS_PERCENTILES))}
+            if team_count else {},
+            "histogram": _histogram(points, histogram_bins),
+            "gini": round(gini(points), 4),
+            "top_10_percent_share": round(float(top_decile.sum()) / float(points.sum()), 4) if points.sum() > 0 else 0,
+        },
+    }
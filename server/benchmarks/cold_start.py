@@ -0,0 +1,66 @@
+"""
+Cold-start benchmark: time from launching uvicorn to the first successful
+GET /api/health, over several fresh processes.
+
+    python benchmarks/cold_start.py --runs 5
+    STORAGE_BACKEND=embedded EMBEDDED_DATA_DIR=/tmp/bench-data python benchmarks/cold_start.py
+
+Reports min / median / max in milliseconds.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_health(timeout):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise SystemExit(f"server exited early:\n{server.stderr.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise SystemExit(f"no /api/health response within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    samples = []
+    for run in range(args.runs):
+        samples.append(time_to_first_health(args.timeout))
+        print(f"run {run + 1}: {samples[-1]:.0f} ms")
+    print(f"\ncold start to first /api/health: min {min(samples):.0f} ms, "
+          f"median {statistics.median(samples):.0f} ms, max {max(samples):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
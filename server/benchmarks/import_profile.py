@@ -0,0 +1,55 @@
+"""
+Import-time profile of the backend.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and prints the
+slowest modules by cumulative import time, plus the total. Uses the environment (or
+.env) the server would use, e.g.
+
+    python benchmarks/import_profile.py --top 25
+    STORAGE_BACKEND=embedded python benchmarks/import_profile.py
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SERVER_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    total_us = next((cumulative for cumulative, _, name in rows if name.strip() == args.module), None)
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+    if total_us is not None:
+        print(f"\nimport {args.module}: {total_us / 1000:.1f} ms")
+    # Loaded on first use (login, event admin routes, volunteer tokens, analytics); none should appear here
+    heavy = ["authlib", "cryptography.hazmat.primitives.ciphers.aead", "jose", "httpx", "numpy"]
+    loaded = [package for package in heavy if any(name.strip() == package for _, _, name in rows)]
+    print(f"lazy subsystems loaded at import: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
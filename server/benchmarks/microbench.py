@@ -0,0 +1,175 @@
+"""
+Micro-benchmarks for the CPU-bound helpers on the request paths.
+
+Each helper runs on fixed, realistic inputs. The report shows ops/sec (best of
+--repeat timed rounds), the peak bytes allocated by a single call (traced with
+tracemalloc) and the blocks still alive per call afterwards (non-zero means the
+helper keeps memory around).
+
+    python benchmarks/microbench.py                 # compare against baselines.json
+    python benchmarks/microbench.py --update        # record new baselines
+    python benchmarks/microbench.py --only encrypt_secret_code
+
+Exits with status 1 when a helper is slower than its baseline by more than
+--threshold (default 25%), or allocates more than that much extra per call.
+Baselines depend on the machine; record them on the machine you compare on.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Importing main needs its required settings; the values only have to be stable.
+# Embedded storage keeps the import from touching MongoDB.
+for name, value in {
+    "CLIENT_ID": "bench", "CLIENT_SECRET": "bench", "TENANT_ID": "bench",
+    "SESSION_SECRET_KEY": "bench-session", "SECRET_KEY": "bench-secret",
+    "STORAGE_BACKEND": "embedded",
+}.items():
+    os.environ.setdefault(name, value)
+os.environ.setdefault("EMBEDDED_DATA_DIR", tempfile.mkdtemp(prefix="microbench-"))
+sys.path.insert(0, SERVER_DIR)
+
+
+def build_cases():
+    import main
+
+    team_id = "3f2b8c1e-9d4a-4e6b-8f1c-2a7d5e9b0c43"
+    team_name = "Byte Bandits"
+    encrypted = main.encrypt_secret_code("QUIZ-2025-ALPHA")
+    token = main.create_volunteer_token("volunteer@iiitb.ac.in", "7c9e6679-7425-40de-944b-e07fc1f90ae7")
+    created = datetime(2025, 9, 1, 10, 30, 15)
+    team_document = {
+        "_id": "66d4f1a2b3c4d5e6f7a8b9c0",
+        "team_id": team_id,
+        "team_name": team_name,
+        "points": 140,
+        "created_at": created,
+        "members": [
+            {"name": f"Member {i}", "email": f"member{i}@iiitb.ac.in", "rollNumber": f"IMT2023{i:03d}",
+             "role": "participant", "joined_at": created}
+            for i in range(3)
+        ],
+        "events_participated": [f"event-{i}" for i in range(8)],
+    }
+
+    return {
+        "encrypt_secret_code": lambda: main.encrypt_secret_code("QUIZ-2025-ALPHA"),
+        "decrypt_secret_code": lambda: main.decrypt_secret_code(encrypted),
+        "generate_team_qr_id": lambda: main.generate_team_qr_id(team_id),
+        "generate_team_join_code": lambda: main.generate_team_join_code(team_id, team_name),
+        "serialize_datetime_fields": lambda: main.serialize_datetime_fields(team_document),
+        "create_volunteer_token": lambda: main.create_volunteer_token("volunteer@iiitb.ac.in", "7c9e6679-7425-40de-944b-e07fc1f90ae7"),
+        "verify_volunteer_token": lambda: main.verify_volunteer_token(token),
+    }
+
+
+def ops_per_second(func, repeat, min_time):
+    """Best-of-`repeat` rate; each round runs enough calls to last at least min_time seconds"""
+    func()  # warm caches and lazy imports
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        calls *= 2
+    best = calls / elapsed
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = max(best, calls / (time.perf_counter() - started))
+    return best
+
+
+def allocations(func, calls=200):
+    """(peak bytes allocated during one call, blocks retained per call)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        start_snapshot = tracemalloc.take_snapshot()
+        for _ in range(calls):
+            func()
+        gc.collect()
+        retained = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(start_snapshot, "filename"))
+    finally:
+        tracemalloc.stop()
+    return peak - before, max(retained, 0) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update", action="store_true", help="write the results to baselines.json")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed round")
+    parser.add_argument("--only", action="append", help="benchmark only this helper (repeatable)")
+    args = parser.parse_args()
+
+    cases = build_cases()
+    if args.only:
+        unknown = set(args.only) - set(cases)
+        if unknown:
+            raise SystemExit(f"unknown helpers: {', '.join(sorted(unknown))}")
+        cases = {name: cases[name] for name in args.only}
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH, encoding="utf-8") as baselines_file:
+            baselines = json.load(baselines_file)
+
+    results = {}
+    failures = []
+    print(f"{'helper':<28} {'ops/sec':>12} {'baseline':>12} {'change':>8} {'peak B/call':>12} {'retained':>9}")
+    for name, func in cases.items():
+        rate = ops_per_second(func, args.repeat, args.min_time)
+        peak_bytes, retained = allocations(func)
+        results[name] = {"ops_per_sec": round(rate, 1), "peak_bytes": peak_bytes, "retained_blocks": round(retained, 3)}
+
+        baseline = baselines.get(name)
+        change = ""
+        if baseline:
+            ratio = rate / baseline["ops_per_sec"] - 1
+            change = f"{ratio:+.0%}"
+            if ratio < -args.threshold:
+                failures.append(f"{name}: {rate:,.0f} ops/sec is {-ratio:.0%} below baseline {baseline['ops_per_sec']:,.0f}")
+            # Small absolute differences are noise (interned strings, freelists)
+            if peak_bytes > baseline["peak_bytes"] * (1 + args.threshold) + 256:
+                failures.append(f"{name}: {peak_bytes} peak bytes per call vs baseline {baseline['peak_bytes']}")
+        baseline_rate = f"{baseline['ops_per_sec']:,.0f}" if baseline else "-"
+        print(f"{name:<28} {rate:>12,.0f} {baseline_rate:>12} {change:>8} {peak_bytes:>12,} {retained:>9.2f}")
+
+    if args.update:
+        baselines.update(results)
+        with open(BASELINES_PATH, "w", encoding="utf-8") as baselines_file:
+            json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+            baselines_file.write("\n")
+        print(f"\nbaselines written to {BASELINES_PATH}")
+        return
+
+    if failures:
+        print("\nREGRESSIONS:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Data-size scaling benchmark for the read endpoints.
+
+For every scale (teams:events) the store is reseeded with benchmarks/seed.py and each
+read endpoint is called in process: median / p95 latency over --requests calls, the
+peak bytes allocated by one call (tracemalloc) and the response size.
+
+By default the store is the in-process embedded engine. With --mongo-uri the app reads
+from that MongoDB (a local replica set or an Atlas cluster like the deployment's), so
+the timings include the round trips and the server's query plans. Every scale empties
+and reloads the seeded collections of --database, so --confirm-drop is required, as for
+seed.py --drop. Results are labelled with the backend they were measured on.
+The summary gives the log-log slope of median latency and of peak memory against team
+count, from the smallest to the largest scale: ~1 is linear, ~0 flat, above 1 worse.
+
+    python benchmarks/scaling.py
+    python benchmarks/scaling.py --scales 500:30,5000:100,20000:500 --requests 20
+    python benchmarks/scaling.py --csv scaling.csv --plot scaling.png   # plot needs matplotlib
+    python benchmarks/scaling.py --mongo-uri mongodb://localhost:27017 --database synergy_bench --confirm-drop
+
+The response cache is disabled so every call reaches storage.
+"""
+import argparse
+import csv
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for name, value in {
+    "CLIENT_ID": "bench", "CLIENT_SECRET": "bench", "TENANT_ID": "bench",
+    "SESSION_SECRET_KEY": "bench-session", "SECRET_KEY": "bench-secret",
+    "STORAGE_BACKEND": "embedded", "RESPONSE_CACHE_MAX_BYTES": "0",
+    # Snapshots of a freshly seeded store would only add noise to the timings
+    "EMBEDDED_SNAPSHOT_EVERY": "100000000", "EMBEDDED_SNAPSHOT_INTERVAL": "100000000",
+}.items():
+    os.environ[name] = value
+os.environ["EMBEDDED_DATA_DIR"] = tempfile.mkdtemp(prefix="scaling-")
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SCALES = "500:30,2000:60,5000:150,20000:500"
+
+# (name, path, role of the caller)
+ENDPOINTS = [
+    ("events", "/api/events", "admin"),
+    ("leaderboard_full", "/api/leaderboard/full", "participant"),
+    ("my_team", "/api/my_team", "participant"),
+    ("my_team_rank", "/api/my_team/rank", "participant"),
+    ("volunteers", "/api/volunteers", "admin"),
+    ("export_teams", "/api/admin/export/teams?format=csv", "admin"),
+    ("export_attendance", "/api/admin/export/attendance?format=csv", "admin"),
+]
+
+
+def parse_scales(text):
+    scales = []
+    for part in text.split(","):
+        teams, _, events = part.partition(":")
+        scales.append((int(teams), int(events or 60)))
+    return scales
+
+
+def measure(client, path, requests):
+    """(median ms, p95 ms, peak bytes of one call, response bytes)"""
+    response = client.get(path)  # warm up
+    if response.status_code != 200:
+        raise SystemExit(f"GET {path} returned {response.status_code}: {response.text[:200]}")
+    size = len(response.content)
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get(path)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    tracemalloc.start()
+    try:
+        client.get(path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))], peak, size
+
+
+def slope(points):
+    """log-log slope between the first and last (teams, value) pair"""
+    (x0, y0), (x1, y1) = points[0], points[-1]
+    if x0 == x1 or y0 <= 0 or y1 <= 0:
+        return None
+    return math.log(y1 / y0) / math.log(x1 / x0)
+
+
+def use_storage(app_main, storage):
+    """Point the app's module-level collections at another storage backend"""
+    app_main.storage = storage
+    app_main.teams_collection = storage.teams
+    app_main.event_collection = storage.events
+    app_main.volunteer_collection = storage.volunteers
+    app_main.user_collection = storage.users
+
+
+async def connection_error(storage):
+    """None when the MongoDB answers a ping, otherwise the error"""
+    try:
+        await storage.client.admin.command("ping")
+    except Exception as ping_e:
+        return ping_e
+    return None
+
+
+async def wait_for_indexes(app_main):
+    # Built in the background at startup; time queries only once the indexes exist
+    await app_main.app.state.index_task
+
+
+def plot(rows, endpoints, backend, path):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed; skipping the plot (pip install matplotlib)")
+        return
+    figure, (latency_axis, memory_axis) = plt.subplots(1, 2, figsize=(12, 5))
+    for name, _, _ in endpoints:
+        series = [row for row in rows if row["endpoint"] == name]
+        teams = [row["teams"] for row in series]
+        latency_axis.plot(teams, [row["median_ms"] for row in series], marker="o", label=name)
+        memory_axis.plot(teams, [row["peak_bytes"] / 1024 for row in series], marker="o", label=name)
+    for axis, label in ((latency_axis, "median latency (ms)"), (memory_axis, "peak allocation per call (KiB)")):
+        axis.set_xscale("log")
+        axis.set_yscale("log")
+        axis.set_xlabel("teams")
+        axis.set_ylabel(label)
+        axis.grid(True, which="both", alpha=0.3)
+    latency_axis.legend(fontsize="small")
+    figure.suptitle(f"{backend} backend")
+    figure.tight_layout()
+    figure.savefig(path)
+    print(f"plot written to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="comma separated teams:events pairs")
+    parser.add_argument("--volunteers", type=int, default=100)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of event popularity")
+    parser.add_argument("--mean-events", type=float, default=6, help="average events attended per team")
+    parser.add_argument("--requests", type=int, default=10, help="timed calls per endpoint and scale")
+    parser.add_argument("--only", action="append", help="benchmark only this endpoint (repeatable)")
+    parser.add_argument("--csv", help="also write the results to this CSV file")
+    parser.add_argument("--plot", help="write latency / memory vs data size charts to this image")
+    parser.add_argument("--mongo-uri", help="benchmark against this MongoDB instead of the embedded engine")
+    parser.add_argument("--database", default="synergy_bench", help="database name with --mongo-uri")
+    parser.add_argument("--confirm-drop", action="store_true", help="allow reseeding the --mongo-uri database")
+    args = parser.parse_args()
+
+    import seed
+    if args.mongo_uri:
+        seed.require_drop_confirmation(parser, args.mongo_uri, args.database, args.confirm_drop)
+
+    import main as app_main
+    from fastapi.testclient import TestClient
+
+    backend = "mongo" if args.mongo_uri else "embedded"
+    if args.mongo_uri:
+        from storage import MongoStorage
+        use_storage(app_main, MongoStorage(args.mongo_uri, args.database, profiles=app_main.OPERATION_PROFILES,
+                                           serverSelectionTimeoutMS=5000))
+
+    endpoints = ENDPOINTS
+    if args.only:
+        unknown = set(args.only) - {name for name, _, _ in ENDPOINTS}
+        if unknown:
+            raise SystemExit(f"unknown endpoints: {', '.join(sorted(unknown))}")
+        endpoints = [endpoint for endpoint in ENDPOINTS if endpoint[0] in args.only]
+
+    caller = {}
+    app_main.app.dependency_overrides[app_main.get_current_user] = lambda: caller
+
+    rows = []
+    with TestClient(app_main.app) as client:
+        if args.mongo_uri:
+            error = client.portal.call(connection_error, app_main.storage)
+            if error is not None:
+                raise SystemExit(f"cannot reach MongoDB at {args.mongo_uri}: {error}")
+        client.portal.call(wait_for_indexes, app_main)
+        for teams, events in parse_scales(args.scales):
+            dataset = seed.generate(teams, events, args.volunteers, skew=args.skew, mean_events=args.mean_events)
+            client.portal.call(seed.load, app_main.storage, dataset, True)
+            # Ask about a team from the middle of the pack
+            member = dataset["teams"][teams // 2]["members"][0]
+            print(f"\n[{backend}] {teams} teams, {events} events")
+            print(f"{'endpoint':<20} {'median ms':>10} {'p95 ms':>10} {'peak KiB':>10} {'response KiB':>13}")
+            for name, path, role in endpoints:
+                caller.clear()
+                caller.update(member if role == "participant" else
+                              {"name": "Bench Admin", "email": "admin@iiitb.ac.in", "rollNumber": "ADMIN"})
+                caller["role"] = role
+                median_ms, p95_ms, peak, size = measure(client, path, args.requests)
+                rows.append({"backend": backend, "endpoint": name, "teams": teams, "events": events, "median_ms": round(median_ms, 2),
+                             "p95_ms": round(p95_ms, 2), "peak_bytes": peak, "response_bytes": size})
+                print(f"{name:<20} {median_ms:>10.2f} {p95_ms:>10.2f} {peak / 1024:>10.0f} {size / 1024:>13.1f}")
+
+    print(f"\n[{backend}] {'endpoint':<20} {'latency slope':>14} {'memory slope':>13}")
+    for name, _, _ in endpoints:
+        series = [row for row in rows if row["endpoint"] == name]
+        latency = slope([(row["teams"], row["median_ms"]) for row in series])
+        memory = slope([(row["teams"], row["peak_bytes"]) for row in series])
+        print(f"[{backend}] {name:<20} {'-' if latency is None else f'{latency:.2f}':>14} {'-' if memory is None else f'{memory:.2f}':>13}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\nresults written to {args.csv}")
+    if args.plot:
+        plot(rows, endpoints, backend, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Synthetic dataset generator: realistic `teams`, `events` and `volunteers` documents
+in the shapes create_team, create_event, add_volunteer and the scan endpoint write.
+
+    python benchmarks/seed.py --teams 20000 --events 500 --volunteers 200 --data-dir bench_data --drop
+    python benchmarks/seed.py --teams 5000 --mongo-uri mongodb://localhost:27017 --database synergy_bench
+
+Run it from server/. The target is always explicit: an embedded data directory
+(--data-dir) or a MongoDB (--mongo-uri / --database); the storage configured in .env is
+never written to. --drop against MongoDB also needs --confirm-drop. Event popularity
+follows a Zipf-like curve (--skew 0 makes every event equally popular) and the number
+of events per team is exponentially distributed around --mean-events, so a few teams
+carry long `events_participated` arrays. The same --seed always yields the same data.
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, SERVER_DIR)
+
+SEEDED_COLLECTIONS = ("teams", "events", "volunteers")
+INSERT_BATCH_SIZE = 1000
+FEST_START = datetime(2025, 9, 1, 9, 0, 0)
+
+
+def generate(teams: int, events: int, volunteers: int, skew: float = 1.0, mean_events: float = 6,
+             max_team_size: int = 3, seed: int = 42) -> dict:
+    """Documents per collection; team points always match their attended events"""
+    import main
+
+    rng = random.Random(seed)
+
+    def uuid_for():
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    event_docs = [{
+        "event_id": uuid_for(),
+        "event_name": f"Event {i + 1:03d}",
+        "points": rng.choice([5, 10, 10, 15, 20, 25, 50]),
+        "secret_code": f"CODE-{i + 1:04d}",
+        "expired": rng.random() < 0.2,
+        "participants": 0,
+    } for i in range(events)]
+
+    volunteer_docs = [{
+        "rollNumber": f"VOL2025{i:04d}",
+        "name": f"Volunteer {i}",
+        "email": f"volunteer{i}@iiitb.ac.in",
+    } for i in range(volunteers)]
+
+    # Zipf-like popularity: event i is picked with weight 1 / (i + 1) ** skew
+    cumulative = list(itertools.accumulate(1 / (i + 1) ** skew for i in range(events)))
+    roll_numbers = itertools.count(1)
+    team_docs = []
+    for i in range(teams):
+        team_id = uuid_for()
+        team_name = f"Team {i:05d}"
+        created_at = FEST_START - timedelta(days=rng.randint(1, 30), seconds=rng.randint(0, 86399))
+        members = []
+        for position in range(rng.randint(1, max_team_size)):
+            number = next(roll_numbers)
+            member = {"name": f"Student {number}", "email": f"student{number}@iiitb.ac.in",
+                      "rollNumber": f"IMT2025{number:05d}", "role": "participant"}
+            if position:
+                member["joined_at"] = created_at + timedelta(minutes=rng.randint(1, 600))
+            members.append(member)
+
+        wanted = min(events, int(rng.expovariate(1 / mean_events))) if mean_events > 0 else 0
+        attended = []
+        chosen = set()
+        while len(attended) < wanted:
+            index = bisect.bisect_left(cumulative, rng.random() * cumulative[-1])
+            if index not in chosen:
+                chosen.add(index)
+                attended.append(event_docs[index])
+        scanned_at = FEST_START
+        attendance = []
+        for event in attended:
+            event["participants"] += 1
+            scanned_at += timedelta(minutes=rng.randint(5, 90))
+            attendance.append({"event_id": event["event_id"], "scanned_at": scanned_at,
+                               "volunteer": rng.choice(volunteer_docs)["email"] if volunteer_docs else None})
+
+        team_docs.append({
+            "team_id": team_id,
+            "team_name": team_name,
+            "qr_id": main.generate_team_qr_id(team_id),
+            "join_code": main.generate_team_join_code(team_id, team_name),
+            "members": members,
+            "points": sum(event["points"] for event in attended),
+            "events_participated": [event["event_id"] for event in attended],
+            "attendance": attendance,
+            "created_at": created_at,
+            "created_by": members[0]["email"],
+        })
+
+    return {"teams": team_docs, "events": event_docs, "volunteers": volunteer_docs}
+
+
+async def load(storage, dataset: dict, drop: bool = False) -> dict:
+    """Bulk insert the dataset in batches; returns the documents written per collection"""
+    counts = {}
+    for name in SEEDED_COLLECTIONS:
+        collection = storage.collection(name)
+        if drop:
+            await collection.delete_many({})
+        documents = dataset.get(name, [])
+        for start in range(0, len(documents), INSERT_BATCH_SIZE):
+            # insert_many adds _id to the dicts it is given; keep the dataset reusable
+            await collection.insert_many([dict(doc) for doc in documents[start:start + INSERT_BATCH_SIZE]], ordered=False)
+        counts[name] = len(documents)
+    return counts
+
+
+def require_drop_confirmation(parser, mongo_uri: str, database: str, confirmed: bool):
+    """Emptying collections in a real MongoDB needs an explicit --confirm-drop"""
+    if mongo_uri and not confirmed:
+        parser.error(f"this empties {', '.join(SEEDED_COLLECTIONS)} in {database} at {mongo_uri}; "
+                     f"add --confirm-drop if that is intended")
+
+
+async def seed(args):
+    dataset = generate(args.teams, args.events, args.volunteers, skew=args.skew,
+                       mean_events=args.mean_events, seed=args.seed)
+    if args.mongo_uri:
+        from storage import MongoStorage
+        storage = MongoStorage(args.mongo_uri, args.database)
+    else:
+        from storage import EmbeddedStorage
+        storage = EmbeddedStorage(args.data_dir)
+    await storage.start()
+    try:
+        started = time.perf_counter()
+        counts = await load(storage, dataset, drop=args.drop)
+        elapsed = time.perf_counter() - started
+    finally:
+        await storage.close()
+    longest = max((len(team["events_participated"]) for team in dataset["teams"]), default=0)
+    print(", ".join(f"{count} {name}" for name, count in counts.items()) + f" loaded in {elapsed:.1f}s"
+          f" (longest events_participated: {longest})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teams", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=60)
+    parser.add_argument("--volunteers", type=int, default=100)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of event popularity")
+    parser.add_argument("--mean-events", type=float, default=6, help="average events attended per team")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="empty the seeded collections first")
+    parser.add_argument("--confirm-drop", action="store_true", help="allow --drop against a MongoDB target")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--data-dir", help="load into embedded storage in this directory")
+    target.add_argument("--mongo-uri", help="load into this MongoDB")
+    parser.add_argument("--database", default="synergy_bench", help="database name with --mongo-uri")
+    args = parser.parse_args()
+    if args.drop:
+        require_drop_confirmation(parser, args.mongo_uri, args.database, args.confirm_drop)
+
+    # generate() imports main for the QR id / join code signing. Keep the SECRET_KEY from .env
+    # when there is one, so the codes scan on that deployment, but never let the import
+    # connect to the configured database.
+    if not os.path.exists(".env"):
+        for name, value in {
+            "CLIENT_ID": "bench", "CLIENT_SECRET": "bench", "TENANT_ID": "bench",
+            "SESSION_SECRET_KEY": "bench-session", "SECRET_KEY": "bench-secret",
+        }.items():
+            os.environ.setdefault(name, value)
+    os.environ["STORAGE_BACKEND"] = "embedded"
+    os.environ["EMBEDDED_DATA_DIR"] = tempfile.mkdtemp(prefix="seed-")
+    asyncio.run(seed(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Response compression (brotli when the `brotli` package is installed, otherwise gzip).
+
+`CompressionMiddleware` compresses complete JSON / text responses of at least
+`minimum_size` bytes for clients that accept it, and adds `Vary: Accept-Encoding`.
+Streaming responses (SSE, the NDJSON and CSV exports) are passed through untouched,
+so events are never held back waiting for a compressor to flush, and so are
+responses that already carry a Content-Encoding.
+
+The encoding negotiated for the current request is published in `accepted_encoding`,
+so the response cache can keep a compressed copy of an entry (with the same
+`Compressor`) instead of compressing the same body on every hit.
+"""
+import gzip
+from contextvars import ContextVar
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+accepted_encoding = ContextVar("accepted_encoding", default=None)
+
+_COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+# Events must reach the client as they are sent
+_STREAMED_TYPES = ("text/event-stream",)
+
+
+def negotiate(accept_encoding: str):
+    """Preferred supported encoding in an Accept-Encoding header, or None"""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    wildcard = offered.get("*", 0)
+    for encoding in (("br",) if brotli is not None else ()) + ("gzip",):
+        if offered.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+class Compressor:
+    def __init__(self, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def worthwhile(self, content_type: str, size: int) -> bool:
+        return size >= self.minimum_size and content_type.startswith(_COMPRESSIBLE_TYPES) \
+            and not content_type.startswith(_STREAMED_TYPES)
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        # mtime=0: identical bodies compress to identical bytes
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    """Pure ASGI; register it last (outermost) so it sees the final response."""
+
+    def __init__(self, app, compressor: Compressor):
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoding = negotiate(value.decode("latin-1"))
+                break
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        held_start = None
+
+        async def send_compressed(message):
+            nonlocal held_start
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in headers or message["status"] in (204, 304) \
+                        or not self.compressor.worthwhile(content_type, self.compressor.minimum_size):
+                    return await send(message)
+                # Held until the first body message shows whether the response is complete and big enough
+                held_start = message
+                return
+            if held_start is None or message["type"] != "http.response.body":
+                return await send(message)
+            start, held_start = held_start, None
+            headers = [(name, value) for name, value in start.get("headers", []) if name.lower() != b"content-length"]
+            headers.append((b"vary", b"Accept-Encoding"))
+            body = message.get("body", b"")
+            if message.get("more_body") or len(body) < self.compressor.minimum_size:
+                if not message.get("more_body"):
+                    headers.append((b"content-length", str(len(body)).encode()))
+                await send({**start, "headers": headers})
+                return await send(message)
+            body = self.compressor.compress(body, encoding)
+            headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode())]
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        token = accepted_encoding.set(encoding)
+        try:
+            await self.app(scope, receive, send_compressed)
+        finally:
+            accepted_encoding.reset(token)
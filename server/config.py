@@ -1,22 +1,128 @@
-from starlette.config import Config
-
-config = Config(".env")
-
-CLIENT_ID = config("CLIENT_ID")
-CLIENT_SECRET = config("CLIENT_SECRET")
-TENANT_ID = config("TENANT_ID")
-SESSION_SECRET_KEY= config("SESSION_SECRET_KEY")
-
-ADMIN_EMAIL = config("ADMIN_EMAIL", default="synergy@iiitb.ac.in")
-REDIS_URL = config("REDIS_URL", default="redis://localhost:6379")
-FRONTEND_URL = config("FRONTEND_URL", default="http://localhost:5173")
-BACKEND_URL = config("BACKEND_URL", default="http://localhost:8000")
-
-MONGODB_USERNAME = config("MONGODB_USERNAME")
-MONGODB_PASSWORD = config("MONGODB_PASSWORD")
-CLUSTER_NAME = config("CLUSTER_NAME")
-DATABASE_NAME = config("DATABASE_NAME")
-APP_NAME = config("APP_NAME")
-DEADLINE_DATE = config("DEADLINE_DATE", default=None)
-
-SECRET_KEY = config("SECRET_KEY")
\ No newline at end of file
+import json
+
+from starlette.config import Config
+
+config = Config(".env")
+
+CLIENT_ID = config("CLIENT_ID")
+CLIENT_SECRET = config("CLIENT_SECRET")
+TENANT_ID = config("TENANT_ID")
+SESSION_SECRET_KEY= config("SESSION_SECRET_KEY")
+
+ADMIN_EMAIL = config("ADMIN_EMAIL", default="synergy@iiitb.ac.in")
+REDIS_URL = config("REDIS_URL", default="redis://localhost:6379")
+FRONTEND_URL = config("FRONTEND_URL", default="http://localhost:5173")
+BACKEND_URL = config("BACKEND_URL", default="http://localhost:8000")
+
+# "mongo" (MongoDB / Atlas via Motor) or "embedded" (in-process engine with a write-ahead log)
+STORAGE_BACKEND = config("STORAGE_BACKEND", default="mongo")
+
+MONGODB_USERNAME = config("MONGODB_USERNAME", default=None)
+MONGODB_PASSWORD = config("MONGODB_PASSWORD", default=None)
+CLUSTER_NAME = config("CLUSTER_NAME", default=None)
+DATABASE_NAME = config("DATABASE_NAME", default="loyalty_program")
+APP_NAME = config("APP_NAME", default=None)
+
+# Motor connection pool
+MONGO_MAX_POOL_SIZE = config("MONGO_MAX_POOL_SIZE", cast=int, default=100)
+MONGO_MIN_POOL_SIZE = config("MONGO_MIN_POOL_SIZE", cast=int, default=0)
+MONGO_MAX_IDLE_TIME_MS = config("MONGO_MAX_IDLE_TIME_MS", cast=int, default=300000)
+MONGO_CONNECT_TIMEOUT_MS = config("MONGO_CONNECT_TIMEOUT_MS", cast=int, default=10000)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = config("MONGO_SERVER_SELECTION_TIMEOUT_MS", cast=int, default=10000)
+
+# Named operation profiles: write concern (w, j), read concern, read preference and an
+# operation timeout per endpoint group. max_staleness_seconds must be at least 90.
+# Override or add profiles with a JSON object, e.g.
+# OPERATION_PROFILES='{"leaderboard": {"read_preference": "primary"}}'
+OPERATION_PROFILES = {
+    # Point awards from scans: durable before acknowledging
+    "points": {"w": "majority", "j": True, "read_concern": "majority", "read_preference": "primary", "timeout_ms": 5000},
+    # Loss-tolerant counters such as events.participants
+    "counters": {"w": 1, "read_preference": "primary", "timeout_ms": 2000},
+    # Leaderboard and rank reads may lag the primary slightly
+    "leaderboard": {"read_concern": "local", "read_preference": "secondaryPreferred", "max_staleness_seconds": 90, "timeout_ms": 3000},
+    # Event list reads
+    "events": {"read_concern": "local", "read_preference": "secondaryPreferred", "max_staleness_seconds": 90, "timeout_ms": 3000},
+    # Bulk admin reads (exports) are kept off the primary
+    "export": {"read_concern": "local", "read_preference": "secondaryPreferred"},
+}
+for _profile_name, _overrides in json.loads(config("OPERATION_PROFILES", default="{}")).items():
+    OPERATION_PROFILES[_profile_name] = {**OPERATION_PROFILES.get(_profile_name, {}), **_overrides}
+
+EMBEDDED_DATA_DIR = config("EMBEDDED_DATA_DIR", default="data")
+EMBEDDED_FSYNC_INTERVAL_MS = config("EMBEDDED_FSYNC_INTERVAL_MS", cast=int, default=50)  # 0 = fsync every write
+EMBEDDED_SNAPSHOT_EVERY = config("EMBEDDED_SNAPSHOT_EVERY", cast=int, default=10000)  # WAL records
+EMBEDDED_SNAPSHOT_INTERVAL = config("EMBEDDED_SNAPSHOT_INTERVAL", cast=int, default=300)  # seconds
+DEADLINE_DATE = config("DEADLINE_DATE", default=None)
+
+SECRET_KEY = config("SECRET_KEY")
+
+EXPORT_BATCH_SIZE = config("EXPORT_BATCH_SIZE", cast=int, default=1000)
+
+# Idempotency-Key records: how long a first response is replayed for retries, and after
+# how long an unfinished first attempt is assumed dead so a retry may run the request again
+IDEMPOTENCY_TTL_SECONDS = config("IDEMPOTENCY_TTL_SECONDS", cast=int, default=86400)
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = config("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", cast=int, default=30)
+
+# Comma separated "version:secret" pairs used to sign team QR codes, e.g. "2:new-secret,1:old-secret".
+# Keep retired versions listed until every printed QR signed with them is out of circulation.
+# When empty, version 1 is derived from SECRET_KEY.
+QR_SIGNING_KEYS = config("QR_SIGNING_KEYS", default="")
+QR_SIGNING_KEY_VERSION = config("QR_SIGNING_KEY_VERSION", cast=int, default=1)
+
+# /ws/volunteer/scan: scans processed in parallel per connection, scans buffered before the
+# server stops reading the socket, and how long a new connection has to send its auth frame
+WS_SCAN_CONCURRENCY = config("WS_SCAN_CONCURRENCY", cast=int, default=4)
+WS_SCAN_QUEUE_SIZE = config("WS_SCAN_QUEUE_SIZE", cast=int, default=32)
+WS_SCAN_AUTH_TIMEOUT_SECONDS = config("WS_SCAN_AUTH_TIMEOUT_SECONDS", cast=float, default=10)
+
+# Live scan metrics: sliding window length, whether workers share their windows through
+# REDIS_URL (needed with more than one worker), and the SSE push interval
+LIVE_METRICS_WINDOW_SECONDS = config("LIVE_METRICS_WINDOW_SECONDS", cast=int, default=60)
+LIVE_METRICS_REDIS = config("LIVE_METRICS_REDIS", cast=bool, default=False)
+LIVE_METRICS_PUSH_SECONDS = config("LIVE_METRICS_PUSH_SECONDS", cast=float, default=2)
+
+# Season rollover: documents moved per batch and the pause between batches
+SEASON_ROLLOVER_BATCH_SIZE = config("SEASON_ROLLOVER_BATCH_SIZE", cast=int, default=500)
+SEASON_ROLLOVER_PAUSE_MS = config("SEASON_ROLLOVER_PAUSE_MS", cast=int, default=50)
+
+# Points reconciliation: mismatching teams repaired per bulk write and the pause between batches
+RECONCILE_BATCH_SIZE = config("RECONCILE_BATCH_SIZE", cast=int, default=500)
+RECONCILE_THROTTLE_MS = config("RECONCILE_THROTTLE_MS", cast=int, default=0)
+
+# Response micro-cache for hot reads: total body bytes kept per worker, how long
+# leaderboard and event list responses are fresh, and how long after that they may
+# still be served while one background request refreshes them
+RESPONSE_CACHE_MAX_BYTES = config("RESPONSE_CACHE_MAX_BYTES", cast=int, default=8 * 1024 * 1024)
+LEADERBOARD_CACHE_TTL_SECONDS = config("LEADERBOARD_CACHE_TTL_SECONDS", cast=float, default=2)
+EVENTS_CACHE_TTL_SECONDS = config("EVENTS_CACHE_TTL_SECONDS", cast=float, default=10)
+RESPONSE_CACHE_STALE_SECONDS = config("RESPONSE_CACHE_STALE_SECONDS", cast=float, default=30)
+
+# Slow MongoDB operation log: commands at least this slow are recorded (with their shape
+# explained once) in a ring buffer of SLOW_QUERY_LOG_SIZE entries; 0 disables it
+SLOW_QUERY_THRESHOLD_MS = config("SLOW_QUERY_THRESHOLD_MS", cast=float, default=100)
+SLOW_QUERY_LOG_SIZE = config("SLOW_QUERY_LOG_SIZE", cast=int, default=500)
+SLOW_QUERY_EXPLAIN = config("SLOW_QUERY_EXPLAIN", cast=bool, default=True)
+
+# Degraded-mode scan journal: when enabled, scans that cannot reach MongoDB are journaled
+# to a local SQLite file, acknowledged as pending and replayed in batches once it is back
+SCAN_JOURNAL_ENABLED = config("SCAN_JOURNAL_ENABLED", cast=bool, default=False)
+SCAN_JOURNAL_PATH = config("SCAN_JOURNAL_PATH", default="data/scan_journal.sqlite3")
+SCAN_JOURNAL_DRAIN_BATCH = config("SCAN_JOURNAL_DRAIN_BATCH", cast=int, default=200)
+SCAN_JOURNAL_DRAIN_INTERVAL_SECONDS = config("SCAN_JOURNAL_DRAIN_INTERVAL_SECONDS", cast=float, default=2)
+SCAN_JOURNAL_DEGRADED_SECONDS = config("SCAN_JOURNAL_DEGRADED_SECONDS", cast=float, default=15)
+
+# Admin participation analytics: longest a computed summary is reused; scans and event
+# changes invalidate it earlier
+ANALYTICS_CACHE_TTL_SECONDS = config("ANALYTICS_CACHE_TTL_SECONDS", cast=float, default=300)
+
+# Response compression (brotli if installed, else gzip) for JSON / text bodies of at least
+# COMPRESSION_MINIMUM_SIZE bytes; 0 disables it
+COMPRESSION_MINIMUM_SIZE = config("COMPRESSION_MINIMUM_SIZE", cast=int, default=1024)
+COMPRESSION_GZIP_LEVEL = config("COMPRESSION_GZIP_LEVEL", cast=int, default=6)
+COMPRESSION_BROTLI_QUALITY = config("COMPRESSION_BROTLI_QUALITY", cast=int, default=5)
+
+# On-demand request profiling (admin requests with an X-Profile header)
+PROFILE_DIR = config("PROFILE_DIR", default="profiles")
+PROFILE_MAX_FILES = config("PROFILE_MAX_FILES", cast=int, default=50)
+PROFILE_SAMPLE_INTERVAL_MS = config("PROFILE_SAMPLE_INTERVAL_MS", cast=float, default=2)
@@ -0,0 +1,197 @@
+"""
+Idempotency-Key support for retried mutations.
+
+Scanners on flaky Wi-Fi time out and resend `/api/volunteer/scan` and
+`/api/join_team_by_code`. A client that sends an `Idempotency-Key` header gets the
+first response replayed for every retry with the same key, without the endpoint
+running again. Records live in a collection with a TTL index on `expires_at`.
+
+A key is scoped to the route, the session user and the Authorization header, so
+one caller can never read another caller's cached response. Reusing a key with a
+different body is rejected with 422, and a retry that arrives while the first
+request is still running gets 409. 5xx responses are not stored so the retry runs
+the request again.
+
+While MongoDB is unreachable the request runs without replay protection instead of
+failing: scans are then journaled locally, and the journal's one pending row per
+team and event still keeps a retried scan from counting twice.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from scan_journal import database_unavailable
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore:
+    """First-response records keyed by the scoped idempotency key."""
+
+    def __init__(self, collection, ttl_seconds: int, lock_timeout_seconds: int):
+        self.collection = collection
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.lock_timeout = timedelta(seconds=lock_timeout_seconds)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def claim(self, key: str, fingerprint: str):
+        """
+        Returns None when the caller now owns the key and must run the request,
+        otherwise the existing record. One round trip in both cases.
+        """
+        now = datetime.utcnow()
+        try:
+            existing = await self.collection.find_one_and_update(
+                {"_id": key},
+                {"$setOnInsert": {"state": "pending", "fingerprint": fingerprint,
+                                  "started_at": now, "expires_at": now + self.ttl}},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # Two first attempts raced on the upsert; the loser sees the winner's record
+            existing = await self.collection.find_one({"_id": key})
+        if existing is None:
+            return None
+        if existing["state"] == "pending" and existing["fingerprint"] == fingerprint \
+                and existing["started_at"] < now - self.lock_timeout:
+            # The first attempt died without completing; take the key over
+            taken = await self.collection.find_one_and_update(
+                {"_id": key, "state": "pending", "started_at": existing["started_at"]},
+                {"$set": {"started_at": now, "expires_at": now + self.ttl}}
+            )
+            if taken is not None:
+                return None
+        return existing
+
+    async def complete(self, key: str, status: int, content_type: str, body: bytes):
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {"state": "done", "status": status, "content_type": content_type,
+                      "body": body.decode("utf-8", "replace")}}
+        )
+
+    async def release(self, key: str):
+        await self.collection.delete_one({"_id": key, "state": "pending"})
+
+
+class IdempotencyMiddleware:
+    """
+    Pure ASGI middleware for the given POST paths; must be registered inside
+    SessionMiddleware (i.e. added before it) so the session user is in the scope.
+    """
+
+    def __init__(self, app, store_factory, paths):
+        self.app = app
+        self.store_factory = store_factory
+        self.paths = set(paths)
+
+    @staticmethod
+    def _json_response(status, payload):
+        return status, b"application/json", json.dumps(payload).encode()
+
+    @staticmethod
+    async def _send(send, status, content_type, body, replayed=False):
+        headers = [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]
+        if replayed:
+            headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    def scoped_key(self, scope, key):
+        session_user = (scope.get("session") or {}).get("user") or {}
+        authorization = b""
+        for header, value in scope["headers"]:
+            if header == b"authorization":
+                authorization = value
+                break
+        caller = hashlib.sha256(authorization + b"\0" + str(session_user.get("email")).encode()).hexdigest()
+        return f"{scope['path']}:{caller}:{key}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        key = None
+        for header, value in scope["headers"]:
+            if header == IDEMPOTENCY_HEADER:
+                key = value.decode("latin-1").strip()
+                break
+        store = self.store_factory()
+        if not key or store is None:
+            return await self.app(scope, receive, send)
+        if len(key) > MAX_KEY_LENGTH:
+            return await self._send(send, *self._json_response(
+                400, {"detail": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"}))
+
+        # Buffer the body to fingerprint it, then replay it to the endpoint
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        scoped_key = self.scoped_key(scope, key)
+
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        try:
+            existing = await store.claim(scoped_key, fingerprint)
+        except Exception as claim_e:
+            if not database_unavailable(claim_e):
+                raise
+            print(f"Idempotency store unavailable, running {scope['path']} without replay protection: {claim_e}")
+            return await self.app(scope, replay_body, send)
+        if existing is not None:
+            if existing["fingerprint"] != fingerprint:
+                return await self._send(send, *self._json_response(
+                    422, {"detail": "Idempotency-Key was already used with a different request body"}))
+            if existing["state"] != "done":
+                return await self._send(send, *self._json_response(
+                    409, {"detail": "A request with this Idempotency-Key is still in progress"}))
+            return await self._send(send, existing["status"], existing["content_type"].encode("latin-1"),
+                                    existing["body"].encode("utf-8"), replayed=True)
+
+        response = {"status": 500, "content_type": "application/json", "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for header, value in message.get("headers", []):
+                    if header.lower() == b"content-type":
+                        response["content_type"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, capture)
+        except BaseException:
+            try:
+                await store.release(scoped_key)
+            except Exception as release_e:
+                print(f"Failed to release idempotency key for {scope['path']}: {release_e}")
+            raise
+        try:
+            if response["status"] >= 500:
+                await store.release(scoped_key)
+            else:
+                await store.complete(scoped_key, response["status"], response["content_type"], b"".join(response["body"]))
+        except Exception as store_e:
+            print(f"Failed to record idempotent response for {scope['path']}: {store_e}")
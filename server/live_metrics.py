@@ -0,0 +1,193 @@
+"""
+Live scan throughput per event (stall) and per volunteer.
+
+Every scan adds to one-second buckets kept in memory for the last `window_seconds`:
+scan count, rejects by reason and a latency histogram. Snapshots sum the buckets, so
+recording a scan is a few dict updates and reading never touches the database.
+`scans_per_minute` counts accepted scans only; rejected ones are reported separately.
+
+With several workers, each one can publish its raw window to Redis; `collect()` then
+sums the windows of all live workers. Histograms are summed before the p95 is taken,
+which keeps the merged percentile meaningful.
+"""
+import asyncio
+import bisect
+import json
+import os
+import socket
+import time
+from collections import deque
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open ended, and a
+# percentile that falls in it is reported as its lower bound (5000)
+LATENCY_BOUNDS_MS = [5, 10, 20, 35, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000]
+
+
+def _empty_totals():
+    return {"scans": 0, "rejected": 0, "rejects": {}, "latency": [0] * (len(LATENCY_BOUNDS_MS) + 1), "last_scan_at": None}
+
+
+def _add_totals(totals, other):
+    totals["scans"] += other["scans"]
+    totals["rejected"] += other["rejected"]
+    for reason, count in other["rejects"].items():
+        totals["rejects"][reason] = totals["rejects"].get(reason, 0) + count
+    totals["latency"] = [a + b for a, b in zip(totals["latency"], other["latency"])]
+    if other["last_scan_at"] and (not totals["last_scan_at"] or other["last_scan_at"] > totals["last_scan_at"]):
+        totals["last_scan_at"] = other["last_scan_at"]
+
+
+def _percentile_ms(histogram, fraction):
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for position, count in enumerate(histogram):
+        seen += count
+        if seen >= rank:
+            return LATENCY_BOUNDS_MS[min(position, len(LATENCY_BOUNDS_MS) - 1)]
+    return None
+
+
+class SlidingWindow:
+    """Per-second buckets for one key (an event or a volunteer)."""
+
+    __slots__ = ("buckets", "last_scan_at")
+
+    def __init__(self):
+        self.buckets = deque()
+        self.last_scan_at = None
+
+    def _prune(self, oldest_second):
+        while self.buckets and self.buckets[0][0] < oldest_second:
+            self.buckets.popleft()
+
+    def record(self, second, latency_ms, reject_reason, oldest_second):
+        # Pruned here too, so a worker whose window nobody reads stays bounded
+        self._prune(oldest_second)
+        if not self.buckets or self.buckets[-1][0] != second:
+            self.buckets.append([second, _empty_totals()])
+        totals = self.buckets[-1][1]
+        totals["scans"] += 1
+        if reject_reason is not None:
+            totals["rejected"] += 1
+            totals["rejects"][reject_reason] = totals["rejects"].get(reject_reason, 0) + 1
+        totals["latency"][bisect.bisect_left(LATENCY_BOUNDS_MS, latency_ms)] += 1
+        self.last_scan_at = time.time()
+
+    def totals(self, oldest_second):
+        self._prune(oldest_second)
+        totals = _empty_totals()
+        for _, bucket in self.buckets:
+            _add_totals(totals, bucket)
+        totals["last_scan_at"] = self.last_scan_at
+        return totals
+
+
+class LiveMetrics:
+    """In-process scan counters; optionally shared across workers through Redis."""
+
+    def __init__(self, window_seconds: int = 60, redis_url: str = None, publish_interval: float = 1.0):
+        self.window_seconds = window_seconds
+        self.events = {}
+        self.volunteers = {}
+        self.redis_url = redis_url
+        self.publish_interval = publish_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._redis = None
+        self._publisher = None
+
+    def record(self, event_id: str, volunteer: str, latency_ms: float, reject_reason: str = None):
+        second = int(time.time())
+        for windows, key in ((self.events, event_id), (self.volunteers, volunteer)):
+            window = windows.get(key)
+            if window is None:
+                window = windows[key] = SlidingWindow()
+            window.record(second, latency_ms, reject_reason, second - self.window_seconds + 1)
+
+    def local_window(self):
+        """Raw (mergeable) totals of this worker for the current window"""
+        oldest = int(time.time()) - self.window_seconds + 1
+        return {
+            "events": {key: window.totals(oldest) for key, window in self.events.items()},
+            "volunteers": {key: window.totals(oldest) for key, window in self.volunteers.items()},
+        }
+
+    async def collect(self):
+        """Raw totals of every worker: this one, plus the others published to Redis"""
+        windows = [self.local_window()]
+        if self._redis is not None:
+            try:
+                published = await self._redis.hgetall("live_metrics")
+                stale_before = time.time() - max(self.publish_interval * 5, 5)
+                for worker_id, payload in published.items():
+                    if worker_id.decode() == self.worker_id:
+                        continue
+                    window = json.loads(payload)
+                    if window["published_at"] >= stale_before:
+                        windows.append(window)
+            except Exception as redis_e:
+                print(f"Live metrics: could not read other workers from Redis: {redis_e}")
+        merged = {"events": {}, "volunteers": {}}
+        for window in windows:
+            for group in ("events", "volunteers"):
+                for key, totals in window[group].items():
+                    _add_totals(merged[group].setdefault(key, _empty_totals()), totals)
+        return merged
+
+    async def snapshot(self):
+        """Rates, reject reasons and p95 latency per event and per volunteer"""
+        merged = await self.collect()
+        per_minute = 60 / self.window_seconds
+
+        def summarize(totals):
+            return {
+                "scans_per_minute": round((totals["scans"] - totals["rejected"]) * per_minute, 2),
+                "scans": totals["scans"],
+                "rejected": totals["rejected"],
+                "rejects": totals["rejects"],
+                "p95_latency_ms": _percentile_ms(totals["latency"], 0.95),
+                "last_scan_at": totals["last_scan_at"],
+            }
+
+        return {
+            "window_seconds": self.window_seconds,
+            "generated_at": time.time(),
+            "events": {key: summarize(totals) for key, totals in merged["events"].items()},
+            "volunteers": {key: summarize(totals) for key, totals in merged["volunteers"].items()},
+        }
+
+    async def start(self):
+        if not self.redis_url:
+            return
+        try:
+            import redis.asyncio as redis_asyncio
+            self._redis = redis_asyncio.from_url(self.redis_url)
+            await self._redis.ping()
+        except Exception as redis_e:
+            print(f"Live metrics: Redis unavailable ({redis_e}); showing this worker only")
+            self._redis = None
+            return
+        self._publisher = asyncio.create_task(self._publish_forever())
+
+    async def _publish_forever(self):
+        while True:
+            try:
+                window = self.local_window()
+                window["published_at"] = time.time()
+                await self._redis.hset("live_metrics", self.worker_id, json.dumps(window))
+            except Exception as redis_e:
+                print(f"Live metrics: publish to Redis failed: {redis_e}")
+            await asyncio.sleep(self.publish_interval)
+
+    async def close(self):
+        if self._publisher is not None:
+            self._publisher.cancel()
+            await asyncio.gather(self._publisher, return_exceptions=True)
+        if self._redis is not None:
+            try:
+                await self._redis.hdel("live_metrics", self.worker_id)
+                await self._redis.aclose()
+            except Exception:
+                pass
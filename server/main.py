@@ -1,1128 +1,2409 @@
-from fastapi import FastAPI, Request, HTTPException, Depends
-from fastapi.responses import RedirectResponse, JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
-from authlib.integrations.starlette_client import OAuth
-# import redis
-from starlette.middleware.sessions import SessionMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List, Optional
-from pydantic import BaseModel
-import uuid
-from datetime import datetime
-import httpx
-import json
-from jose import jwt, JWTError
-from datetime import datetime, timedelta
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi import Query
-import os
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-import hashlib
-import base64
-
-# Import configurations and models
-from config import (
-    CLIENT_ID, CLIENT_SECRET,SESSION_SECRET_KEY, ADMIN_EMAIL,REDIS_URL,
-    FRONTEND_URL, MONGODB_USERNAME, MONGODB_PASSWORD, CLUSTER_NAME,
-    DATABASE_NAME, APP_NAME, DEADLINE_DATE, SECRET_KEY
-)
-from models import User, Event, Volunteer
-
-''' The backend API Endpoints setup '''
-
-app = FastAPI()
-
-security = HTTPBearer()
-
-# --- Session Middleware MUST come before CORS for cookies to work ---
-if not SESSION_SECRET_KEY:
-    raise ValueError("SESSION_SECRET_KEY environment variable not set!")
-
-app.add_middleware(
-    SessionMiddleware,
-    secret_key=SESSION_SECRET_KEY,
-    session_cookie="session_id",
-    max_age=3600,  # Session expires after 1 hour
-    same_site="none",  # Required for cross-origin cookies
-    https_only=True  # Required for production (HTTPS)
-)
-
-# --- CORS Configuration ---
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        FRONTEND_URL,
-    ],
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
-    expose_headers=["*"]
-)
-
-# --- MongoDB Connection ---
-try:
-    # Debug: Print the connection details (without password)
-    print(f"Attempting MongoDB connection...")
-    print(f"Cluster Name: {CLUSTER_NAME}")
-    print(f"Database Name: {DATABASE_NAME}")
-    print(f"App Name: {APP_NAME}")
-    print(f"Username: {MONGODB_USERNAME}")
-    
-    MONGO_URI = f"mongodb+srv://{MONGODB_USERNAME}:{MONGODB_PASSWORD}@{CLUSTER_NAME}.mongodb.net/?retryWrites=true&w=majority&appName={APP_NAME}"
-    
-    # Test DNS resolution with multiple approaches
-    import socket
-    hostname = f"{CLUSTER_NAME}.mongodb.net"
-    
-    print(f"Testing DNS resolution for: {hostname}")
-    
-    # Try different DNS resolution methods
-    dns_success = False
-    
-    try:
-        # Method 1: Standard DNS lookup
-        ip = socket.gethostbyname(hostname)
-        print(f"✅ Standard DNS resolution successful: {hostname} -> {ip}")
-        dns_success = True
-    except socket.gaierror as dns_error:
-        print(f"❌ Standard DNS resolution failed: {dns_error}")
-        
-        # Method 2: Try with timeout
-        try:
-            socket.setdefaulttimeout(10)
-            ip = socket.gethostbyname(hostname)
-            print(f"✅ DNS resolution with timeout successful: {hostname} -> {ip}")
-            dns_success = True
-        except socket.gaierror as dns_error2:
-            print(f"❌ DNS resolution with timeout also failed: {dns_error2}")
-    
-    if not dns_success:
-        print("\n🚨 DNS RESOLUTION TROUBLESHOOTING:")
-        print("1. Check if you're behind a corporate firewall/proxy")
-        print("2. Try using a different DNS server (8.8.8.8 or 1.1.1.1)")
-        print("3. Check if MongoDB Atlas is accessible from your network")
-        print("4. Verify the cluster name in MongoDB Atlas dashboard")
-        print("\n⚠️  Continuing without DNS verification - connection may still work...")
-        # Don't raise exception - let MongoDB driver handle it
-    
-    client = AsyncIOMotorClient(MONGO_URI)
-    db = client[DATABASE_NAME]
-    volunteer_collection = db.volunteers
-    teams_collection = db.teams
-    user_collection = db.users
-    event_collection = db.events
-    
-    print("MongoDB connection initialized successfully")
-except Exception as mongo_e:
-    print(f"MongoDB connection error: {mongo_e}")
-    client = None
-    db = None
-    volunteer_collection = None
-    event_collection = None
-
-
-# --- Request Models ---
-class EventCreate(BaseModel):
-    event_name: str
-    points: int
-    secret_code:str
-
-class EventUpdate(BaseModel):
-    event_name: Optional[str] = None
-    secret_code:str
-    points: Optional[int] = None
-    expired: Optional[bool] = None
-
-class VolunteerCreate(BaseModel):
-    rollNumber: str
-    name: str
-    email: str
-
-
-class EventCodeVerify(BaseModel):
-    event_name: str
-    input_secret_code: str
-
-
-class VolunteerMark(BaseModel):
-    team_id: str
-    event_name: str
-
-
-class TeamCreate(BaseModel):
-    team_name: Optional[str] = None
-
-
-class TeamAction(BaseModel):
-    team_id: str
-
-class VolunteerEventAuth(BaseModel):
-    event_id: str
-    secret_code: str
-
-class QRScanRequest(BaseModel):
-    team_id: str
-
-# --- Helper Functions ---
-def serialize_datetime_fields(obj):
-    """Convert datetime objects in a dictionary to ISO format strings"""
-    if isinstance(obj, dict):
-        result = {}
-        for key, value in obj.items():
-            if isinstance(value, datetime):
-                result[key] = value.isoformat()
-            elif isinstance(value, dict):
-                result[key] = serialize_datetime_fields(value)
-            elif isinstance(value, list):
-                result[key] = [serialize_datetime_fields(item) if isinstance(item, dict) else item for item in value]
-            else:
-                result[key] = value
-        return result
-    return obj
-
-ALGORITHM = "HS256"
-TOKEN_EXPIRE_MINUTES = 180
-
-# --- AES-GCM Encryption/Decryption for secret_code ---
-def get_encryption_key() -> bytes:
-    """Derive a 32-byte AES key from SECRET_KEY using SHA-256"""
-    return hashlib.sha256(SECRET_KEY.encode()).digest()
-
-def encrypt_secret_code(plain_text: str) -> str:
-    """
-    Encrypt plain_text using AES-GCM with a 256-bit key derived from SECRET_KEY.
-    Returns urlsafe-base64 encoded string (iv || ciphertext_with_tag).
-    """
-    if not plain_text:
-        return ""
-    
-    key = get_encryption_key()
-    aesgcm = AESGCM(key)
-    iv = os.urandom(12)  # 96-bit nonce for AES-GCM
-    ciphertext = aesgcm.encrypt(iv, plain_text.encode("utf-8"), None)
-    # Combine iv + ciphertext (ciphertext includes the authentication tag)
-    combined = iv + ciphertext
-    return base64.urlsafe_b64encode(combined).decode("utf-8")
-
-def decrypt_secret_code(encrypted_text: str) -> str:
-    """
-    Decrypt encrypted_text using AES-GCM.
-    Returns the original plaintext.
-    """
-    if not encrypted_text:
-        return ""
-    
-    try:
-        key = get_encryption_key()
-        aesgcm = AESGCM(key)
-        combined = base64.urlsafe_b64decode(encrypted_text.encode("utf-8"))
-        iv = combined[:12]  # First 12 bytes
-        ciphertext = combined[12:]  # Rest is ciphertext + tag
-        plaintext = aesgcm.decrypt(iv, ciphertext, None)
-        return plaintext.decode("utf-8")
-    except Exception as e:
-        print(f"Decryption error: {e}")
-        return ""
-
-def create_volunteer_token(volunteer_email: str, event_id: str):
-    payload = {
-        "sub": volunteer_email,
-        "event_id": event_id,
-        "exp": datetime.utcnow() + timedelta(minutes=TOKEN_EXPIRE_MINUTES)
-    }
-    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
-
-def verify_volunteer_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload  # {sub: email, event_id: ...}
-    except JWTError:
-        return None
-
-
-async def get_current_user(request: Request):
-    user = request.session.get('user')
-    if not user:
-        raise HTTPException(status_code=401, detail="User not authenticated")
-    return user
-
-async def require_admin(user: dict = Depends(get_current_user)):
-    if user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    return user
-
-async def require_admin_or_volunteer(user: dict = Depends(get_current_user)):
-    if user.get("role") not in ["admin", "volunteer"]:
-        raise HTTPException(status_code=403, detail="Admin or volunteer access required")
-    return user
-
-# --- OAuth Client Setup ---
-oauth = OAuth()
-oauth.register(
-    name='microsoft',
-    client_id=CLIENT_ID,
-    client_secret=CLIENT_SECRET,
-    server_metadata_url='https://login.microsoftonline.com/organizations/v2.0/.well-known/openid-configuration',
-    client_kwargs={
-        'scope': 'openid email profile User.Read',
-        'verify_iss': False  # Disable issuer validation to handle multi-tenant
-    }
-)
-
-
-# --- Authentication Routes ---
-
-@app.get('/api/login')
-async def login(request: Request):
-    redirect_uri = request.url_for('auth')
-    return await oauth.microsoft.authorize_redirect(request, redirect_uri)
-
-# @app.get('/api/auth')
-# async def auth(request: Request):
-#     try:
-#         code = request.query_params.get('code')
-#         if not code:
-#             return JSONResponse(status_code=400, content={"error": "No authorization code received"})
-        
-#         token_url = "https://login.microsoftonline.com/organizations/oauth2/v2.0/token"
-        
-#         async with httpx.AsyncClient() as client:
-#             token_response = await client.post(
-#                 token_url,
-#                 data={
-#                     'client_id': CLIENT_ID,
-#                     'client_secret': CLIENT_SECRET,
-#                     'code': code,
-#                     'grant_type': 'authorization_code',
-#                     'redirect_uri': str(request.url_for('auth')),
-#                     'scope': 'openid email profile User.Read'
-#                 },
-#                 headers={'Content-Type': 'application/x-www-form-urlencoded'}
-#             )
-            
-#             if token_response.status_code != 200:
-#                 print(f"Token exchange failed: {token_response.text}")
-#                 return JSONResponse(status_code=401, content={
-#                     "error": "Token exchange failed", 
-#                     "details": token_response.text
-#                 })
-            
-#             token_data = token_response.json()
-#             access_token = token_data.get('access_token')
-            
-#             if not access_token:
-#                 return JSONResponse(status_code=401, content={
-#                     "error": "No access token received", 
-#                     "details": str(token_data)
-#                 })
-            
-#             # Get user info from Microsoft Graph API
-#             async with httpx.AsyncClient() as client:
-#                 user_response = await client.get(
-#                     'https://graph.microsoft.com/v1.0/me',
-#                     headers={'Authorization': f'Bearer {access_token}'}
-#                 )
-                
-#                 if user_response.status_code != 200:
-#                     return JSONResponse(status_code=401, content={
-#                         "error": "Failed to get user info", 
-#                         "details": user_response.text
-#                     })
-                
-#                 user_data = user_response.json()
-            
-#             # Process user data
-#             email = user_data.get("mail") or user_data.get("userPrincipalName")
-
-#             if not email or not email.endswith('@iiitb.ac.in'):
-#                 return JSONResponse(
-#                     status_code=403,
-#                     content={"error": "Access Denied: Only users with an 'iiitb.ac.in' email can log in."}
-#                 )
-            
-#             name = user_data.get("displayName")
-#             roll_number = user_data.get("employeeId", "N/A")
-
-#             role = "participant"
-#             if email.lower() == ADMIN_EMAIL.lower():
-#                 role = "admin"
-#             else:
-#                 try:
-#                     is_volunteer = await volunteer_collection.find_one({"email": email.lower()})
-#                     if is_volunteer:
-#                         role = "volunteer"
-#                 except Exception as db_e:
-#                     print(f"Database error when checking volunteer status: {db_e}")
-#                     # Continue with default role if DB is unavailable
-                    
-#             # --- Create final user object and store in session ---
-#             processed_user = {
-#                 "name": name,
-#                 "email": email,
-#                 "rollNumber": roll_number,
-#                 "role": role
-#             }
-#             request.session['user'] = processed_user
-
-#             return RedirectResponse(url=f"{FRONTEND_URL}/{processed_user['role']}")
-                
-#     except Exception as e:
-#         print(f"OAuth error details: {e}")
-#         return JSONResponse(status_code=401, content={
-#             "error": "Authorization failed", 
-#             "details": str(e),
-#             "error_type": type(e).__name__
-#         })
-@app.get('/api/auth')
-async def auth(request: Request):
-    try:
-        # Initialize session if it doesn't exist
-        if not hasattr(request, 'session') or request.session is None:
-            request.session = {}
-        
-        code = request.query_params.get('code')
-        if not code:
-            return JSONResponse(status_code=400, content={"error": "No authorization code received"})
-        
-        token_url = "https://login.microsoftonline.com/organizations/oauth2/v2.0/token"
-        
-        async with httpx.AsyncClient() as client:
-            token_response = await client.post(
-                token_url,
-                data={
-                    'client_id': CLIENT_ID,
-                    'client_secret': CLIENT_SECRET,
-                    'code': code,
-                    'grant_type': 'authorization_code',
-                    'redirect_uri': str(request.url_for('auth')),
-                    'scope': 'openid email profile User.Read'
-                },
-                headers={'Content-Type': 'application/x-www-form-urlencoded'}
-            )
-            
-            if token_response.status_code != 200:
-                print(f"Token exchange failed: {token_response.text}")
-                return JSONResponse(status_code=401, content={
-                    "error": "Token exchange failed", 
-                    "details": token_response.text
-                })
-            
-            token_data = token_response.json()
-            access_token = token_data.get('access_token')
-            
-            if not access_token:
-                return JSONResponse(status_code=401, content={
-                    "error": "No access token received", 
-                    "details": str(token_data)
-                })
-            
-            # Get user info from Microsoft Graph API
-            user_response = await client.get(
-                'https://graph.microsoft.com/v1.0/me',
-                headers={'Authorization': f'Bearer {access_token}'}
-            )
-            
-            if user_response.status_code != 200:
-                return JSONResponse(status_code=401, content={
-                    "error": "Failed to get user info", 
-                    "details": user_response.text
-                })
-            
-            user_data = user_response.json()
-        
-        # Process user data
-        email = user_data.get("mail") or user_data.get("userPrincipalName")
-
-        if not email or not email.endswith('@iiitb.ac.in'):
-            return JSONResponse(
-                status_code=403,
-                content={"error": "Access Denied: Only users with an 'iiitb.ac.in' email can log in."}
-            )
-        
-        name = user_data.get("displayName")
-        roll_number = user_data.get("employeeId", "N/A")
-
-        role = "participant"
-        if email.lower() == ADMIN_EMAIL.lower():
-            role = "admin"
-        else:
-            try:
-                is_volunteer = await volunteer_collection.find_one({"email": email.lower()})
-                if is_volunteer:
-                    role = "volunteer"
-            except Exception as db_e:
-                print(f"Database error when checking volunteer status: {db_e}")
-                # Continue with default role if DB is unavailable
-                
-        # Create final user object and store in session
-        processed_user = {
-            "name": name,
-            "email": email,
-            "rollNumber": roll_number,
-            "role": role
-        }
-        
-        # Clear any existing session data and set new user
-        request.session.clear()
-        request.session['user'] = processed_user
-        
-        # For cross-domain deployments, also include user data in redirect URL
-        # Frontend will extract this and make a proper authenticated request
-        import urllib.parse
-        user_data = urllib.parse.quote(json.dumps(processed_user))
-        redirect_url = f"{FRONTEND_URL}/{processed_user['role']}?session_data={user_data}"
-
-        return RedirectResponse(url=redirect_url)
-            
-    except Exception as e:
-        print(f"OAuth error details: {e}")
-        import traceback
-        traceback.print_exc()
-        return JSONResponse(status_code=401, content={
-            "error": "Authorization failed", 
-            "details": str(e),
-            "error_type": type(e).__name__
-        })
-@app.get('/api/health')
-async def health_check():
-    """Simple health check endpoint"""
-    return JSONResponse(content={"status": "healthy", "message": "Server is running"})
-
-@app.post('/api/session/establish')
-async def establish_session(request: Request):
-    """
-    Establish session from OAuth callback data.
-    Frontend calls this after OAuth redirect with user data.
-    """
-    try:
-        body = await request.json()
-        user_data = body.get('user_data')
-        
-        if not user_data:
-            raise HTTPException(status_code=400, detail="No user data provided")
-        
-        # Validate user data structure
-        required_fields = ['name', 'email', 'rollNumber', 'role']
-        if not all(field in user_data for field in required_fields):
-            raise HTTPException(status_code=400, detail="Invalid user data")
-        
-        # Store in session
-        request.session['user'] = user_data
-        
-        return JSONResponse(content={
-            "message": "Session established successfully",
-            "user": user_data
-        })
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to establish session: {str(e)}")
-
-@app.get('/api/user/profile')
-async def user_profile(request: Request):
-    user = request.session.get('user')
-    if user:
-        return JSONResponse(content=user)
-    return JSONResponse(status_code=401, content={"error": "User not authenticated"})
-
-@app.get('/api/logout')
-async def logout(request: Request):
-    request.session.pop('user', None)
-    return RedirectResponse(url=FRONTEND_URL or "/")
-
-
-# --- Event Management Endpoints ---
-
-@app.post('/api/events')
-async def create_event(request: Request, event_data: EventCreate, admin_user: dict = Depends(require_admin)):
-    """Create a new event (Admin only)"""
-    try:
-        event_id = str(uuid.uuid4())
-        event = {
-            "event_id": event_id,
-            "event_name": event_data.event_name,
-            "points": event_data.points,
-            "secret_code": event_data.secret_code,  # Store plain text in DB
-            "expired": False,
-            "participants": 0,
-        }
-        
-        result = await event_collection.insert_one(event)
-        if result.inserted_id:
-            event["_id"] = str(result.inserted_id)
-            # Serialize datetime fields
-            event = serialize_datetime_fields(event)
-            # Encrypt secret_code before sending to frontend
-            event["secret_code"] = encrypt_secret_code(event.get("secret_code", ""))
-            return JSONResponse(content={"message": "Event created successfully", "event": event})
-        else:
-            raise HTTPException(status_code=500, detail="Failed to create event")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error creating event: {str(e)}")
-
-@app.get('/api/events')
-async def get_events(request: Request, user: dict = Depends(get_current_user)):
-    """Get all events"""
-    if event_collection is None:
-        raise HTTPException(status_code=503, detail="Database connection not available. Please check MongoDB configuration.")
-    
-    try:
-        events = []
-        async for event in event_collection.find():
-            # Convert ObjectId to string
-            event["_id"] = str(event["_id"])
-            # Serialize datetime fields
-            event = serialize_datetime_fields(event)
-            # Encrypt secret_code before sending to frontend
-            event["secret_code"] = encrypt_secret_code(event.get("secret_code", ""))
-            events.append(event)
-        return JSONResponse(content={"events": events})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching events: {str(e)}")
-
-@app.put('/api/events/{event_id}')
-async def update_event(event_id: str, event_data: EventUpdate, request: Request, admin_user: dict = Depends(require_admin)):
-    """Update an existing event (Admin only)"""
-    try:
-        update_data = {}
-        if event_data.event_name is not None:
-            update_data["event_name"] = event_data.event_name
-        if event_data.points is not None:
-            update_data["points"] = event_data.points
-        if event_data.expired is not None:
-            update_data["expired"] = event_data.expired
-        if event_data.secret_code is not None:
-            # Decrypt the incoming encrypted secret_code from client before storing
-            decrypted_code = decrypt_secret_code(event_data.secret_code)
-            update_data["secret_code"] = decrypted_code if decrypted_code else event_data.secret_code
-        
-        if not update_data:
-            raise HTTPException(status_code=400, detail="No fields to update")
-        
-        update_data["updated_at"] = datetime.utcnow()
-        update_data["updated_by"] = admin_user["email"]
-        
-        result = await event_collection.update_one(
-            {"event_id": event_id},
-            {"$set": update_data}
-        )
-        
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        # Get updated event
-        updated_event = await event_collection.find_one({"event_id": event_id})
-        if updated_event:
-            updated_event["_id"] = str(updated_event["_id"])
-            # Serialize datetime fields
-            updated_event = serialize_datetime_fields(updated_event)
-            # Encrypt secret_code before sending to frontend
-            updated_event["secret_code"] = encrypt_secret_code(updated_event.get("secret_code", ""))
-        
-        return JSONResponse(content={"message": "Event updated successfully", "event": updated_event})
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error updating event: {str(e)}")
-
-@app.delete('/api/events/{event_id}')
-async def delete_event(event_id: str, request: Request, admin_user: dict = Depends(require_admin)):
-    """Delete an event (Admin only)"""
-    try:
-        result = await event_collection.delete_one({"event_id": event_id})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        return JSONResponse(content={"message": "Event deleted successfully"})
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error deleting event: {str(e)}")
-
-
-# --- Volunteer Management Endpoints ---
-
-@app.post('/api/volunteers')
-async def add_volunteer(volunteer_data: VolunteerCreate, request: Request, admin_user: dict = Depends(require_admin)):
-    """Add a new volunteer (Admin only)"""
-    try:
-        # Check if volunteer already exists
-        existing_volunteer = await volunteer_collection.find_one({"rollNumber": volunteer_data.rollNumber})
-        if existing_volunteer:
-            raise HTTPException(status_code=400, detail="Volunteer with this roll number already exists")
-        
-        volunteer = {
-            "rollNumber": volunteer_data.rollNumber,
-            "name": volunteer_data.name,
-            "email": volunteer_data.email,
-        }
-        
-        result = await volunteer_collection.insert_one(volunteer)
-        if result.inserted_id:
-            volunteer["_id"] = str(result.inserted_id)
-            # Serialize datetime fields
-            volunteer = serialize_datetime_fields(volunteer)
-            return JSONResponse(content={"message": "Volunteer added successfully", "volunteer": volunteer})
-        else:
-            raise HTTPException(status_code=500, detail="Failed to add volunteer")
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error adding volunteer: {str(e)}")
-
-@app.get('/api/volunteers')
-async def get_volunteers(request: Request, user: dict = Depends(require_admin_or_volunteer)):
-    """Get all volunteers (Admin and Volunteer access)"""
-    try:
-        volunteers = []
-        async for volunteer in volunteer_collection.find():
-            # Convert ObjectId to string
-            volunteer["_id"] = str(volunteer["_id"])
-            # Serialize datetime fields
-            volunteer = serialize_datetime_fields(volunteer)
-            volunteers.append(volunteer)
-        return JSONResponse(content={"volunteers": volunteers})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching volunteers: {str(e)}")
-
-@app.delete('/api/volunteers/{roll_number}')
-async def remove_volunteer(roll_number: str, request: Request, admin_user: dict = Depends(require_admin)):
-    """Remove a volunteer (Admin only)"""
-    try:
-        result = await volunteer_collection.delete_one({"rollNumber": roll_number})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Volunteer not found")
-        
-        return JSONResponse(content={"message": "Volunteer removed successfully"})
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error removing volunteer: {str(e)}")
-
-@app.get('/api/volunteers/{roll_number}')
-async def get_volunteer(roll_number: str, request: Request, user: dict = Depends(require_admin_or_volunteer)):
-    """Get a specific volunteer by roll number (Admin and Volunteer access)"""
-    try:
-        volunteer = await volunteer_collection.find_one({"rollNumber": roll_number})
-        if not volunteer:
-            raise HTTPException(status_code=404, detail="Volunteer not found")
-        
-        volunteer["_id"] = str(volunteer["_id"])
-        volunteer = serialize_datetime_fields(volunteer)
-        return JSONResponse(content={"volunteer": volunteer})
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching volunteer: {str(e)}")
-
-# --- Mark Attendance Features ---
-
-@app.post("/api/volunteer/authorize")
-async def authorize_volunteer(
-    data: VolunteerEventAuth,
-    request: Request,
-    user=Depends(require_admin_or_volunteer)
-):
-    """
-    Authorize a logged-in volunteer for an event using secret code.
-    Returns a short-lived JWT token bound to that event.
-    """
-    email = user["email"]  # coming from Redis session (require_admin_or_volunteer)
-    role = user["role"]
-
-    event = await event_collection.find_one({"event_id": data.event_id})
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    if data.secret_code != event.get("secret_code"):
-        raise HTTPException(status_code=401, detail="Invalid secret code")
-    
-    # ✅ Generate token for this volunteer
-    token = create_volunteer_token(email, data.event_id)
-
-    return {
-        "message": f"Authorization successful for event '{event['event_name']}'",
-        "volunteer_email": email,
-        "role": role,
-        "token": token
-    }
-
-@app.post("/api/volunteer/scan")
-async def scan_qr(
-    data: QRScanRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    user=Depends(require_admin_or_volunteer)
-):
-    """
-    Scans team QR (containing team_id). JWT in header proves event authorization.
-    """
-    token = credentials.credentials
-    payload = verify_volunteer_token(token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid or expired event token")
-
-    event_id = payload["event_id"]
-    volunteer_email = payload["sub"]
-
-    # Verify event exists
-    event = await event_collection.find_one({"event_id": event_id})
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    team = await teams_collection.find_one({"qr_id": data.team_id})
-
-    if not team:
-        raise HTTPException(status_code=404, detail="Team not found")
-
-    if event.get("expired"):
-        raise HTTPException(status_code=400, detail="Event expired")
-
-    if event_id in team.get("events_participated", []):
-        raise HTTPException(status_code=400, detail="Team already participated in this event")
-
-    # Update team’s points and participation
-    new_points = team.get("points", 0) + event.get("points", 0)
-    teams_collection.update_one(
-        {"qr_id": data.team_id},
-        {"$set": {"points": new_points}, "$push": {"events_participated": event_id}}
-    )
-
-    # Increment event’s participant count
-    event_collection.update_one({"event_id": event_id}, {"$inc": {"participants": 1}})
-
-    return {
-        "message": f"✅ Team '{team['team_name']}' successfully scanned for event '{event['event_name']}'",
-        "volunteer": volunteer_email,
-        "points_awarded": event["points"],
-        "team_points": new_points
-    }
-@app.get("/api/events")
-async def get_events(ids: str = Query(...)):
-    try:
-        id_list = ids.split(",")
-        events = await event_collection.find(
-            {"event_id": {"$in": id_list}},
-            {"_id": 0, "event_id": 1, "event_name": 1, "points": 1}
-        ).to_list(None)
-        return events
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-# --- Participant Management ---
-@app.post('/api/leave_team')
-async def leave_team(payload: TeamAction, request: Request, user: dict = Depends(get_current_user)):
-    """Remove the requesting user from the team if before DEADLINE_DATE."""
-    if teams_collection is None:
-        raise HTTPException(status_code=503, detail="Database connection not available. Please check MongoDB configuration.")
-
-    try:
-        # Deadline check
-        if DEADLINE_DATE:
-            try:
-                # Try ISO parsing first
-                deadline_dt = datetime.fromisoformat(DEADLINE_DATE)
-            except Exception:
-                # Fallback: try date-only parsing
-                try:
-                    deadline_dt = datetime.strptime(DEADLINE_DATE, "%Y-%m-%d")
-                except Exception:
-                    deadline_dt = None
-
-            if deadline_dt:
-                now = datetime.utcnow()
-                if now > deadline_dt:
-                    return JSONResponse(status_code=400, content={"success": False, "message": "Cannot leave team after the deadline."})
-
-        team = await teams_collection.find_one({"team_id": payload.team_id})
-        if not team:
-            raise HTTPException(status_code=404, detail="Team not found")
-
-        email = user.get("email")
-        found = False
-        for m in team.get("members", []):
-            if m.get("email") == email:
-                found = True
-                break
-
-        if not found:
-            return JSONResponse(status_code=400, content={"success": False, "message": "User is not a member of this team."})
-
-        res = await teams_collection.update_one({"team_id": payload.team_id}, {"$pull": {"members": {"email": email}}})
-        if res.matched_count == 0:
-            raise HTTPException(status_code=500, detail="Failed to remove member from team")
-
-        updated_team = await teams_collection.find_one({"team_id": payload.team_id})
-
-        # Delete team if no members remaining
-        if updated_team and len(updated_team.get("members", [])) == 0:
-            await teams_collection.delete_one({"team_id": payload.team_id})
-            return JSONResponse(status_code=200, content={"success": True, "message": "Left team successfully. Team deleted as no members remain.", "team": None})
-        
-        if updated_team and "_id" in updated_team:
-            updated_team["_id"] = str(updated_team["_id"])
-        updated_team = serialize_datetime_fields(updated_team) if updated_team else updated_team
-
-        return JSONResponse(status_code=200, content={"success": True, "message": "Left team successfully.", "team": updated_team})
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error leaving team: {str(e)}")
-
-# Add these imports at the top of main.py
-import hashlib
-import base64
-
-# Add these helper functions after the existing helper functions
-
-def generate_team_qr_id(team_id: str) -> str:
-    """Generate a unique, short hashed ID for team QR code"""
-    hash_object = hashlib.sha256(team_id.encode())
-    hash_bytes = hash_object.digest()
-    # Take first 12 bytes and encode as base64 for a shorter string
-    short_hash = base64.urlsafe_b64encode(hash_bytes[:12]).decode('utf-8').rstrip('=')
-    return short_hash
-
-def generate_team_join_code(team_id: str, team_name: str) -> str:
-    """Generate a short join code for team invitation"""
-    combined = f"{team_id}-{team_name}"
-    hash_object = hashlib.sha256(combined.encode())
-    hash_bytes = hash_object.digest()
-    # Take first 6 bytes for a shorter code
-    short_code = base64.urlsafe_b64encode(hash_bytes[:6]).decode('utf-8').rstrip('=')
-    return short_code
-
-# Add these new endpoints before the leaderboard endpoint
-
-# Add this to your main.py - Replace the create_team endpoint
-
-@app.post('/api/create_team')
-async def create_team(payload: TeamCreate, request: Request, user: dict = Depends(get_current_user)):
-    """Create a new team with the requesting user as the only member."""
-    if teams_collection is None:
-        raise HTTPException(status_code=503, detail="Database connection not available. Please check MongoDB configuration.")
-
-    try:
-        # Deadline check: cannot create a team after DEADLINE_DATE
-        if DEADLINE_DATE:
-            try:
-                deadline_dt = datetime.fromisoformat(DEADLINE_DATE)
-            except Exception:
-                try:
-                    deadline_dt = datetime.strptime(DEADLINE_DATE, "%Y-%m-%d")
-                except Exception:
-                    deadline_dt = None
-
-            if deadline_dt and datetime.utcnow() > deadline_dt:
-                return JSONResponse(status_code=400, content={"success": False, "message": "Cannot create team after the deadline."})
-
-        # Ensure team_name uniqueness if provided
-        team_name = payload.team_name
-        if team_name:
-            existing_name = await teams_collection.find_one({"team_name": team_name})
-            if existing_name:
-                return JSONResponse(status_code=400, content={"success": False, "message": "Team name already taken. Choose a different name."})
-
-        # Prevent user from creating a team if already in another team
-        email = user.get("email")
-        if email:
-            already_in = await teams_collection.find_one({"members.email": email})
-            if already_in:
-                return JSONResponse(status_code=400, content={"success": False, "message": "User already belongs to a team and cannot create another."})
-
-        team_id = str(uuid.uuid4())
-        team_name = team_name or f"Team-{team_id[:8]}"
-
-        member = {
-            "name": user.get("name"),
-            "email": user.get("email"),
-            "rollNumber": user.get("rollNumber"),
-            "role": user.get("role")
-        }
-
-        # Generate QR ID and join code
-        qr_id = generate_team_qr_id(team_id)
-        join_code = generate_team_join_code(team_id, team_name)
-
-        team = {
-            "team_id": team_id,
-            "team_name": team_name,
-            "qr_id": qr_id,
-            "join_code": join_code,
-            "members": [member],
-            "points": 0,
-            "events_participated": [],
-            "created_at": datetime.utcnow(),
-            "created_by": user.get("email")
-        }
-
-        result = await teams_collection.insert_one(team)
-        if result.inserted_id:
-            team["_id"] = str(result.inserted_id)
-            team = serialize_datetime_fields(team)
-            return JSONResponse(status_code=201, content={"message": "Team created successfully", "team": team})
-        else:
-            raise HTTPException(status_code=500, detail="Failed to create team")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error creating team: {str(e)}")
-
-
-# Also update the /api/my_team endpoint to ensure it always returns qr_id and join_code
-@app.get('/api/my_team')
-async def get_my_team(request: Request, user: dict = Depends(get_current_user)):
-    """Get the team that the current user belongs to"""
-    if teams_collection is None:
-        raise HTTPException(status_code=503, detail="Database connection not available")
-    
-    try:
-        email = user.get("email")
-        if not email:
-            return JSONResponse(status_code=400, content={"error": "User roll number not found"})
-        
-        team = await teams_collection.find_one({"members.email": email})
-        
-        if not team:
-            return JSONResponse(content={"team": None, "message": "User not in any team"})
-        
-        # Convert ObjectId and serialize
-        if "_id" in team:
-            team["_id"] = str(team["_id"])
-        team = serialize_datetime_fields(team)
-        
-        # Generate QR code ID and join code if not present
-        if not team.get("qr_id"):
-            team["qr_id"] = generate_team_qr_id(team["team_id"])
-        if not team.get("join_code"):
-            team["join_code"] = generate_team_join_code(team["team_id"], team["team_name"])
-        
-        # Update the database with qr_id and join_code if they were missing
-        if not team.get("qr_id") or not team.get("join_code"):
-            await teams_collection.update_one(
-                {"team_id": team["team_id"]},
-                {"$set": {
-                    "qr_id": team["qr_id"],
-                    "join_code": team["join_code"]
-                }}
-            )
-        
-        return JSONResponse(content={"team": team})
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching team: {str(e)}")
-
-
-# Also update join_team_by_code to ensure consistency
-@app.post('/api/join_team_by_code')
-async def join_team_by_code(request: Request, user: dict = Depends(get_current_user)):
-    """Join a team using a join code"""
-    if teams_collection is None:
-        raise HTTPException(status_code=503, detail="Database connection not available")
-    
-    try:
-        body = await request.json()
-        join_code = body.get("join_code")
-        
-        if not join_code:
-            return JSONResponse(status_code=400, content={"success": False, "message": "Join code is required"})
-        
-        # Deadline check
-        if DEADLINE_DATE:
-            try:
-                deadline_dt = datetime.fromisoformat(DEADLINE_DATE)
-            except Exception:
-                try:
-                    deadline_dt = datetime.strptime(DEADLINE_DATE, "%Y-%m-%d")
-                except Exception:
-                    deadline_dt = None
-            
-            if deadline_dt and datetime.utcnow() > deadline_dt:
-                return JSONResponse(status_code=400, content={"success": False, "message": "Cannot join team after the deadline"})
-        
-        # Find team by join_code stored in database
-        matching_team = await teams_collection.find_one({"join_code": join_code})
-        
-        # If not found by stored join_code, try generating and matching (for backward compatibility)
-        if not matching_team:
-            teams_cursor = teams_collection.find()
-            async for team in teams_cursor:
-                team_join_code = generate_team_join_code(team["team_id"], team["team_name"])
-                if team_join_code == join_code:
-                    matching_team = team
-                    # Update the team with the join_code for future lookups
-                    await teams_collection.update_one(
-                        {"team_id": team["team_id"]},
-                        {"$set": {"join_code": join_code}}
-                    )
-                    break
-        
-        if not matching_team:
-            return JSONResponse(status_code=404, content={"success": False, "message": "Invalid join code"})
-        
-        # Check team size limit (max 3 members)
-        if len(matching_team.get("members", [])) >= 3:
-            return JSONResponse(status_code=400, content={"success": False, "message": "Team is full (maximum 3 members)"})
-        
-        # Check if user already in a team
-        email = user.get("email")
-        if email:
-            existing_team = await teams_collection.find_one({"members.email": email})
-            if existing_team:
-                if existing_team.get("team_id") == matching_team["team_id"]:
-                    return JSONResponse(status_code=400, content={"success": False, "message": "Already a member of this team"})
-                else:
-                    return JSONResponse(status_code=400, content={"success": False, "message": "Already belongs to another team"})
-        
-        # Add member to team
-        member = {
-            "name": user.get("name"),
-            "email": user.get("email"),
-            "rollNumber": user.get("rollNumber"),
-            "role": user.get("role")
-        }
-        
-        res = await teams_collection.update_one(
-            {"team_id": matching_team["team_id"]},
-            {"$push": {"members": member}}
-        )
-        
-        if res.matched_count == 0:
-            raise HTTPException(status_code=500, detail="Failed to add member to team")
-        
-        # Get updated team
-        updated_team = await teams_collection.find_one({"team_id": matching_team["team_id"]})
-        if updated_team and "_id" in updated_team:
-            updated_team["_id"] = str(updated_team["_id"])
-        updated_team = serialize_datetime_fields(updated_team) if updated_team else updated_team
-        
-        # Ensure QR and join code are present
-        if not updated_team.get("qr_id"):
-            updated_team["qr_id"] = generate_team_qr_id(updated_team["team_id"])
-        if not updated_team.get("join_code"):
-            updated_team["join_code"] = generate_team_join_code(updated_team["team_id"], updated_team["team_name"])
-        
-        return JSONResponse(status_code=200, content={"success": True, "message": "Joined team successfully", "team": updated_team})
-    
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error joining team: {str(e)}")
-    
-@app.get("/api/leaderboard/full")
-async def leaderboard_full():
-    """Return all teams with only name and points, sorted by points descending."""
-    if teams_collection is None:
-        raise HTTPException(
-            status_code=503,
-            detail="Database connection not available. Please check MongoDB configuration."
-        )
-    try:
-        teams = []
-        cursor = teams_collection.find({}, {"_id": 1, "team_name": 1, "points": 1}).sort("points", -1)
-        async for team in cursor:
-            team["_id"] = str(team["_id"])
-            team["name"] = team.pop("team_name") 
-            if(team["points"]>0):
-                teams.append(team)
-        return JSONResponse(content={"teams": teams})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching teams: {str(e)}")
-
+from fastapi import FastAPI, Request, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse, FileResponse
+from fastapi.middleware.cors import CORSMiddleware
+# import redis
+from starlette.middleware.sessions import SessionMiddleware
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from typing import List, Optional
+from pydantic import BaseModel
+import uuid
+from datetime import datetime
+import json
+from datetime import datetime, timedelta
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import Query
+import os
+import hashlib
+import base64
+import csv
+import io
+import hmac
+import re
+import asyncio
+import time
+from functools import lru_cache
+
+# Import configurations and models
+from config import (
+    CLIENT_ID, CLIENT_SECRET,SESSION_SECRET_KEY, ADMIN_EMAIL,REDIS_URL,
+    FRONTEND_URL, MONGODB_USERNAME, MONGODB_PASSWORD, CLUSTER_NAME,
+    DATABASE_NAME, APP_NAME, DEADLINE_DATE, SECRET_KEY,
+    EXPORT_BATCH_SIZE, QR_SIGNING_KEYS, QR_SIGNING_KEY_VERSION,
+    STORAGE_BACKEND, EMBEDDED_DATA_DIR, EMBEDDED_FSYNC_INTERVAL_MS,
+    EMBEDDED_SNAPSHOT_EVERY, EMBEDDED_SNAPSHOT_INTERVAL,
+    PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_SAMPLE_INTERVAL_MS,
+    OPERATION_PROFILES, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+    MONGO_CONNECT_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_LOCK_TIMEOUT_SECONDS,
+    WS_SCAN_CONCURRENCY, WS_SCAN_QUEUE_SIZE, WS_SCAN_AUTH_TIMEOUT_SECONDS,
+    LIVE_METRICS_WINDOW_SECONDS, LIVE_METRICS_REDIS, LIVE_METRICS_PUSH_SECONDS,
+    SEASON_ROLLOVER_BATCH_SIZE, SEASON_ROLLOVER_PAUSE_MS,
+    RECONCILE_BATCH_SIZE, RECONCILE_THROTTLE_MS,
+    RESPONSE_CACHE_MAX_BYTES, LEADERBOARD_CACHE_TTL_SECONDS, EVENTS_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_STALE_SECONDS, SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_LOG_SIZE, SLOW_QUERY_EXPLAIN,
+    SCAN_JOURNAL_ENABLED, SCAN_JOURNAL_PATH, SCAN_JOURNAL_DRAIN_BATCH, SCAN_JOURNAL_DRAIN_INTERVAL_SECONDS,
+    SCAN_JOURNAL_DEGRADED_SECONDS, ANALYTICS_CACHE_TTL_SECONDS,
+    COMPRESSION_MINIMUM_SIZE, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+)
+from models import User, Event, Volunteer
+from storage import MongoStorage, EmbeddedStorage
+from profiling import ProfileStore, ProfilingMiddleware
+from idempotency import IdempotencyStore, IdempotencyMiddleware
+from live_metrics import LiveMetrics
+from seasons import SeasonArchiver, RolloverConflict
+from response_cache import ResponseCache
+from slow_queries import SlowQueryLog, SlowQueryMiddleware
+from scan_journal import ScanJournal, DuplicateScan, database_unavailable
+from compression import Compressor, CompressionMiddleware
+
+''' The backend API Endpoints setup '''
+
+app = FastAPI()
+
+security = HTTPBearer()
+
+# --- On-demand request profiling ---
+# Added before SessionMiddleware so it runs inside it and can check for an admin session
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES)
+app.add_middleware(ProfilingMiddleware, store=profile_store, sample_interval_ms=PROFILE_SAMPLE_INTERVAL_MS)
+
+# --- Slow MongoDB operation log ---
+# Tags the commands each request issues with its endpoint; the listener is given to the Motor client below
+slow_query_log = SlowQueryLog(SLOW_QUERY_THRESHOLD_MS, capacity=SLOW_QUERY_LOG_SIZE, explain=SLOW_QUERY_EXPLAIN) \
+    if SLOW_QUERY_THRESHOLD_MS > 0 else None
+if slow_query_log is not None:
+    app.add_middleware(SlowQueryMiddleware)
+
+# --- Idempotency-Key replay for mutations that scanners and browsers retry ---
+# Also inside SessionMiddleware: keys are scoped to the session user
+app.add_middleware(
+    IdempotencyMiddleware,
+    store_factory=lambda: idempotency_store,
+    paths=["/api/volunteer/scan", "/api/join_team_by_code"]
+)
+
+# --- Session Middleware MUST come before CORS for cookies to work ---
+if not SESSION_SECRET_KEY:
+    raise ValueError("SESSION_SECRET_KEY environment variable not set!")
+
+app.add_middleware(
+    SessionMiddleware,
+    secret_key=SESSION_SECRET_KEY,
+    session_cookie="session_id",
+    max_age=3600,  # Session expires after 1 hour
+    same_site="none",  # Required for cross-origin cookies
+    https_only=True  # Required for production (HTTPS)
+)
+
+# --- CORS Configuration ---
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[
+        FRONTEND_URL,
+    ],
+    allow_credentials=True,
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_headers=["*"],
+    expose_headers=["*"]
+)
+
+# --- Response compression ---
+# Added last so it is outermost and compresses the final body; the response cache shares the compressor
+compressor = Compressor(COMPRESSION_MINIMUM_SIZE, gzip_level=COMPRESSION_GZIP_LEVEL, brotli_quality=COMPRESSION_BROTLI_QUALITY) \
+    if COMPRESSION_MINIMUM_SIZE > 0 else None
+if compressor is not None:
+    app.add_middleware(CompressionMiddleware, compressor=compressor)
+
+# --- Storage / MongoDB Connection ---
+# Endpoints use the collections handed out by the storage backend, never a client directly.
+try:
+    if STORAGE_BACKEND == "embedded":
+        print(f"Using embedded storage in {EMBEDDED_DATA_DIR}")
+        storage = EmbeddedStorage(
+            EMBEDDED_DATA_DIR,
+            fsync_interval_ms=EMBEDDED_FSYNC_INTERVAL_MS,
+            snapshot_every=EMBEDDED_SNAPSHOT_EVERY,
+            snapshot_interval=EMBEDDED_SNAPSHOT_INTERVAL
+        )
+    else:
+        # Debug: Print the connection details (without password)
+        print(f"Attempting MongoDB connection...")
+        print(f"Cluster Name: {CLUSTER_NAME}")
+        print(f"Database Name: {DATABASE_NAME}")
+        print(f"App Name: {APP_NAME}")
+        print(f"Username: {MONGODB_USERNAME}")
+    
+        MONGO_URI = f"mongodb+srv://{MONGODB_USERNAME}:{MONGODB_PASSWORD}@{CLUSTER_NAME}.mongodb.net/?retryWrites=true&w=majority&appName={APP_NAME}"
+    
+        storage = MongoStorage(
+            MONGO_URI,
+            DATABASE_NAME,
+            profiles=OPERATION_PROFILES,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=[slow_query_log] if slow_query_log is not None else []
+        )
+
+    volunteer_collection = storage.volunteers
+    teams_collection = storage.teams
+    user_collection = storage.users
+    event_collection = storage.events
+    idempotency_store = IdempotencyStore(
+        storage.collection("idempotency_keys"),
+        ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+        lock_timeout_seconds=IDEMPOTENCY_LOCK_TIMEOUT_SECONDS
+    )
+    season_archiver = SeasonArchiver(
+        storage,
+        batch_size=SEASON_ROLLOVER_BATCH_SIZE,
+        pause_seconds=SEASON_ROLLOVER_PAUSE_MS / 1000
+    )
+    
+    print("Storage initialized successfully")
+except Exception as mongo_e:
+    print(f"Storage initialization error: {mongo_e}")
+    storage = None
+    volunteer_collection = None
+    teams_collection = None
+    user_collection = None
+    event_collection = None
+    idempotency_store = None
+    season_archiver = None
+
+
+# --- Live scan metrics (in-process, optionally merged across workers via Redis) ---
+live_metrics = LiveMetrics(
+    window_seconds=LIVE_METRICS_WINDOW_SECONDS,
+    redis_url=REDIS_URL if LIVE_METRICS_REDIS else None
+)
+
+@app.on_event("startup")
+async def start_live_metrics():
+    await live_metrics.start()
+
+@app.on_event("shutdown")
+async def close_live_metrics():
+    await live_metrics.close()
+
+
+# --- Degraded-mode scan journal (optional) ---
+scan_journal = ScanJournal(
+    SCAN_JOURNAL_PATH,
+    batch_size=SCAN_JOURNAL_DRAIN_BATCH,
+    drain_interval=SCAN_JOURNAL_DRAIN_INTERVAL_SECONDS,
+    degraded_seconds=SCAN_JOURNAL_DEGRADED_SECONDS
+) if SCAN_JOURNAL_ENABLED else None
+
+@app.on_event("startup")
+async def start_scan_journal():
+    if scan_journal is not None:
+        await scan_journal.start(apply_journaled_scans)
+
+@app.on_event("shutdown")
+async def close_scan_journal():
+    if scan_journal is not None:
+        await scan_journal.close()
+
+
+# --- Response micro-cache for hot reads (per worker) ---
+# Announcements send hundreds of identical reads at once; each cached route runs its
+# query once per TTL, and concurrent misses wait on the same computation
+response_cache = ResponseCache(
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+    default_stale=RESPONSE_CACHE_STALE_SECONDS,
+    compressor=compressor
+)
+
+
+def log_mongo_dns_diagnostics():
+    """Check the Atlas hostname resolves; runs off the event loop after startup, purely for the logs"""
+    # Test DNS resolution with multiple approaches
+    import socket
+    hostname = f"{CLUSTER_NAME}.mongodb.net"
+
+    print(f"Testing DNS resolution for: {hostname}")
+
+    # Try different DNS resolution methods
+    dns_success = False
+
+    try:
+        # Method 1: Standard DNS lookup
+        ip = socket.gethostbyname(hostname)
+        print(f"✅ Standard DNS resolution successful: {hostname} -> {ip}")
+        dns_success = True
+    except socket.gaierror as dns_error:
+        print(f"❌ Standard DNS resolution failed: {dns_error}")
+    
+        # Method 2: Try with timeout
+        try:
+            socket.setdefaulttimeout(10)
+            ip = socket.gethostbyname(hostname)
+            print(f"✅ DNS resolution with timeout successful: {hostname} -> {ip}")
+            dns_success = True
+        except socket.gaierror as dns_error2:
+            print(f"❌ DNS resolution with timeout also failed: {dns_error2}")
+
+    if not dns_success:
+        print("\n🚨 DNS RESOLUTION TROUBLESHOOTING:")
+        print("1. Check if you're behind a corporate firewall/proxy")
+        print("2. Try using a different DNS server (8.8.8.8 or 1.1.1.1)")
+        print("3. Check if MongoDB Atlas is accessible from your network")
+        print("4. Verify the cluster name in MongoDB Atlas dashboard")
+        print("\n⚠️  Continuing without DNS verification - connection may still work...")
+        # Don't raise exception - let MongoDB driver handle it
+
+
+@app.on_event("startup")
+async def start_dns_diagnostics():
+    # Deferred so a slow resolver never holds up the first request
+    if STORAGE_BACKEND != "embedded":
+        asyncio.get_running_loop().run_in_executor(None, log_mongo_dns_diagnostics)
+
+
+@app.on_event("startup")
+async def start_storage():
+    if storage is not None:
+        await storage.start()
+    if slow_query_log is not None and isinstance(storage, MongoStorage):
+        slow_query_log.attach(storage.client)
+
+@app.on_event("shutdown")
+async def close_storage():
+    if storage is not None:
+        await storage.close()
+
+
+@app.on_event("startup")
+async def schedule_index_creation():
+    # Index builds are idempotent round trips to the server; keep them off the startup path
+    app.state.index_task = asyncio.create_task(ensure_indexes())
+
+
+# Index builds that failed at startup, by index; reported by /api/health
+index_errors = {}
+
+
+def record_index_error(name, index_e, unique=False):
+    index_errors[name] = f"{type(index_e).__name__}: {index_e}"
+    # A missing unique index means the invariant it guards is no longer enforced
+    consequence = " (uniqueness is NOT enforced)" if unique else ""
+    print(f"ERROR: MongoDB index creation failed for {name}{consequence}: {index_e}")
+
+
+async def ensure_indexes():
+    """Create the indexes that the request paths look teams up by and that enforce team invariants"""
+    if teams_collection is None:
+        return
+    team_indexes = [
+        ("team_id", {"unique": True}),
+        ("qr_id", {}),
+        ("legacy_qr_id", {"sparse": True}),
+        # Leaderboard sort and rank counts
+        ([("points", -1)], {}),
+        # One team per name and one team per participant, whatever the request interleaving
+        ("team_name", {"unique": True}),
+        ("members.email", {"unique": True, "partialFilterExpression": {"members.email": {"$exists": True}}}),
+        ("join_code", {"unique": True, "sparse": True}),
+        # Retroactive event corrections find every participating team in one indexed update_many
+        ("events_participated", {}),
+    ]
+    for keys, options in team_indexes:
+        try:
+            await teams_collection.create_index(keys, **options)
+        except Exception as index_e:
+            record_index_error(f"teams {keys}", index_e, unique=options.get("unique", False))
+    try:
+        await idempotency_store.ensure_indexes()
+    except Exception as index_e:
+        record_index_error("idempotency keys", index_e)
+    try:
+        await season_archiver.ensure_indexes()
+    except Exception as index_e:
+        record_index_error("season archives", index_e, unique=True)
+
+
+# --- Request Models ---
+class EventCreate(BaseModel):
+    event_name: str
+    points: int
+    secret_code:str
+
+class EventUpdate(BaseModel):
+    event_name: Optional[str] = None
+    secret_code:str
+    points: Optional[int] = None
+    expired: Optional[bool] = None
+
+class VolunteerCreate(BaseModel):
+    rollNumber: str
+    name: str
+    email: str
+
+
+class EventCodeVerify(BaseModel):
+    event_name: str
+    input_secret_code: str
+
+
+class VolunteerMark(BaseModel):
+    team_id: str
+    event_name: str
+
+
+class TeamCreate(BaseModel):
+    team_name: Optional[str] = None
+
+
+class SeasonRollover(BaseModel):
+    season: str
+
+
+class TeamAction(BaseModel):
+    team_id: str
+
+class VolunteerEventAuth(BaseModel):
+    event_id: str
+    secret_code: str
+
+class QRScanRequest(BaseModel):
+    team_id: str
+
+# --- Helper Functions ---
+# --- Field selection (?fields=a,b) ---
+# Per resource and role: (fields the caller may select, fields returned without ?fields=; None means
+# whole documents). Roles not listed get the None entry. Dotted names select fields of array items.
+EVENT_FIELDS = ["event_id", "event_name", "points", "expired", "participants"]
+VOLUNTEER_FIELDS = ["rollNumber", "name", "email"]
+MEMBER_FIELDS = ["members.name", "members.email", "members.rollNumber"]
+MY_TEAM_FIELDS = ["team_id", "team_name", "qr_id", "join_code", "points", "events_participated", "participated_events"]
+FIELD_SELECTIONS = {
+    "events": {
+        # Only admins see secret codes; leaving them out also skips encrypting one per event
+        "admin": ({"_id", *EVENT_FIELDS, "secret_code", "created_at", "updated_at"}, None),
+        None: (set(EVENT_FIELDS), EVENT_FIELDS),
+    },
+    "volunteers": {
+        "admin": ({"_id", *VOLUNTEER_FIELDS}, None),
+        None: (set(VOLUNTEER_FIELDS), VOLUNTEER_FIELDS),
+    },
+    "my_team": {
+        None: ({"_id", *MY_TEAM_FIELDS, "members", *MEMBER_FIELDS, "members.role", "members.joined_at",
+                "created_at", "created_by"},
+               MY_TEAM_FIELDS + MEMBER_FIELDS),
+    },
+}
+
+def field_projection(resource: str, role: Optional[str], fields: Optional[str]) -> Optional[dict]:
+    """MongoDB projection for ?fields= (or the role's default); None fetches whole documents"""
+    selections = FIELD_SELECTIONS[resource]
+    allowed, default = selections.get(role, selections[None])
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = sorted(set(names) - allowed)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(sorted(allowed))}"
+            )
+    elif default is None:
+        return None
+    else:
+        names = default
+    # A whole subdocument already includes its dotted fields (MongoDB rejects both)
+    projection = {name: 1 for name in names if name.split(".")[0] == name or name.split(".")[0] not in names}
+    projection.setdefault("_id", 0)
+    return projection
+
+def serialize_datetime_fields(obj):
+    """Convert datetime objects in a dictionary to ISO format strings"""
+    if isinstance(obj, dict):
+        result = {}
+        for key, value in obj.items():
+            if isinstance(value, datetime):
+                result[key] = value.isoformat()
+            elif isinstance(value, dict):
+                result[key] = serialize_datetime_fields(value)
+            elif isinstance(value, list):
+                result[key] = [serialize_datetime_fields(item) if isinstance(item, dict) else item for item in value]
+            else:
+                result[key] = value
+        return result
+    return obj
+
+ALGORITHM = "HS256"
+TOKEN_EXPIRE_MINUTES = 180
+
+# --- AES-GCM Encryption/Decryption for secret_code ---
+def get_encryption_key() -> bytes:
+    """Derive a 32-byte AES key from SECRET_KEY using SHA-256"""
+    return hashlib.sha256(SECRET_KEY.encode()).digest()
+
+@lru_cache(maxsize=None)
+def get_aesgcm():
+    """AES-GCM cipher for secret codes; cryptography is only imported once an event route needs it"""
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    return AESGCM(get_encryption_key())
+
+def encrypt_secret_code(plain_text: str) -> str:
+    """
+    Encrypt plain_text using AES-GCM with a 256-bit key derived from SECRET_KEY.
+    Returns urlsafe-base64 encoded string (iv || ciphertext_with_tag).
+    """
+    if not plain_text:
+        return ""
+    
+    aesgcm = get_aesgcm()
+    iv = os.urandom(12)  # 96-bit nonce for AES-GCM
+    ciphertext = aesgcm.encrypt(iv, plain_text.encode("utf-8"), None)
+    # Combine iv + ciphertext (ciphertext includes the authentication tag)
+    combined = iv + ciphertext
+    return base64.urlsafe_b64encode(combined).decode("utf-8")
+
+def decrypt_secret_code(encrypted_text: str) -> str:
+    """
+    Decrypt encrypted_text using AES-GCM.
+    Returns the original plaintext.
+    """
+    if not encrypted_text:
+        return ""
+    
+    try:
+        aesgcm = get_aesgcm()
+        combined = base64.urlsafe_b64decode(encrypted_text.encode("utf-8"))
+        iv = combined[:12]  # First 12 bytes
+        ciphertext = combined[12:]  # Rest is ciphertext + tag
+        plaintext = aesgcm.decrypt(iv, ciphertext, None)
+        return plaintext.decode("utf-8")
+    except Exception as e:
+        print(f"Decryption error: {e}")
+        return ""
+
+def create_volunteer_token(volunteer_email: str, event_id: str):
+    from jose import jwt
+    payload = {
+        "sub": volunteer_email,
+        "event_id": event_id,
+        "exp": datetime.utcnow() + timedelta(minutes=TOKEN_EXPIRE_MINUTES)
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+def verify_volunteer_token(token: str):
+    from jose import jwt, JWTError
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return payload  # {sub: email, event_id: ...}
+    except JWTError:
+        return None
+
+
+async def get_current_user(request: Request):
+    user = request.session.get('user')
+    if not user:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+    return user
+
+async def require_admin(user: dict = Depends(get_current_user)):
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+async def require_admin_or_volunteer(user: dict = Depends(get_current_user)):
+    if user.get("role") not in ["admin", "volunteer"]:
+        raise HTTPException(status_code=403, detail="Admin or volunteer access required")
+    return user
+
+# --- OAuth Client Setup ---
+# Registered on the first /api/login so authlib stays out of the import path
+@lru_cache(maxsize=None)
+def get_oauth():
+    from authlib.integrations.starlette_client import OAuth
+    oauth = OAuth()
+    oauth.register(
+        name='microsoft',
+        client_id=CLIENT_ID,
+        client_secret=CLIENT_SECRET,
+        server_metadata_url='https://login.microsoftonline.com/organizations/v2.0/.well-known/openid-configuration',
+        client_kwargs={
+            'scope': 'openid email profile User.Read',
+            'verify_iss': False  # Disable issuer validation to handle multi-tenant
+        }
+    )
+    return oauth
+
+
+# --- Authentication Routes ---
+
+@app.get('/api/login')
+async def login(request: Request):
+    redirect_uri = request.url_for('auth')
+    return await get_oauth().microsoft.authorize_redirect(request, redirect_uri)
+
+# @app.get('/api/auth')
+# async def auth(request: Request):
+#     try:
+#         code = request.query_params.get('code')
+#         if not code:
+#             return JSONResponse(status_code=400, content={"error": "No authorization code received"})
+        
+#         token_url = "https://login.microsoftonline.com/organizations/oauth2/v2.0/token"
+        
+#         async with httpx.AsyncClient() as client:
+#             token_response = await client.post(
+#                 token_url,
+#                 data={
+#                     'client_id': CLIENT_ID,
+#                     'client_secret': CLIENT_SECRET,
+#                     'code': code,
+#                     'grant_type': 'authorization_code',
+#                     'redirect_uri': str(request.url_for('auth')),
+#                     'scope': 'openid email profile User.Read'
+#                 },
+#                 headers={'Content-Type': 'application/x-www-form-urlencoded'}
+#             )
+            
+#             if token_response.status_code != 200:
+#                 print(f"Token exchange failed: {token_response.text}")
+#                 return JSONResponse(status_code=401, content={
+#                     "error": "Token exchange failed", 
+#                     "details": token_response.text
+#                 })
+            
+#             token_data = token_response.json()
+#             access_token = token_data.get('access_token')
+            
+#             if not access_token:
+#                 return JSONResponse(status_code=401, content={
+#                     "error": "No access token received", 
+#                     "details": str(token_data)
+#                 })
+            
+#             # Get user info from Microsoft Graph API
+#             async with httpx.AsyncClient() as client:
+#                 user_response = await client.get(
+#                     'https://graph.microsoft.com/v1.0/me',
+#                     headers={'Authorization': f'Bearer {access_token}'}
+#                 )
+                
+#                 if user_response.status_code != 200:
+#                     return JSONResponse(status_code=401, content={
+#                         "error": "Failed to get user info", 
+#                         "details": user_response.text
+#                     })
+                
+#                 user_data = user_response.json()
+            
+#             # Process user data
+#             email = user_data.get("mail") or user_data.get("userPrincipalName")
+
+#             if not email or not email.endswith('@iiitb.ac.in'):
+#                 return JSONResponse(
+#                     status_code=403,
+#                     content={"error": "Access Denied: Only users with an 'iiitb.ac.in' email can log in."}
+#                 )
+            
+#             name = user_data.get("displayName")
+#             roll_number = user_data.get("employeeId", "N/A")
+
+#             role = "participant"
+#             if email.lower() == ADMIN_EMAIL.lower():
+#                 role = "admin"
+#             else:
+#                 try:
+#                     is_volunteer = await volunteer_collection.find_one({"email": email.lower()})
+#                     if is_volunteer:
+#                         role = "volunteer"
+#                 except Exception as db_e:
+#                     print(f"Database error when checking volunteer status: {db_e}")
+#                     # Continue with default role if DB is unavailable
+                    
+#             # --- Create final user object and store in session ---
+#             processed_user = {
+#                 "name": name,
+#                 "email": email,
+#                 "rollNumber": roll_number,
+#                 "role": role
+#             }
+#             request.session['user'] = processed_user
+
+#             return RedirectResponse(url=f"{FRONTEND_URL}/{processed_user['role']}")
+                
+#     except Exception as e:
+#         print(f"OAuth error details: {e}")
+#         return JSONResponse(status_code=401, content={
+#             "error": "Authorization failed", 
+#             "details": str(e),
+#             "error_type": type(e).__name__
+#         })
+@app.get('/api/auth')
+async def auth(request: Request):
+    import httpx
+    try:
+        # Initialize session if it doesn't exist
+        if not hasattr(request, 'session') or request.session is None:
+            request.session = {}
+        
+        code = request.query_params.get('code')
+        if not code:
+            return JSONResponse(status_code=400, content={"error": "No authorization code received"})
+        
+        token_url = "https://login.microsoftonline.com/organizations/oauth2/v2.0/token"
+        
+        async with httpx.AsyncClient() as client:
+            token_response = await client.post(
+                token_url,
+                data={
+                    'client_id': CLIENT_ID,
+                    'client_secret': CLIENT_SECRET,
+                    'code': code,
+                    'grant_type': 'authorization_code',
+                    'redirect_uri': str(request.url_for('auth')),
+                    'scope': 'openid email profile User.Read'
+                },
+                headers={'Content-Type': 'application/x-www-form-urlencoded'}
+            )
+            
+            if token_response.status_code != 200:
+                print(f"Token exchange failed: {token_response.text}")
+                return JSONResponse(status_code=401, content={
+                    "error": "Token exchange failed", 
+                    "details": token_response.text
+                })
+            
+            token_data = token_response.json()
+            access_token = token_data.get('access_token')
+            
+            if not access_token:
+                return JSONResponse(status_code=401, content={
+                    "error": "No access token received", 
+                    "details": str(token_data)
+                })
+            
+            # Get user info from Microsoft Graph API
+            user_response = await client.get(
+                'https://graph.microsoft.com/v1.0/me',
+                headers={'Authorization': f'Bearer {access_token}'}
+            )
+            
+            if user_response.status_code != 200:
+                return JSONResponse(status_code=401, content={
+                    "error": "Failed to get user info", 
+                    "details": user_response.text
+                })
+            
+            user_data = user_response.json()
+        
+        # Process user data
+        email = user_data.get("mail") or user_data.get("userPrincipalName")
+
+        if not email or not email.endswith('@iiitb.ac.in'):
+            return JSONResponse(
+                status_code=403,
+                content={"error": "Access Denied: Only users with an 'iiitb.ac.in' email can log in."}
+            )
+        
+        name = user_data.get("displayName")
+        roll_number = user_data.get("employeeId", "N/A")
+
+        role = "participant"
+        if email.lower() == ADMIN_EMAIL.lower():
+            role = "admin"
+        else:
+            try:
+                is_volunteer = await volunteer_collection.find_one({"email": email.lower()})
+                if is_volunteer:
+                    role = "volunteer"
+            except Exception as db_e:
+                print(f"Database error when checking volunteer status: {db_e}")
+                # Continue with default role if DB is unavailable
+                
+        # Create final user object and store in session
+        processed_user = {
+            "name": name,
+            "email": email,
+            "rollNumber": roll_number,
+            "role": role
+        }
+        
+        # Clear any existing session data and set new user
+        request.session.clear()
+        request.session['user'] = processed_user
+        
+        # For cross-domain deployments, also include user data in redirect URL
+        # Frontend will extract this and make a proper authenticated request
+        import urllib.parse
+        user_data = urllib.parse.quote(json.dumps(processed_user))
+        redirect_url = f"{FRONTEND_URL}/{processed_user['role']}?session_data={user_data}"
+
+        return RedirectResponse(url=redirect_url)
+            
+    except Exception as e:
+        print(f"OAuth error details: {e}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse(status_code=401, content={
+            "error": "Authorization failed", 
+            "details": str(e),
+            "error_type": type(e).__name__
+        })
+@app.get('/api/health')
+async def health_check():
+    """Simple health check endpoint; degraded while a startup index build has failed"""
+    if index_errors:
+        return JSONResponse(content={"status": "degraded", "message": "Server is running, but some indexes are missing", "index_errors": index_errors})
+    return JSONResponse(content={"status": "healthy", "message": "Server is running"})
+
+@app.post('/api/session/establish')
+async def establish_session(request: Request):
+    """
+    Establish session from OAuth callback data.
+    Frontend calls this after OAuth redirect with user data.
+    """
+    try:
+        body = await request.json()
+        user_data = body.get('user_data')
+        
+        if not user_data:
+            raise HTTPException(status_code=400, detail="No user data provided")
+        
+        # Validate user data structure
+        required_fields = ['name', 'email', 'rollNumber', 'role']
+        if not all(field in user_data for field in required_fields):
+            raise HTTPException(status_code=400, detail="Invalid user data")
+        
+        # Store in session
+        request.session['user'] = user_data
+        
+        return JSONResponse(content={
+            "message": "Session established successfully",
+            "user": user_data
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to establish session: {str(e)}")
+
+@app.get('/api/user/profile')
+async def user_profile(request: Request):
+    user = request.session.get('user')
+    if user:
+        return JSONResponse(content=user)
+    return JSONResponse(status_code=401, content={"error": "User not authenticated"})
+
+@app.get('/api/logout')
+async def logout(request: Request):
+    request.session.pop('user', None)
+    return RedirectResponse(url=FRONTEND_URL or "/")
+
+
+# --- Event Management Endpoints ---
+
+@app.post('/api/events')
+async def create_event(request: Request, event_data: EventCreate, admin_user: dict = Depends(require_admin)):
+    """Create a new event (Admin only)"""
+    try:
+        event_id = str(uuid.uuid4())
+        event = {
+            "event_id": event_id,
+            "event_name": event_data.event_name,
+            "points": event_data.points,
+            "secret_code": event_data.secret_code,  # Store plain text in DB
+            "expired": False,
+            "participants": 0,
+            # Season rollover archives events by creation time
+            "created_at": datetime.utcnow(),
+        }
+        
+        result = await event_collection.insert_one(event)
+        if result.inserted_id:
+            event["_id"] = str(result.inserted_id)
+            # Serialize datetime fields
+            event = serialize_datetime_fields(event)
+            # Encrypt secret_code before sending to frontend
+            event["secret_code"] = encrypt_secret_code(event.get("secret_code", ""))
+            response_cache.invalidate("events")
+            response_cache.invalidate("analytics")
+            return JSONResponse(content={"message": "Event created successfully", "event": event})
+        else:
+            raise HTTPException(status_code=500, detail="Failed to create event")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating event: {str(e)}")
+
+@app.get('/api/events')
+@response_cache.cached("events", ttl=EVENTS_CACHE_TTL_SECONDS,
+                       key=lambda kwargs: (kwargs["user"].get("role") == "admin", kwargs.get("fields")))
+async def get_events(request: Request, fields: Optional[str] = None, user: dict = Depends(get_current_user)):
+    """Get all events; ?fields=event_id,event_name returns only those fields"""
+    if event_collection is None:
+        raise HTTPException(status_code=503, detail="Database connection not available. Please check MongoDB configuration.")
+    
+    projection = field_projection("events", "admin" if user.get("role") == "admin" else None, fields)
+    try:
+        events = []
+        with storage.timeout("events"):
+            events_cursor = storage.collection("events", "events").find({}, projection)
+            async for event in events_cursor:
+                # Convert ObjectId to string
+                if "_id" in event:
+                    event["_id"] = str(event["_id"])
+                # Serialize datetime fields
+                event = serialize_datetime_fields(event)
+                # Encrypt secret_code before sending to frontend
+                if projection is None or "secret_code" in projection:
+                    event["secret_code"] = encrypt_secret_code(event.get("secret_code", ""))
+                events.append(event)
+        return JSONResponse(content={"events": events})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching events: {str(e)}")
+
+# --- Team points change notifications ---
+# Callbacks run after a bulk points correction (a retroactive event change or a reconcile
+# batch), e.g. to drop cached leaderboards.
+points_changed_hooks = []
+
+def on_points_changed(hook):
+    """Register an async hook(summary) to run after team points are corrected in bulk"""
+    points_changed_hooks.append(hook)
+    return hook
+
+async def notify_points_changed(summary: dict):
+    for hook in points_changed_hooks:
+        try:
+            await hook(summary)
+        except Exception as hook_e:
+            print(f"Points changed hook {getattr(hook, '__name__', hook)} failed: {hook_e}")
+
+async def adjust_participating_teams(event_id: str, points_delta: int, update: dict) -> dict:
+    """
+    Apply one update_many to every team that participated in event_id and summarize it.
+    Assumes teams hold the event's current points; the reconciliation job repairs any that do not.
+    """
+    with storage.timeout("points"):
+        result = await storage.collection("teams", "points").update_many({"events_participated": event_id}, update)
+    summary = {"event_id": event_id, "points_delta": points_delta, "teams_matched": result.matched_count, "teams_updated": result.modified_count}
+    await notify_points_changed(summary)
+    return summary
+
+@on_points_changed
+async def invalidate_cached_leaderboard(summary: dict):
+    response_cache.invalidate("leaderboard")
+    response_cache.invalidate("analytics")
+
+@app.put('/api/events/{event_id}')
+async def update_event(event_id: str, event_data: EventUpdate, request: Request, retroactive: bool = Query(False), admin_user: dict = Depends(require_admin)):
+    """
+    Update an existing event (Admin only).
+    With retroactive=true a points change is also applied to every team that already participated.
+    """
+    try:
+        update_data = {}
+        if event_data.event_name is not None:
+            update_data["event_name"] = event_data.event_name
+        if event_data.points is not None:
+            update_data["points"] = event_data.points
+        if event_data.expired is not None:
+            update_data["expired"] = event_data.expired
+        if event_data.secret_code is not None:
+            # Decrypt the incoming encrypted secret_code from client before storing
+            decrypted_code = decrypt_secret_code(event_data.secret_code)
+            update_data["secret_code"] = decrypted_code if decrypted_code else event_data.secret_code
+        
+        if not update_data:
+            raise HTTPException(status_code=400, detail="No fields to update")
+        
+        update_data["updated_at"] = datetime.utcnow()
+        update_data["updated_by"] = admin_user["email"]
+        
+        # The previous points come back with the update, for the retroactive delta
+        previous_event = await event_collection.find_one_and_update(
+            {"event_id": event_id},
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
+        )
+        
+        if previous_event is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        
+        adjustment = None
+        points_delta = update_data.get("points", previous_event.get("points", 0)) - previous_event.get("points", 0)
+        if retroactive and points_delta:
+            adjustment = await adjust_participating_teams(event_id, points_delta, {"$inc": {"points": points_delta}})
+        
+        updated_event = {**previous_event, **update_data}
+        event_names.pop(event_id, None)
+        response_cache.invalidate("events")
+        response_cache.invalidate("analytics")
+        if updated_event:
+            updated_event["_id"] = str(updated_event["_id"])
+            # Serialize datetime fields
+            updated_event = serialize_datetime_fields(updated_event)
+            # Encrypt secret_code before sending to frontend
+            updated_event["secret_code"] = encrypt_secret_code(updated_event.get("secret_code", ""))
+        
+        return JSONResponse(content={"message": "Event updated successfully", "event": updated_event, "retroactive": adjustment})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating event: {str(e)}")
+
+@app.delete('/api/events/{event_id}')
+async def delete_event(event_id: str, request: Request, retroactive: bool = Query(False), admin_user: dict = Depends(require_admin)):
+    """
+    Delete an event (Admin only).
+    With retroactive=true the event is also removed from every team that participated, along with its points.
+    """
+    try:
+        deleted_event = await event_collection.find_one_and_delete({"event_id": event_id}, projection={"_id": 0, "points": 1})
+        
+        if deleted_event is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        
+        response_cache.invalidate("events")
+        response_cache.invalidate("analytics")
+        adjustment = None
+        if retroactive:
+            points = deleted_event.get("points", 0)
+            adjustment = await adjust_participating_teams(event_id, -points, {
+                "$pull": {"events_participated": event_id, "attendance": {"event_id": event_id}},
+                "$inc": {"points": -points}
+            })
+        
+        return JSONResponse(content={"message": "Event deleted successfully", "retroactive": adjustment})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting event: {str(e)}")
+
+
+# --- Volunteer Management Endpoints ---
+
+@app.post('/api/volunteers')
+async def add_volunteer(volunteer_data: VolunteerCreate, request: Request, admin_user: dict = Depends(require_admin)):
+    """Add a new volunteer (Admin only)"""
+    try:
+        # Check if volunteer already exists
+        existing_volunteer = await volunteer_collection.find_one({"rollNumber": volunteer_data.rollNumber})
+        if existing_volunteer:
+            raise HTTPException(status_code=400, detail="Volunteer with this roll number already exists")
+        
+        volunteer = {
+            "rollNumber": volunteer_data.rollNumber,
+            "name": volunteer_data.name,
+            "email": volunteer_data.email,
+        }
+        
+        result = await volunteer_collection.insert_one(volunteer)
+        if result.inserted_id:
+            volunteer["_id"] = str(result.inserted_id)
+            # Serialize datetime fields
+            volunteer = serialize_datetime_fields(volunteer)
+            return JSONResponse(content={"message": "Volunteer added successfully", "volunteer": volunteer})
+        else:
+            raise HTTPException(status_code=500, detail="Failed to add volunteer")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error adding volunteer: {str(e)}")
+
+@app.get('/api/volunteers')
+async def get_volunteers(request: Request, fields: Optional[str] = None, user: dict = Depends(require_admin_or_volunteer)):
+    """Get all volunteers (Admin and Volunteer access); ?fields= selects the returned fields"""
+    projection = field_projection("volunteers", user.get("role"), fields)
+    try:
+        volunteers = []
+        async for volunteer in volunteer_collection.find({}, projection):
+            # Convert ObjectId to string
+            if "_id" in volunteer:
+                volunteer["_id"] = str(volunteer["_id"])
+            # Serialize datetime fields
+            volunteer = serialize_datetime_fields(volunteer)
+            volunteers.append(volunteer)
+        return JSONResponse(content={"volunteers": volunteers})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching volunteers: {str(e)}")
+
+@app.delete('/api/volunteers/{roll_number}')
+async def remove_volunteer(roll_number: str, request: Request, admin_user: dict = Depends(require_admin)):
+    """Remove a volunteer (Admin only)"""
+    try:
+        result = await volunteer_collection.delete_one({"rollNumber": roll_number})
+        
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Volunteer not found")
+        
+        return JSONResponse(content={"message": "Volunteer removed successfully"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error removing volunteer: {str(e)}")
+
+@app.get('/api/volunteers/{roll_number}')
+async def get_volunteer(roll_number: str, request: Request, user: dict = Depends(require_admin_or_volunteer)):
+    """Get a specific volunteer by roll number (Admin and Volunteer access)"""
+    try:
+        volunteer = await volunteer_collection.find_one({"rollNumber": roll_number})
+        if not volunteer:
+            raise HTTPException(status_code=404, detail="Volunteer not found")
+        
+        volunteer["_id"] = str(volunteer["_id"])
+        volunteer = serialize_datetime_fields(volunteer)
+        return JSONResponse(content={"volunteer": volunteer})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching volunteer: {str(e)}")
+
+# --- Mark Attendance Features ---
+
+@app.post("/api/volunteer/authorize")
+async def authorize_volunteer(
+    data: VolunteerEventAuth,
+    request: Request,
+    user=Depends(require_admin_or_volunteer)
+):
+    """
+    Authorize a logged-in volunteer for an event using secret code.
+    Returns a short-lived JWT token bound to that event.
+    """
+    email = user["email"]  # coming from Redis session (require_admin_or_volunteer)
+    role = user["role"]
+
+    event = await event_collection.find_one({"event_id": data.event_id})
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if data.secret_code != event.get("secret_code"):
+        raise HTTPException(status_code=401, detail="Invalid secret code")
+    
+    # ✅ Generate token for this volunteer
+    token = create_volunteer_token(email, data.event_id)
+
+    return {
+        "message": f"Authorization successful for event '{event['event_name']}'",
+        "volunteer_email": email,
+        "role": role,
+        "token": token
+    }
+
+@app.post("/api/volunteer/scan")
+async def scan_qr(
+    data: QRScanRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user=Depends(require_admin_or_volunteer)
+):
+    """
+    Scans team QR (signed payload carrying team_id, or a legacy qr_id).
+    JWT in header proves event authorization.
+    """
+    token = credentials.credentials
+    payload = verify_volunteer_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid or expired event token")
+
+    result = await perform_scan(payload["event_id"], payload["sub"], data.team_id)
+    if result.get("pending"):
+        # Journaled during a database outage; points are added when it is replayed
+        return JSONResponse(status_code=202, content=result)
+    return result
+
+
+async def perform_scan(event_id: str, volunteer_email: str, qr_code: str) -> dict:
+    """Award the event's points to the team behind qr_code; shared by the HTTP and WebSocket scan paths"""
+    started = time.perf_counter()
+    try:
+        result = await award_or_journal_scan(event_id, volunteer_email, qr_code)
+    except HTTPException as scan_e:
+        live_metrics.record(event_id, volunteer_email, (time.perf_counter() - started) * 1000, str(scan_e.detail))
+        raise
+    except Exception:
+        live_metrics.record(event_id, volunteer_email, (time.perf_counter() - started) * 1000, "Server error")
+        raise
+    live_metrics.record(event_id, volunteer_email, (time.perf_counter() - started) * 1000)
+    if not result.get("pending"):
+        # The events list carries participant counts
+        response_cache.invalidate("events")
+        response_cache.invalidate("analytics")
+    return result
+
+
+async def award_or_journal_scan(event_id: str, volunteer_email: str, qr_code: str) -> dict:
+    """award_scan, falling back to the local scan journal while MongoDB is unreachable"""
+    if scan_journal is None:
+        return await award_scan(event_id, volunteer_email, qr_code)
+    team_filter = team_lookup_filter(qr_code)
+    team_key = f"team_id:{team_filter['team_id']}" if "team_id" in team_filter else f"qr_id:{qr_code}"
+    if scan_journal.is_pending(team_key, event_id):
+        raise HTTPException(status_code=400, detail="Team already participated in this event")
+    if not scan_journal.degraded:
+        try:
+            return await award_scan(event_id, volunteer_email, qr_code)
+        except Exception as scan_e:
+            if not database_unavailable(scan_e):
+                raise
+            scan_journal.mark_degraded(scan_e)
+    try:
+        await scan_journal.append(team_key, event_id, qr_code, volunteer_email)
+    except DuplicateScan:
+        raise HTTPException(status_code=400, detail="Team already participated in this event")
+    return {
+        "message": "Scan saved offline; the points are added as soon as the database is reachable",
+        "volunteer": volunteer_email,
+        "pending": True
+    }
+
+
+async def award_scan(event_id: str, volunteer_email: str, qr_code: str) -> dict:
+    # Reject malformed or forged QR codes before any database work
+    team_filter = team_lookup_filter(qr_code)
+
+    # Verify event exists
+    event = await event_collection.find_one({"event_id": event_id})
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    team = await teams_collection.find_one(team_filter)
+
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+
+    if event.get("expired"):
+        raise HTTPException(status_code=400, detail="Event expired")
+
+    if event_id in team.get("events_participated", []):
+        raise HTTPException(status_code=400, detail="Team already participated in this event")
+
+    # Award points atomically; the filter stops a concurrent scan of the same team double counting
+    with storage.timeout("points"):
+        updated_team = await storage.collection("teams", "points").find_one_and_update(
+            {"team_id": team["team_id"], "events_participated": {"$ne": event_id}},
+            {
+                "$inc": {"points": event.get("points", 0)},
+                "$push": {
+                    "events_participated": event_id,
+                    # When and by whom the team was scanned, shown on the team dashboard
+                    "attendance": {"event_id": event_id, "scanned_at": datetime.utcnow(), "volunteer": volunteer_email}
+                }
+            },
+            projection={"_id": 0, "points": 1},
+            return_document=ReturnDocument.AFTER
+        )
+    if updated_team is None:
+        raise HTTPException(status_code=400, detail="Team already participated in this event")
+
+    # Increment event’s participant count
+    with storage.timeout("counters"):
+        await storage.collection("events", "counters").update_one({"event_id": event_id}, {"$inc": {"participants": 1}})
+
+    return {
+        "message": f"✅ Team '{team['team_name']}' successfully scanned for event '{event['event_name']}'",
+        "volunteer": volunteer_email,
+        "points_awarded": event["points"],
+        "team_points": updated_team["points"]
+    }
+
+
+async def apply_journaled_scans(rows: list) -> dict:
+    """
+    Replay journaled scans in bulk: {row id: None when applied, or the reason it was rejected}.
+    The same $ne guard as a live scan makes a replay of an already counted scan a no-op;
+    such rows are reported as already participated rather than applied.
+    """
+    outcomes = {}
+    event_ids = list({row["event_id"] for row in rows})
+    events = {event["event_id"]: event async for event in event_collection.find(
+        {"event_id": {"$in": event_ids}}, {"_id": 0, "event_id": 1, "points": 1, "expired": 1})}
+
+    # Signed QR codes carry the team_id; legacy ones still need a lookup
+    team_ids = {}
+    for row in rows:
+        if row["event_id"] not in events:
+            outcomes[row["id"]] = "Event not found"
+            continue
+        if events[row["event_id"]].get("expired"):
+            outcomes[row["id"]] = "Event expired"
+            continue
+        try:
+            team_filter = team_lookup_filter(row["qr_code"])
+        except HTTPException as qr_e:
+            outcomes[row["id"]] = qr_e.detail
+            continue
+        if "team_id" in team_filter:
+            team_ids[row["id"]] = team_filter["team_id"]
+        else:
+            team = await teams_collection.find_one(team_filter, {"_id": 0, "team_id": 1})
+            team_ids[row["id"]] = team["team_id"] if team else None
+    existing = set(await teams_collection.distinct("team_id", {"team_id": {"$in": [t for t in team_ids.values() if t]}}))
+
+    updates = []
+    queued = {}
+    for row in rows:
+        if row["id"] in outcomes:
+            continue
+        team_id = team_ids.get(row["id"])
+        if team_id not in existing:
+            outcomes[row["id"]] = "Team not found"
+            continue
+        event_id = row["event_id"]
+        # Millisecond precision, as MongoDB stores it, so the entry can be found again below
+        scanned_at = datetime.fromisoformat(row["scanned_at"])
+        scanned_at = scanned_at.replace(microsecond=scanned_at.microsecond // 1000 * 1000)
+        attendance = {"event_id": event_id, "scanned_at": scanned_at, "volunteer": row["volunteer"]}
+        updates.append(UpdateOne(
+            {"team_id": team_id, "events_participated": {"$ne": event_id}},
+            {
+                "$inc": {"points": events[event_id].get("points", 0)},
+                "$push": {"events_participated": event_id, "attendance": attendance}
+            }
+        ))
+        queued[row["id"]] = (team_id, attendance)
+    if not updates:
+        return outcomes
+
+    with storage.timeout("points"):
+        result = await storage.collection("teams", "points").bulk_write(updates, ordered=False)
+    if result.modified_count == len(updates):
+        applied = set(queued)
+    else:
+        # Some $ne guards matched nothing: the team had already been counted for that event. A row
+        # is applied only if its own attendance entry is there (possibly from an unsettled earlier drain).
+        landed = {}
+        async for team in teams_collection.find(
+                {"team_id": {"$in": list({team_id for team_id, _ in queued.values()})}},
+                {"_id": 0, "team_id": 1, "attendance": 1}):
+            landed[team["team_id"]] = team.get("attendance", [])
+        applied = {row_id for row_id, (team_id, attendance) in queued.items() if attendance in landed.get(team_id, [])}
+    for row_id in queued:
+        outcomes[row_id] = None if row_id in applied else "Team already participated in this event"
+
+    if result.modified_count:
+        # Recount instead of $inc: replays of scans that were already counted must not add to it
+        for event_id in {row["event_id"] for row in rows if row["id"] in applied}:
+            participants = await teams_collection.count_documents({"events_participated": event_id})
+            await event_collection.update_one({"event_id": event_id}, {"$set": {"participants": participants}})
+        response_cache.invalidate("leaderboard")
+        response_cache.invalidate("events")
+        response_cache.invalidate("analytics")
+    return outcomes
+
+
+async def websocket_user(websocket: WebSocket):
+    """Session user for WebSocket routes (the HTTP dependencies need a Request)"""
+    return websocket.session.get('user')
+
+
+async def receive_text_frame(websocket: WebSocket) -> Optional[str]:
+    """Next text frame, or None for a binary one; raises WebSocketDisconnect when the client leaves"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    return message.get("text")
+
+
+@app.websocket("/ws/volunteer/scan")
+async def scan_channel(websocket: WebSocket, user: Optional[dict] = Depends(websocket_user)):
+    """
+    Persistent scanning channel. The session and event token are checked once:
+    the first frame must be {"type": "auth", "token": <event token>}. After that every
+    {"id": <correlation id>, "team_id": <QR payload>} frame gets one result frame
+    {"id", "ok", ...} back; results can arrive out of order when scans are pipelined.
+    At most WS_SCAN_QUEUE_SIZE scans are buffered; beyond that the socket is not read,
+    which pushes back on the client through TCP flow control. Binary frames close the
+    channel with 1003.
+    """
+    # CORS does not cover WebSockets; refuse cross-site pages riding on the session cookie
+    origin = websocket.headers.get("origin")
+    if origin and origin != FRONTEND_URL:
+        await websocket.close(code=1008, reason="Origin not allowed")
+        return
+    if not user or user.get("role") not in ["admin", "volunteer"]:
+        await websocket.close(code=1008, reason="Admin or volunteer access required")
+        return
+    await websocket.accept()
+
+    try:
+        text = await asyncio.wait_for(receive_text_frame(websocket), timeout=WS_SCAN_AUTH_TIMEOUT_SECONDS)
+        if text is None:
+            await websocket.close(code=1003, reason="Text frames only")
+            return
+        auth = json.loads(text)
+    except WebSocketDisconnect:
+        return
+    except (asyncio.TimeoutError, ValueError):
+        await websocket.close(code=1008, reason="Expected auth frame")
+        return
+    payload = verify_volunteer_token(auth.get("token", "")) if isinstance(auth, dict) else None
+    if not payload:
+        await websocket.close(code=1008, reason="Invalid or expired event token")
+        return
+    event_id = payload["event_id"]
+    volunteer_email = payload["sub"]
+    token_expiry = payload.get("exp")
+    await websocket.send_json({"type": "ready", "event_id": event_id})
+
+    scans = asyncio.Queue(maxsize=WS_SCAN_QUEUE_SIZE)
+    send_lock = asyncio.Lock()
+
+    async def send_frame(frame):
+        async with send_lock:
+            await websocket.send_json(frame)
+
+    async def scan_worker():
+        while True:
+            message = await scans.get()
+            if message is None:
+                return
+            correlation_id = message.get("id")
+            try:
+                if token_expiry is not None and time.time() >= token_expiry:
+                    raise HTTPException(status_code=401, detail="Invalid or expired event token")
+                if not isinstance(message.get("team_id"), str):
+                    raise HTTPException(status_code=422, detail="team_id is required")
+                result = await perform_scan(event_id, volunteer_email, message["team_id"])
+                frame = {"id": correlation_id, "ok": True, **result}
+            except HTTPException as scan_e:
+                frame = {"id": correlation_id, "ok": False, "status": scan_e.status_code, "detail": scan_e.detail}
+            except Exception as scan_e:
+                print(f"WebSocket scan error: {scan_e}")
+                frame = {"id": correlation_id, "ok": False, "status": 500, "detail": "Error scanning team"}
+            finally:
+                scans.task_done()
+            try:
+                await send_frame(frame)
+            except Exception:
+                # Client went away; the reader notices the disconnect and stops the workers
+                pass
+
+    workers = [asyncio.create_task(scan_worker()) for _ in range(WS_SCAN_CONCURRENCY)]
+    try:
+        while True:
+            text = await receive_text_frame(websocket)
+            if text is None:
+                await websocket.close(code=1003, reason="Text frames only")
+                break
+            try:
+                message = json.loads(text)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                await send_frame({"id": None, "ok": False, "status": 422, "detail": "Expected a JSON object"})
+                continue
+            if message.get("type") == "ping":
+                await send_frame({"type": "pong", "id": message.get("id")})
+                continue
+            # Blocks once the queue is full, so a fast client cannot pile up unbounded work
+            await scans.put(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Nobody is left to read results: drop scans that have not started,
+        # but let in-flight ones finish rather than cancelling them between writes
+        while not scans.empty():
+            scans.get_nowait()
+            scans.task_done()
+        for _ in workers:
+            await scans.put(None)
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+# --- Participant Management ---
+@app.post('/api/leave_team')
+async def leave_team(payload: TeamAction, request: Request, user: dict = Depends(get_current_user)):
+    """Remove the requesting user from the team if before DEADLINE_DATE."""
+    if teams_collection is None:
+        raise HTTPException(status_code=503, detail="Database connection not available. Please check MongoDB configuration.")
+
+    try:
+        # Deadline check
+        if DEADLINE_DATE:
+            try:
+                # Try ISO parsing first
+                deadline_dt = datetime.fromisoformat(DEADLINE_DATE)
+            except Exception:
+                # Fallback: try date-only parsing
+                try:
+                    deadline_dt = datetime.strptime(DEADLINE_DATE, "%Y-%m-%d")
+                except Exception:
+                    deadline_dt = None
+
+            if deadline_dt:
+                now = datetime.utcnow()
+                if now > deadline_dt:
+                    return JSONResponse(status_code=400, content={"success": False, "message": "Cannot leave team after the deadline."})
+
+        # Membership check, removal and re-read in one round trip
+        email = user.get("email")
+        updated_team = await teams_collection.find_one_and_update(
+            {"team_id": payload.team_id, "members.email": email},
+            {"$pull": {"members": {"email": email}}},
+            return_document=ReturnDocument.AFTER
+        )
+
+        if updated_team is None:
+            # Failure path only: tell a missing team apart from a non-member
+            if not await teams_collection.find_one({"team_id": payload.team_id}, {"_id": 1}):
+                raise HTTPException(status_code=404, detail="Team not found")
+            return JSONResponse(status_code=400, content={"success": False, "message": "User is not a member of this team."})
+
+        # Delete team if no members remaining (unless someone joined in the meantime)
+        if len(updated_team.get("members", [])) == 0:
+            await teams_collection.delete_one({"team_id": payload.team_id, "members": {"$size": 0}})
+            return JSONResponse(status_code=200, content={"success": True, "message": "Left team successfully. Team deleted as no members remain.", "team": None})
+        
+        if updated_team and "_id" in updated_team:
+            updated_team["_id"] = str(updated_team["_id"])
+        updated_team = serialize_datetime_fields(updated_team) if updated_team else updated_team
+
+        return JSONResponse(status_code=200, content={"success": True, "message": "Left team successfully.", "team": updated_team})
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error leaving team: {str(e)}")
+
+# Add these imports at the top of main.py
+import hashlib
+import base64
+
+# Add these helper functions after the existing helper functions
+
+# --- Signed team QR codes ---
+# Format: "<key version>.<team uuid, base64url>.<truncated HMAC-SHA256, base64url>"
+# The scanner can verify a code and recover the team_id without touching the database.
+
+QR_SIGNATURE_BYTES = 12
+LEGACY_QR_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16}$")
+
+
+def load_qr_signing_keys() -> dict:
+    """Parse QR_SIGNING_KEYS into {version: key bytes}"""
+    keys = {}
+    for entry in QR_SIGNING_KEYS.split(","):
+        if not entry.strip():
+            continue
+        version, _, secret = entry.strip().partition(":")
+        keys[int(version)] = secret.encode()
+    if not keys:
+        keys[1] = hashlib.sha256(f"team-qr:{SECRET_KEY}".encode()).digest()
+    if QR_SIGNING_KEY_VERSION not in keys:
+        raise ValueError(f"QR_SIGNING_KEY_VERSION {QR_SIGNING_KEY_VERSION} has no key in QR_SIGNING_KEYS")
+    return keys
+
+QR_KEYS = load_qr_signing_keys()
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode('utf-8').rstrip('=')
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _qr_signature(version: int, team_bytes: bytes) -> bytes:
+    message = version.to_bytes(2, "big") + team_bytes
+    return hmac.new(QR_KEYS[version], message, hashlib.sha256).digest()[:QR_SIGNATURE_BYTES]
+
+
+def generate_team_qr_id(team_id: str, version: int = None) -> str:
+    """Generate a signed, self-verifying QR payload carrying the team_id (current key version by default)"""
+    if version is None:
+        version = QR_SIGNING_KEY_VERSION
+    team_bytes = uuid.UUID(team_id).bytes
+    return f"{version}.{_b64encode(team_bytes)}.{_b64encode(_qr_signature(version, team_bytes))}"
+
+def generate_legacy_team_qr_id(team_id: str) -> str:
+    """The original unsigned QR id (truncated SHA-256 of team_id), still accepted when scanning"""
+    hash_bytes = hashlib.sha256(team_id.encode()).digest()
+    return _b64encode(hash_bytes[:12])
+
+def verify_team_qr_id(qr_id: str) -> Optional[str]:
+    """Return the team_id carried by a signed QR payload, or None if it is malformed or forged"""
+    try:
+        version_text, team_text, signature_text = qr_id.split(".")
+        version = int(version_text)
+        team_bytes = _b64decode(team_text)
+        signature = _b64decode(signature_text)
+    except (ValueError, TypeError):
+        return None
+    if version not in QR_KEYS or len(team_bytes) != 16:
+        return None
+    if not hmac.compare_digest(signature, _qr_signature(version, team_bytes)):
+        return None
+    return str(uuid.UUID(bytes=team_bytes))
+
+def team_lookup_filter(qr_id: str) -> dict:
+    """
+    Build the teams query for a scanned QR code without any database work.
+    Signed codes resolve straight to team_id; legacy codes are matched on the stored ids.
+    Raises HTTPException(400) for anything that is neither.
+    """
+    team_id = verify_team_qr_id(qr_id) if "." in qr_id else None
+    if team_id:
+        return {"team_id": team_id}
+    if LEGACY_QR_ID_PATTERN.match(qr_id):
+        return {"$or": [{"qr_id": qr_id}, {"legacy_qr_id": qr_id}]}
+    raise HTTPException(status_code=400, detail="Invalid QR code")
+
+def qr_id_needs_upgrade(qr_id: Optional[str]) -> bool:
+    """True when a stored QR id is missing, unsigned, or signed with a non-current key version"""
+    return not qr_id or not qr_id.startswith(f"{QR_SIGNING_KEY_VERSION}.")
+
+def qr_id_upgrade(team: dict) -> dict:
+    """$set fields that move a team onto a current signed QR id, keeping an unsigned one scannable"""
+    update = {"qr_id": generate_team_qr_id(team["team_id"])}
+    old_qr_id = team.get("qr_id")
+    if old_qr_id and LEGACY_QR_ID_PATTERN.match(old_qr_id):
+        update["legacy_qr_id"] = old_qr_id
+    return update
+
+def generate_team_join_code(team_id: str, team_name: str) -> str:
+    """Generate a short join code for team invitation"""
+    combined = f"{team_id}-{team_name}"
+    hash_object = hashlib.sha256(combined.encode())
+    hash_bytes = hash_object.digest()
+    # Take first 6 bytes for a shorter code
+    short_code = base64.urlsafe_b64encode(hash_bytes[:6]).decode('utf-8').rstrip('=')
+    return short_code
+
+# Add these new endpoints before the leaderboard endpoint
+
+# Add this to your main.py - Replace the create_team endpoint
+
+@app.post('/api/create_team')
+async def create_team(payload: TeamCreate, request: Request, user: dict = Depends(get_current_user)):
+    """Create a new team with the requesting user as the only member."""
+    if teams_collection is None:
+        raise HTTPException(status_code=503, detail="Database connection not available. Please check MongoDB configuration.")
+
+    try:
+        # Deadline check: cannot create a team after DEADLINE_DATE
+        if DEADLINE_DATE:
+            try:
+                deadline_dt = datetime.fromisoformat(DEADLINE_DATE)
+            except Exception:
+                try:
+                    deadline_dt = datetime.strptime(DEADLINE_DATE, "%Y-%m-%d")
+                except Exception:
+                    deadline_dt = None
+
+            if deadline_dt and datetime.utcnow() > deadline_dt:
+                return JSONResponse(status_code=400, content={"success": False, "message": "Cannot create team after the deadline."})
+
+        # Name and membership uniqueness are enforced by the unique indexes on insert
+        team_name = payload.team_name
+        team_id = str(uuid.uuid4())
+        team_name = team_name or f"Team-{team_id[:8]}"
+
+        member = {
+            "name": user.get("name"),
+            "email": user.get("email"),
+            "rollNumber": user.get("rollNumber"),
+            "role": user.get("role")
+        }
+
+        # Generate QR ID and join code
+        qr_id = generate_team_qr_id(team_id)
+        join_code = generate_team_join_code(team_id, team_name)
+
+        team = {
+            "team_id": team_id,
+            "team_name": team_name,
+            "qr_id": qr_id,
+            "join_code": join_code,
+            "members": [member],
+            "points": 0,
+            "events_participated": [],
+            "created_at": datetime.utcnow(),
+            "created_by": user.get("email")
+        }
+
+        try:
+            result = await teams_collection.insert_one(team)
+        except DuplicateKeyError as dup_e:
+            duplicate_key = (dup_e.details or {}).get("keyPattern", {})
+            if "team_name" in duplicate_key:
+                return JSONResponse(status_code=400, content={"success": False, "message": "Team name already taken. Choose a different name."})
+            if "members.email" in duplicate_key:
+                return JSONResponse(status_code=400, content={"success": False, "message": "User already belongs to a team and cannot create another."})
+            raise
+
+        if result.inserted_id:
+            team["_id"] = str(result.inserted_id)
+            team = serialize_datetime_fields(team)
+            return JSONResponse(status_code=201, content={"message": "Team created successfully", "team": team})
+        else:
+            raise HTTPException(status_code=500, detail="Failed to create team")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating team: {str(e)}")
+
+
+# Also update the /api/my_team endpoint to ensure it always returns qr_id and join_code
+@app.get('/api/my_team')
+async def get_my_team(request: Request, fields: Optional[str] = None, user: dict = Depends(get_current_user)):
+    """Get the team that the current user belongs to; ?fields= selects the returned fields"""
+    if teams_collection is None:
+        raise HTTPException(status_code=503, detail="Database connection not available")
+    
+    projection = field_projection("my_team", user.get("role"), fields)
+    returned = {name.split(".")[0] for name, included in projection.items() if included}
+    # Also fetch what the code generation and event lookup below need, whether returned or not
+    stored = {name: 1 for name in projection if name != "participated_events"}
+    stored.update({"team_id": 1, "team_name": 1, "qr_id": 1, "join_code": 1})
+    if "participated_events" in returned:
+        stored.update({"events_participated": 1, "attendance": 1})
+    try:
+        email = user.get("email")
+        if not email:
+            return JSONResponse(status_code=400, content={"error": "User roll number not found"})
+        
+        pipeline = [
+            {"$match": {"members.email": email}},
+            {"$limit": 1},
+            {"$project": stored},
+        ]
+        if "participated_events" in returned:
+            # The names/points of its events in the same round trip
+            pipeline.append({"$lookup": {
+                "from": "events",
+                "localField": "events_participated",
+                "foreignField": "event_id",
+                "pipeline": [{"$project": {"_id": 0, "event_id": 1, "event_name": 1, "points": 1}}],
+                "as": "participated_events"
+            }})
+        teams = await teams_collection.aggregate(pipeline).to_list(1)
+        team = teams[0] if teams else None
+        
+        if not team:
+            return JSONResponse(content={"team": None, "message": "User not in any team"})
+        
+        if "participated_events" in returned:
+            # In participation order, with the scan time for teams scanned since attendance was recorded
+            events_by_id = {event["event_id"]: event for event in team["participated_events"]}
+            scanned_at = {entry["event_id"]: entry.get("scanned_at") for entry in team.get("attendance", [])}
+            team["participated_events"] = [
+                {**events_by_id[event_id], "scanned_at": scanned_at.get(event_id)}
+                for event_id in team.get("events_participated", [])
+                if event_id in events_by_id
+            ]
+        team.pop("attendance", None)
+        
+        # Convert ObjectId and serialize
+        if "_id" in team:
+            team["_id"] = str(team["_id"])
+        team = serialize_datetime_fields(team)
+        
+        # Generate a signed QR id and join code if missing, migrating unsigned QR ids
+        code_updates = {}
+        if qr_id_needs_upgrade(team.get("qr_id")):
+            code_updates.update(qr_id_upgrade(team))
+        if not team.get("join_code"):
+            code_updates["join_code"] = generate_team_join_code(team["team_id"], team["team_name"])
+        
+        # Persist the generated codes so later scans and joins find them
+        if code_updates:
+            await teams_collection.update_one(
+                {"team_id": team["team_id"]},
+                {"$set": code_updates}
+            )
+            team.update(code_updates)
+        
+        team = {key: value for key, value in team.items() if key in returned}
+        return JSONResponse(content={"team": team})
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching team: {str(e)}")
+
+
+async def team_rank_summary(team_id: str, points: int) -> dict:
+    """
+    Rank, percentile and neighbour gaps of a team with `points` (read through the "leaderboard" profile).
+    Uses index range counts/lookups on points, so no team documents are fetched or sorted.
+    Teams on equal points share a rank. The team itself is excluded from the counts and
+    neighbours, so a replica that lags behind its latest scan cannot rank it against itself.
+    """
+    teams = storage.collection("teams", "leaderboard")
+    others = {"team_id": {"$ne": team_id}}
+    with storage.timeout("leaderboard"):
+        # A pure range count stays an index-only count; the team itself is taken off with a
+        # second, unique-key count rather than a $ne that would fetch every team above
+        teams_above = await teams.count_documents({"points": {"$gt": points}})
+        if teams_above and await teams.count_documents({"team_id": team_id, "points": {"$gt": points}}):
+            teams_above -= 1
+        total_teams = await teams.estimated_document_count()
+        team_above = await teams.find_one({**others, "points": {"$gt": points}}, {"_id": 0, "team_name": 1, "points": 1}, sort=[("points", 1)])
+        team_below = await teams.find_one({**others, "points": {"$lt": points}}, {"_id": 0, "team_name": 1, "points": 1}, sort=[("points", -1)])
+
+    total_teams = max(total_teams, teams_above + 1)
+    return {
+        "rank": teams_above + 1,
+        "total_teams": total_teams,
+        # Share of teams on the same or fewer points
+        "percentile": round(100 * (total_teams - teams_above) / total_teams, 2),
+        "points_to_next_rank": team_above["points"] - points if team_above else None,
+        "next_team": team_above["team_name"] if team_above else None,
+        "lead_over_previous_rank": points - team_below["points"] if team_below else None,
+        "previous_team": team_below["team_name"] if team_below else None,
+    }
+
+@app.get('/api/my_team/rank')
+async def get_my_team_rank(request: Request, user: dict = Depends(get_current_user)):
+    """Get the current user's team rank without downloading the full leaderboard"""
+    if teams_collection is None:
+        raise HTTPException(status_code=503, detail="Database connection not available")
+    
+    try:
+        email = user.get("email")
+        if not email:
+            return JSONResponse(status_code=400, content={"error": "User email not found"})
+        
+        # Same read profile as the counts, so the points and the ranking come from one view of the data
+        with storage.timeout("leaderboard"):
+            team = await storage.collection("teams", "leaderboard").find_one(
+                {"members.email": email}, {"_id": 0, "team_id": 1, "team_name": 1, "points": 1})
+        if not team:
+            return JSONResponse(content={"rank": None, "message": "User not in any team"})
+        
+        points = team.get("points", 0)
+        summary = await team_rank_summary(team["team_id"], points)
+        return JSONResponse(content={
+            "team_id": team["team_id"],
+            "team_name": team["team_name"],
+            "points": points,
+            **summary
+        })
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching team rank: {str(e)}")
+
+
+MAX_TEAM_SIZE = 3
+
+async def add_team_member(join_code: str, member: dict) -> Optional[dict]:
+    """Push member onto the team with this join code if it has room and they are not already in it"""
+    return await teams_collection.find_one_and_update(
+        {
+            "join_code": join_code,
+            f"members.{MAX_TEAM_SIZE - 1}": {"$exists": False},
+            "members.email": {"$ne": member["email"]}
+        },
+        {"$push": {"members": member}},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def backfill_legacy_join_code(join_code: str) -> Optional[dict]:
+    """Find a team whose join code was never stored by regenerating codes, and store it"""
+    teams_cursor = teams_collection.find({"join_code": {"$exists": False}}, {"_id": 0, "team_id": 1, "team_name": 1, "members.email": 1})
+    async for team in teams_cursor:
+        if generate_team_join_code(team["team_id"], team["team_name"]) == join_code:
+            await teams_collection.update_one(
+                {"team_id": team["team_id"]},
+                {"$set": {"join_code": join_code}}
+            )
+            return team
+    return None
+
+# Also update join_team_by_code to ensure consistency
+@app.post('/api/join_team_by_code')
+async def join_team_by_code(request: Request, user: dict = Depends(get_current_user)):
+    """Join a team using a join code"""
+    if teams_collection is None:
+        raise HTTPException(status_code=503, detail="Database connection not available")
+    
+    try:
+        body = await request.json()
+        join_code = body.get("join_code")
+        
+        if not join_code:
+            return JSONResponse(status_code=400, content={"success": False, "message": "Join code is required"})
+        
+        # Deadline check
+        if DEADLINE_DATE:
+            try:
+                deadline_dt = datetime.fromisoformat(DEADLINE_DATE)
+            except Exception:
+                try:
+                    deadline_dt = datetime.strptime(DEADLINE_DATE, "%Y-%m-%d")
+                except Exception:
+                    deadline_dt = None
+            
+            if deadline_dt and datetime.utcnow() > deadline_dt:
+                return JSONResponse(status_code=400, content={"success": False, "message": "Cannot join team after the deadline"})
+        
+        email = user.get("email")
+        member = {
+            "name": user.get("name"),
+            "email": email,
+            "rollNumber": user.get("rollNumber"),
+            "role": user.get("role")
+        }
+        
+        # Capacity, duplicate-member check, push and re-read in one round trip.
+        # The unique members.email index rejects users who already belong to another team.
+        try:
+            updated_team = await add_team_member(join_code, member)
+            matching_team = None
+            if updated_team is None:
+                # Failure path only: work out why the conditional update did not match
+                matching_team = await teams_collection.find_one({"join_code": join_code}, {"_id": 0, "team_id": 1, "members.email": 1})
+                if not matching_team:
+                    # Teams created before join codes were stored (backward compatibility)
+                    matching_team = await backfill_legacy_join_code(join_code)
+                    if matching_team:
+                        updated_team = await add_team_member(join_code, member)
+        except DuplicateKeyError:
+            return JSONResponse(status_code=400, content={"success": False, "message": "Already belongs to another team"})
+        
+        if updated_team is None:
+            if not matching_team:
+                return JSONResponse(status_code=404, content={"success": False, "message": "Invalid join code"})
+            if any(m.get("email") == email for m in matching_team.get("members", [])):
+                return JSONResponse(status_code=400, content={"success": False, "message": "Already a member of this team"})
+            return JSONResponse(status_code=400, content={"success": False, "message": f"Team is full (maximum {MAX_TEAM_SIZE} members)"})
+        
+        if updated_team and "_id" in updated_team:
+            updated_team["_id"] = str(updated_team["_id"])
+        updated_team = serialize_datetime_fields(updated_team) if updated_team else updated_team
+        
+        # Ensure QR and join code are present
+        if not updated_team.get("qr_id"):
+            updated_team["qr_id"] = generate_team_qr_id(updated_team["team_id"])
+        if not updated_team.get("join_code"):
+            updated_team["join_code"] = generate_team_join_code(updated_team["team_id"], updated_team["team_name"])
+        
+        return JSONResponse(status_code=200, content={"success": True, "message": "Joined team successfully", "team": updated_team})
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error joining team: {str(e)}")
+    
+@app.get("/api/leaderboard/full")
+@response_cache.cached("leaderboard", ttl=LEADERBOARD_CACHE_TTL_SECONDS)
+async def leaderboard_full():
+    """Return all teams with only name and points, sorted by points descending."""
+    if teams_collection is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Database connection not available. Please check MongoDB configuration."
+        )
+    try:
+        teams = []
+        with storage.timeout("leaderboard"):
+            cursor = storage.collection("teams", "leaderboard").find({}, {"_id": 1, "team_name": 1, "points": 1}).sort("points", -1)
+            async for team in cursor:
+                team["_id"] = str(team["_id"])
+                team["name"] = team.pop("team_name") 
+                if(team["points"]>0):
+                    teams.append(team)
+        return JSONResponse(content={"teams": teams})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching teams: {str(e)}")
+
+
+# --- Admin Export ---
+
+# Column layout for every exportable dataset as (name, type) pairs.
+# Types drive the Arrow schema for parquet exports; CSV writes them as text.
+EXPORT_DATASETS = {
+    "teams": [
+        ("team_id", "str"), ("team_name", "str"), ("points", "int"),
+        ("member_count", "int"), ("member_names", "str"), ("member_emails", "str"),
+        ("member_roll_numbers", "str"), ("events_participated", "str"),
+        ("created_at", "str"), ("created_by", "str"),
+    ],
+    "events": [
+        ("event_id", "str"), ("event_name", "str"), ("points", "int"),
+        ("expired", "bool"), ("participants", "int"),
+        ("created_at", "str"), ("updated_at", "str"),
+    ],
+    "attendance": [
+        ("team_id", "str"), ("team_name", "str"), ("team_points", "int"),
+        ("member_name", "str"), ("member_email", "str"), ("member_roll_number", "str"),
+        ("event_id", "str"), ("event_name", "str"), ("event_points", "int"),
+    ],
+}
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def iter_export_rows(dataset: str):
+    """Yield flat row dicts for a dataset, streaming from the Motor cursor."""
+    if dataset == "events":
+        cursor = storage.collection("events", "export").find({}, {"_id": 0, "secret_code": 0}).batch_size(EXPORT_BATCH_SIZE)
+        async for event in cursor:
+            event.setdefault("expired", False)
+            event.setdefault("participants", 0)
+            yield {name: _export_value(event.get(name)) for name, _ in EXPORT_DATASETS["events"]}
+        return
+
+    # Events are a few dozen documents, so a lookup map is cheap to hold
+    events_by_id = {}
+    if dataset == "attendance":
+        async for event in storage.collection("events", "export").find({}, {"_id": 0, "event_id": 1, "event_name": 1, "points": 1}):
+            events_by_id[event["event_id"]] = event
+
+    cursor = storage.collection("teams", "export").find({}, {"_id": 0, "qr_id": 0, "legacy_qr_id": 0, "join_code": 0}).batch_size(EXPORT_BATCH_SIZE)
+    async for team in cursor:
+        members = team.get("members", [])
+        events_participated = team.get("events_participated", [])
+        if dataset == "teams":
+            yield {
+                "team_id": team.get("team_id"),
+                "team_name": team.get("team_name"),
+                "points": team.get("points", 0),
+                "member_count": len(members),
+                "member_names": "; ".join(m.get("name") or "" for m in members),
+                "member_emails": "; ".join(m.get("email") or "" for m in members),
+                "member_roll_numbers": "; ".join(m.get("rollNumber") or "" for m in members),
+                "events_participated": "; ".join(events_participated),
+                "created_at": _export_value(team.get("created_at")),
+                "created_by": team.get("created_by"),
+            }
+            continue
+
+        # Flattened attendance view: one row per (team, member, event)
+        for member in members:
+            for event_id in events_participated:
+                event = events_by_id.get(event_id, {})
+                yield {
+                    "team_id": team.get("team_id"),
+                    "team_name": team.get("team_name"),
+                    "team_points": team.get("points", 0),
+                    "member_name": member.get("name"),
+                    "member_email": member.get("email"),
+                    "member_roll_number": member.get("rollNumber"),
+                    "event_id": event_id,
+                    "event_name": event.get("event_name"),
+                    "event_points": event.get("points"),
+                }
+
+
+async def stream_csv_export(dataset: str):
+    """Encode rows as CSV, flushing one chunk per EXPORT_BATCH_SIZE rows."""
+    columns = [name for name, _ in EXPORT_DATASETS[dataset]]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    pending = 0
+    async for row in iter_export_rows(dataset):
+        writer.writerow(row)
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object that hands buffered bytes back to the response stream."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+async def stream_columnar_export(dataset: str, export_format: str):
+    """Encode rows as parquet row groups or Arrow IPC record batches, one per EXPORT_BATCH_SIZE rows."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {"str": pa.string(), "int": pa.int64(), "bool": pa.bool_()}
+    schema = pa.schema([(name, arrow_types[kind]) for name, kind in EXPORT_DATASETS[dataset]])
+
+    sink = _ChunkSink()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(sink, schema)
+        write_batch = writer.write_table
+        to_batch = pa.Table.from_pylist
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write_batch = writer.write_batch
+        to_batch = pa.RecordBatch.from_pylist
+
+    rows = []
+    async for row in iter_export_rows(dataset):
+        rows.append(row)
+        if len(rows) >= EXPORT_BATCH_SIZE:
+            write_batch(to_batch(rows, schema=schema))
+            rows = []
+            yield sink.drain()
+    if rows:
+        write_batch(to_batch(rows, schema=schema))
+    writer.close()
+    yield sink.drain()
+
+
+@app.get('/api/admin/export/{dataset}')
+async def export_dataset(dataset: str, format: str = Query("csv"), admin_user: dict = Depends(require_admin)):
+    """Stream a full dump of teams, events or the flattened attendance view (Admin only)"""
+    if teams_collection is None or event_collection is None:
+        raise HTTPException(status_code=503, detail="Database connection not available. Please check MongoDB configuration.")
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset. Choose one of: {', '.join(EXPORT_DATASETS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Choose one of: {', '.join(EXPORT_FORMATS)}")
+
+    if format == "csv":
+        body = stream_csv_export(dataset)
+    else:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow to be installed on the server")
+        body = stream_columnar_export(dataset, format)
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"{dataset}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{extension}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+# --- QR Code Migration ---
+
+@app.post('/api/admin/qr/migrate')
+async def migrate_team_qr_ids(admin_user: dict = Depends(require_admin)):
+    """
+    Re-sign every team's QR id with the current key version (Admin only).
+    Unsigned QR ids are kept in legacy_qr_id so already printed codes still scan.
+    Run this after rotating QR_SIGNING_KEY_VERSION; retired keys can be dropped once it completes.
+    """
+    if teams_collection is None:
+        raise HTTPException(status_code=503, detail="Database connection not available. Please check MongoDB configuration.")
+
+    try:
+        migrated = 0
+        operations = []
+        cursor = teams_collection.find({}, {"_id": 0, "team_id": 1, "qr_id": 1}).batch_size(EXPORT_BATCH_SIZE)
+        async for team in cursor:
+            if not qr_id_needs_upgrade(team.get("qr_id")):
+                continue
+            operations.append(UpdateOne({"team_id": team["team_id"]}, {"$set": qr_id_upgrade(team)}))
+            if len(operations) >= EXPORT_BATCH_SIZE:
+                result = await teams_collection.bulk_write(operations, ordered=False)
+                migrated += result.modified_count
+                operations = []
+        if operations:
+            result = await teams_collection.bulk_write(operations, ordered=False)
+            migrated += result.modified_count
+
+        return JSONResponse(content={
+            "message": "QR ids migrated successfully",
+            "key_version": QR_SIGNING_KEY_VERSION,
+            "migrated": migrated
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error migrating QR ids: {str(e)}")
+
+
+# --- Points Reconciliation ---
+
+# Teams whose points differ from the sum of the points of the events they participated in.
+# The join and the sum run on the database server; only mismatching teams come back.
+POINTS_MISMATCH_PIPELINE = [
+    {"$lookup": {
+        "from": "events",
+        "localField": "events_participated",
+        "foreignField": "event_id",
+        "pipeline": [{"$project": {"_id": 0, "points": 1}}],
+        "as": "participated_events"
+    }},
+    {"$project": {
+        "_id": 0,
+        "team_id": 1,
+        "team_name": 1,
+        "points": {"$ifNull": ["$points", 0]},
+        # As stored (absent when the team never had points), for the conditional fix
+        "stored_points": "$points",
+        "expected": {"$sum": "$participated_events.points"}
+    }},
+    {"$match": {"$expr": {"$ne": ["$points", "$expected"]}}},
+]
+
+@app.post('/api/admin/reconcile/points')
+async def reconcile_points(
+    dry_run: bool = Query(True),
+    batch_size: int = Query(RECONCILE_BATCH_SIZE, ge=1, le=10000),
+    throttle_ms: int = Query(RECONCILE_THROTTLE_MS, ge=0),
+    admin_user: dict = Depends(require_admin)
+):
+    """
+    Audit team points against their participated events and, unless dry_run, repair them (Admin only).
+    Streams NDJSON: a start line, one line per mismatch, progress after every batch and a final summary.
+    Each fix is conditional on the points value that was read, so a team scanned meanwhile is skipped
+    rather than overwritten; run the job again to pick it up.
+    """
+    if teams_collection is None or event_collection is None:
+        raise HTTPException(status_code=503, detail="Database connection not available. Please check MongoDB configuration.")
+
+    async def run():
+        started = time.perf_counter()
+        totals = {"mismatches": 0, "fixed": 0, "skipped": 0}
+        yield json.dumps({"type": "start", "dry_run": dry_run, "teams": await teams_collection.estimated_document_count()}) + "\n"
+
+        async def apply(batch):
+            if not dry_run:
+                result = await teams_collection.bulk_write([
+                    UpdateOne({"team_id": stored["team_id"], "points": stored_points}, {"$set": {"points": stored["expected"]}})
+                    for stored, stored_points in batch
+                ], ordered=False)
+                totals["fixed"] += result.modified_count
+                totals["skipped"] += len(batch) - result.matched_count
+                if result.modified_count:
+                    # Cached leaderboards and analytics still hold the points just repaired
+                    await notify_points_changed({"reconciled": True, "teams_matched": result.matched_count,
+                                                 "teams_updated": result.modified_count})
+            return json.dumps({"type": "progress", **totals, "elapsed_ms": round((time.perf_counter() - started) * 1000)}) + "\n"
+
+        try:
+            batch = []
+            cursor = teams_collection.aggregate(POINTS_MISMATCH_PIPELINE, allowDiskUse=True, batchSize=batch_size)
+            async for team in cursor:
+                stored_points = team.pop("stored_points", None)
+                team["delta"] = team["expected"] - team["points"]
+                totals["mismatches"] += 1
+                batch.append((team, stored_points))
+                yield json.dumps({"type": "mismatch", **team}) + "\n"
+                if len(batch) >= batch_size:
+                    yield await apply(batch)
+                    batch = []
+                    if throttle_ms:
+                        # Spread the repair writes out so live scans keep their latency
+                        await asyncio.sleep(throttle_ms / 1000)
+            if batch:
+                yield await apply(batch)
+            yield json.dumps({"type": "done", "dry_run": dry_run, **totals, "elapsed_ms": round((time.perf_counter() - started) * 1000)}) + "\n"
+        except Exception as e:
+            print(f"Points reconciliation failed: {e}")
+            yield json.dumps({"type": "error", "detail": f"Error reconciling points: {str(e)}", **totals}) + "\n"
+
+    return StreamingResponse(run(), media_type="application/x-ndjson")
+
+
+# --- Request Profiles ---
+
+@app.get('/api/admin/profiles')
+async def list_profiles(admin_user: dict = Depends(require_admin)):
+    """List stored request profiles, newest first (Admin only)"""
+    return JSONResponse(content={"profiles": profile_store.list()})
+
+@app.get('/api/admin/profiles/{name}')
+async def download_profile(name: str, admin_user: dict = Depends(require_admin)):
+    """Download a stored profile: pstats .prof or speedscope JSON (Admin only)"""
+    path = profile_store.path_for(name)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=os.path.basename(path), media_type="application/octet-stream")
+
+
+# --- Slow Queries ---
+
+@app.get('/api/admin/slow-queries')
+async def list_slow_queries(
+    limit: int = Query(100, ge=1, le=1000),
+    min_ms: float = Query(0, ge=0),
+    command: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    admin_user: dict = Depends(require_admin)
+):
+    """Recent slow MongoDB operations, newest first, with the explain summary of each shape (Admin only)"""
+    if slow_query_log is None:
+        return JSONResponse(content={"enabled": False, "entries": []})
+    return JSONResponse(content={
+        "enabled": isinstance(storage, MongoStorage),
+        "threshold_ms": slow_query_log.threshold_ms,
+        "entries": slow_query_log.recent(limit=limit, min_ms=min_ms, command=command, endpoint=endpoint)
+    })
+
+@app.get('/api/admin/slow-queries/{shape_id}/explain')
+async def slow_query_explain(shape_id: str, admin_user: dict = Depends(require_admin)):
+    """Full explain("executionStats") output captured for one slow operation shape (Admin only)"""
+    explained = slow_query_log.explain_for(shape_id) if slow_query_log is not None else None
+    if explained is None:
+        raise HTTPException(status_code=404, detail="No explain captured for this shape")
+    return JSONResponse(content=explained)
+
+
+# --- Participation Analytics ---
+
+@app.get('/api/admin/analytics')
+@response_cache.cached("analytics", ttl=ANALYTICS_CACHE_TTL_SECONDS, stale=0)
+async def participation_analytics(top_pairs: int = Query(20, ge=1, le=500), admin_user: dict = Depends(require_admin)):
+    """Event attendance, co-attendance and points distribution across all teams (Admin only)"""
+    if teams_collection is None or event_collection is None:
+        raise HTTPException(status_code=503, detail="Database connection not available. Please check MongoDB configuration.")
+    try:
+        # NumPy is only needed here; keep it off the startup path
+        import analytics
+
+        participation = await analytics.load_participation(teams_collection, event_collection)
+        summary = await asyncio.get_running_loop().run_in_executor(None, analytics.summarize, participation, top_pairs)
+        return JSONResponse(content=summary)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing analytics: {str(e)}")
+
+
+# --- Scan Journal ---
+
+@app.get('/api/admin/scan-journal')
+async def scan_journal_status(admin_user: dict = Depends(require_admin)):
+    """Degraded mode state, pending / rejected journaled scans and the drain rate (Admin only)"""
+    if scan_journal is None:
+        return JSONResponse(content={"enabled": False})
+    return JSONResponse(content={"enabled": True, **await scan_journal.stats()})
+
+
+# --- Live Scan Metrics ---
+
+event_names = {}
+
+async def live_metrics_snapshot():
+    """Live metrics with event names attached; names are looked up once per event"""
+    snapshot = await live_metrics.snapshot()
+    missing = [event_id for event_id in snapshot["events"] if event_id not in event_names]
+    if missing and event_collection is not None:
+        async for event in event_collection.find({"event_id": {"$in": missing}}, {"_id": 0, "event_id": 1, "event_name": 1}):
+            event_names[event["event_id"]] = event["event_name"]
+    for event_id, stats in snapshot["events"].items():
+        stats["event_name"] = event_names.get(event_id)
+    return snapshot
+
+@app.get('/api/admin/live')
+async def live_scan_metrics(admin_user: dict = Depends(require_admin)):
+    """Scans per minute, rejects by reason and p95 scan latency per event and volunteer (Admin only)"""
+    try:
+        return JSONResponse(content=await live_metrics_snapshot())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading live metrics: {str(e)}")
+
+@app.get('/api/admin/live/stream')
+async def live_scan_metrics_stream(request: Request, admin_user: dict = Depends(require_admin)):
+    """Server-sent events feed of the live metrics, one snapshot every LIVE_METRICS_PUSH_SECONDS (Admin only)"""
+    async def feed():
+        while not await request.is_disconnected():
+            yield f"data: {json.dumps(await live_metrics_snapshot())}\n\n"
+            await asyncio.sleep(LIVE_METRICS_PUSH_SECONDS)
+
+    return StreamingResponse(feed(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- Season Archival ---
+
+rollover_tasks = {}
+
+def serialize_season(checkpoint):
+    checkpoint = serialize_datetime_fields(checkpoint)
+    checkpoint["season"] = checkpoint.pop("_id")
+    return checkpoint
+
+async def run_rollover(season: str):
+    try:
+        checkpoint = await season_archiver.run(season)
+        print(f"Season rollover {season} finished: {checkpoint.get('moved')}")
+    except Exception as rollover_e:
+        # The checkpoint stays "running"; posting the same season again resumes it
+        print(f"Season rollover {season} stopped: {rollover_e}")
+    finally:
+        rollover_tasks.pop(season, None)
+        # Teams and events may have moved to the archive
+        response_cache.invalidate()
+
+@app.post('/api/admin/seasons/rollover')
+async def start_season_rollover(payload: SeasonRollover, admin_user: dict = Depends(require_admin)):
+    """Archive the finished season's teams and events; posting the same season again resumes it (Admin only)"""
+    if season_archiver is None:
+        raise HTTPException(status_code=503, detail="Database connection not available")
+    season = payload.season.strip()
+    if not season:
+        raise HTTPException(status_code=400, detail="Season name is required")
+    try:
+        checkpoint = await season_archiver.begin(season, admin_user.get("email"))
+        if checkpoint["state"] == "done":
+            return JSONResponse(status_code=200, content={"message": "Season already archived", "season": serialize_season(checkpoint)})
+        if season not in rollover_tasks:
+            rollover_tasks[season] = asyncio.create_task(run_rollover(season))
+        return JSONResponse(status_code=202, content={"message": "Season rollover running", "season": serialize_season(checkpoint)})
+    except RolloverConflict as conflict:
+        raise HTTPException(status_code=409, detail=f"Rollover of season '{conflict}' has not finished; resume it first")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting season rollover: {str(e)}")
+
+@app.get('/api/admin/seasons/rollover/{season}')
+async def season_rollover_status(season: str, admin_user: dict = Depends(require_admin)):
+    """Progress of a season rollover (Admin only)"""
+    if season_archiver is None:
+        raise HTTPException(status_code=503, detail="Database connection not available")
+    checkpoint = await storage.collection("seasons").find_one({"_id": season})
+    if not checkpoint:
+        raise HTTPException(status_code=404, detail="Season not found")
+    return JSONResponse(content={"season": serialize_season(checkpoint), "in_progress_here": season in rollover_tasks})
+
+@app.get('/api/seasons')
+async def list_seasons():
+    """Archived seasons, newest first"""
+    if storage is None:
+        raise HTTPException(status_code=503, detail="Database connection not available")
+    try:
+        seasons = await storage.collection("seasons").find(
+            {"state": "done"}, {"_id": 1, "finished_at": 1, "moved": 1}
+        ).sort("finished_at", -1).to_list(None)
+        return JSONResponse(content={"seasons": [
+            {"season": season["_id"], "finished_at": serialize_datetime_fields(season).get("finished_at"), "teams": season["moved"].get("teams", 0), "events": season["moved"].get("events", 0)}
+            for season in seasons
+        ]})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching seasons: {str(e)}")
+
+@app.get('/api/seasons/{season}/leaderboard')
+async def season_leaderboard(season: str, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    """Final standings of an archived season: team names and points only, like the live leaderboard"""
+    if storage is None:
+        raise HTTPException(status_code=503, detail="Database connection not available")
+    try:
+        cursor = storage.collection("teams_archive", "leaderboard").find(
+            {"season": season}, {"_id": 0, "team_id": 1, "team_name": 1, "points": 1}
+        ).sort("points", -1).skip(skip).limit(limit)
+        teams = await cursor.to_list(limit)
+        return JSONResponse(content={"season": season, "teams": teams})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching season leaderboard: {str(e)}")
+
+@app.get('/api/seasons/{season}/events')
+async def season_events(season: str):
+    """Events of an archived season"""
+    if storage is None:
+        raise HTTPException(status_code=503, detail="Database connection not available")
+    try:
+        events = await storage.collection("events_archive").find(
+            {"season": season}, {"_id": 0, "event_id": 1, "event_name": 1, "points": 1, "participants": 1}
+        ).to_list(None)
+        return JSONResponse(content={"season": season, "events": events})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching season events: {str(e)}")
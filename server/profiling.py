@@ -0,0 +1,246 @@
+"""
+On-demand per-request profiling.
+
+An admin adds `X-Profile: cprofile` (deterministic, saved as a pstats .prof file) or
+`X-Profile: sample` (stack sampling, saved as a speedscope .speedscope.json file) to a
+request, or the equivalent `?__profile=` query flag. Only that request is profiled and
+the profile id comes back in the `X-Profile-Id` response header.
+
+Requests without the flag only pay for a scan of the header list, so profiling costs
+nothing when it is not triggered.
+
+Alongside the profile each entry records wall time, the event loop thread's CPU time
+and their difference, i.e. time spent awaiting Motor / httpx I/O. The profilers see the
+whole event loop thread, so concurrent requests show up in the profile too.
+
+cProfile can only attach one profiler to the event loop thread, so while one cprofile
+capture runs, overlapping cprofile requests are sampled instead (recorded as
+`"mode": "sample"` with `"requested_mode": "cprofile"`). Stopping the sampler and
+writing the files run on a worker thread, off the event loop.
+"""
+import asyncio
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+PROFILE_MODES = {"cprofile": ".prof", "sample": ".speedscope.json"}
+_TRUE_FLAGS = {"1", "true", "yes"}
+
+
+class ProfileStore:
+    """Bounded on-disk ring of profile files plus a .meta.json sidecar per profile."""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+
+    def _meta_path(self, name):
+        return os.path.join(self.directory, f"{name}.meta.json")
+
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".meta.json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), encoding="utf-8") as meta_file:
+                    entries.append(json.load(meta_file))
+            except (OSError, ValueError):
+                continue
+        entries.sort(key=lambda entry: entry["created_at"], reverse=True)
+        return entries
+
+    def path_for(self, name: str):
+        """Path of a stored profile, or None for unknown (or unsafe) names"""
+        for entry in self.list():
+            if entry["name"] == name:
+                return os.path.join(self.directory, entry["filename"])
+        return None
+
+    def save(self, name, filename, write_profile, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        write_profile(os.path.join(self.directory, filename))
+        with open(self._meta_path(name), "w", encoding="utf-8") as meta_file:
+            json.dump({**meta, "name": name, "filename": filename}, meta_file)
+        for stale in self.list()[self.max_files:]:
+            for path in (os.path.join(self.directory, stale["filename"]), self._meta_path(stale["name"])):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a background thread and exports speedscope JSON."""
+
+    def __init__(self, thread_id: int, interval_ms: float):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.frames = []
+        self.frame_index = {}
+        self.samples = []
+        self.weights = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _frame_id(self, frame):
+        code = frame.f_code
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self.frame_index:
+            self.frame_index[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return self.frame_index[key]
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append((now - last) * 1000)
+            last = now
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path, profile_name):
+        with open(path, "w", encoding="utf-8") as profile_file:
+            json.dump({
+                "$schema": "https://www.speedscope.app/file-format-schema.json",
+                "name": profile_name,
+                "exporter": "loyalty-program request profiler",
+                "shared": {"frames": self.frames},
+                "profiles": [{
+                    "type": "sampled",
+                    "name": profile_name,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(self.weights),
+                    "samples": self.samples,
+                    "weights": self.weights,
+                }],
+            }, profile_file)
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware; must be registered inside SessionMiddleware (i.e. added before it)
+    so the admin session is available in the scope.
+    """
+
+    def __init__(self, app, store: ProfileStore, sample_interval_ms: float = 2):
+        self.app = app
+        self.store = store
+        self.sample_interval_ms = sample_interval_ms
+        self._cprofile_active = False
+
+    @staticmethod
+    def requested_mode(scope):
+        mode = None
+        for header, value in scope["headers"]:
+            if header == b"x-profile":
+                mode = value.decode("latin-1").strip().lower()
+                break
+        if mode is None:
+            query = scope.get("query_string", b"")
+            if b"__profile=" not in query:
+                return None
+            match = re.search(rb"(?:^|&)__profile=([^&]*)", query)
+            mode = match.group(1).decode("latin-1").lower() if match else ""
+        if mode in _TRUE_FLAGS:
+            return "cprofile"
+        return mode if mode in PROFILE_MODES else None
+
+    @staticmethod
+    def is_admin(scope):
+        session = scope.get("session") or {}
+        return (session.get("user") or {}).get("role") == "admin"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        mode = self.requested_mode(scope)
+        if mode is None or not self.is_admin(scope):
+            return await self.app(scope, receive, send)
+
+        created_at = datetime.utcnow()
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")[:40] or "root"
+        name = f"{created_at.strftime('%Y%m%d-%H%M%S')}-{scope['method'].lower()}-{slug}-{uuid.uuid4().hex[:6]}"
+        status = {"code": None}
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", name.encode())]}
+            await send(message)
+
+        requested_mode = mode
+        profiler = None
+        if mode == "cprofile" and not self._cprofile_active:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                self._cprofile_active = True
+            except ValueError:
+                # Another profiler or debugger already owns the thread (Python 3.12+ refuses to share it)
+                profiler = None
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        if profiler is None:
+            mode = "sample"
+            profiler = StackSampler(threading.get_ident(), self.sample_interval_ms)
+            profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            if mode == "cprofile":
+                profiler.disable()
+                self._cprofile_active = False
+            cpu_ms = (time.thread_time() - cpu_start) * 1000
+            wall_ms = (time.perf_counter() - wall_start) * 1000
+
+            if mode == "cprofile":
+                write_profile = profiler.dump_stats
+            else:
+                def write_profile(path):
+                    profiler.write(path, name)
+            meta = {
+                "mode": mode,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status["code"],
+                "created_at": created_at.isoformat(),
+                "wall_ms": round(wall_ms, 3),
+                "cpu_ms": round(cpu_ms, 3),
+                "awaited_ms": round(max(wall_ms - cpu_ms, 0.0), 3),
+            }
+            if requested_mode != mode:
+                meta["requested_mode"] = requested_mode
+            await asyncio.to_thread(self._finish, profiler, name, mode, write_profile, meta)
+
+    def _finish(self, profiler, name, mode, write_profile, meta):
+        """Stop the sampler thread and store the profile; runs on a worker thread"""
+        if mode == "sample":
+            profiler.stop()
+        try:
+            self.store.save(name, name + PROFILE_MODES[mode], write_profile, meta)
+        except OSError as store_e:
+            print(f"Failed to store request profile {name}: {store_e}")
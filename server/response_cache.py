@@ -0,0 +1,199 @@
+"""
+In-process response micro-cache for hot read endpoints.
+
+    @app.get('/api/leaderboard/full')
+    @response_cache.cached("leaderboard", ttl=2)
+    async def leaderboard_full(): ...
+
+Within `ttl` seconds a cached response is served as is. For a further `stale`
+seconds it is still served, while a single background task refreshes it. Concurrent
+misses for the same key share one in-flight computation (single-flight), so a burst
+of identical requests costs one database query. Only 200 responses are cached, and
+entries are evicted least-recently-used once their bodies exceed `max_bytes`.
+
+Route dependencies (authentication included) still run for every request; only the
+endpoint body is shared. Keys default to the route name plus the endpoint's plain
+(str/int/float/bool/None) arguments; pass `key=` to vary on something else, e.g.
+the caller's role. The cache is per worker process.
+
+`invalidate` also covers computations already running: their results are handed to the
+callers waiting on them but not stored, and later callers start a fresh computation.
+
+Given a `Compressor`, an entry also keeps its body compressed in each encoding clients
+have asked for (see compression.py), made on first use and counted towards `max_bytes`,
+so hot responses like the leaderboard are compressed once per refresh, not per request.
+"""
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse, Response
+
+from compression import accepted_encoding
+
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+class _Entry:
+    __slots__ = ("status", "body", "media_type", "headers", "fresh_until", "stale_until", "encoded")
+
+    def __init__(self, response: Response, ttl: float, stale: float):
+        now = time.monotonic()
+        self.status = response.status_code
+        self.body = response.body
+        self.media_type = response.media_type
+        self.headers = [(name, value) for name, value in response.headers.items() if name.lower() != "content-length"]
+        self.fresh_until = now + ttl
+        self.stale_until = now + ttl + stale
+        self.encoded = {}  # encoding -> compressed body
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(body) for body in self.encoded.values())
+
+    def response(self, state: str, encoding: str = None) -> Response:
+        body = self.body if encoding is None else self.encoded[encoding]
+        response = Response(content=body, status_code=self.status, media_type=self.media_type)
+        for name, value in self.headers:
+            if name.lower() != "content-type":
+                response.headers.append(name, value)
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+            response.headers["Vary"] = "Accept-Encoding"
+        response.headers["X-Cache"] = state
+        return response
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int, default_ttl: float = 2, default_stale: float = 30, compressor=None):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.default_stale = default_stale
+        self.compressor = compressor
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._in_flight = {}
+        self._refreshing = set()
+        # Bumped by invalidate(); a computation stores its result only if its generation is unchanged
+        self._epoch = 0
+        self._generations = {}
+
+    # --- Storage ---
+
+    def _store(self, key, entry: _Entry):
+        self._discard(key)
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _respond(self, key, entry: _Entry, state: str) -> Response:
+        """The entry in the encoding negotiated for this request, compressing it on first use"""
+        encoding = accepted_encoding.get()
+        if encoding is None or self.compressor is None \
+                or not self.compressor.worthwhile(entry.media_type or "", len(entry.body)):
+            return entry.response(state)
+        if encoding not in entry.encoded:
+            entry.encoded[encoding] = self.compressor.compress(entry.body, encoding)
+            if self._entries.get(key) is entry:
+                self._bytes += len(entry.encoded[encoding])
+                self._evict()
+        return entry.response(state, encoding)
+
+    def _generation(self, name):
+        return self._epoch, self._generations.get(name, 0)
+
+    def invalidate(self, name: str = None):
+        """Drop every entry of one cached route (all routes when name is None), in flight ones included"""
+        if name is None:
+            self._epoch += 1
+        else:
+            self._generations[name] = self._generations.get(name, 0) + 1
+        for key in [key for key in self._entries if name is None or key[0] == name]:
+            self._discard(key)
+        for key in [key for key in self._in_flight if name is None or key[0] == name]:
+            del self._in_flight[key]
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes, "in_flight": len(self._in_flight)}
+
+    # --- Computation ---
+
+    async def _compute(self, key, func, args, kwargs, ttl, stale):
+        """
+        Run the endpoint once per key at a time; every concurrent caller gets the same
+        (response, entry) result, entry being None when the response was not cached.
+        """
+        flight = self._in_flight.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._run(key, func, args, kwargs, ttl, stale, self._generation(key[0])))
+            self._in_flight[key] = flight
+            # An invalidated flight may already have been replaced by a newer one
+            flight.add_done_callback(lambda done: self._in_flight.pop(key) if self._in_flight.get(key) is done else None)
+        # Shielded: one disconnecting client must not cancel the work the others wait on
+        return await asyncio.shield(flight)
+
+    async def _run(self, key, func, args, kwargs, ttl, stale, generation):
+        result = await func(*args, **kwargs)
+        response = result if isinstance(result, Response) else JSONResponse(content=jsonable_encoder(result))
+        # Invalidated while running: the result may predate the write, so it is not cached
+        if response.status_code == 200 and hasattr(response, "body") and self._generation(key[0]) == generation:
+            entry = _Entry(response, ttl, stale)
+            self._store(key, entry)
+            return response, entry
+        return response, None
+
+    def _refresh_in_background(self, key, func, args, kwargs, ttl, stale):
+        if key in self._refreshing or key in self._in_flight:
+            return
+        self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                await self._compute(key, func, args, kwargs, ttl, stale)
+            except Exception as refresh_e:
+                print(f"Response cache refresh of {key[0]} failed, serving stale: {refresh_e}")
+            finally:
+                self._refreshing.discard(key)
+
+        asyncio.ensure_future(refresh())
+
+    def cached(self, name: str, ttl: float = None, stale: float = None, key=None):
+        """Decorator for an async endpoint; key(kwargs) -> hashable overrides the default key"""
+        ttl = self.default_ttl if ttl is None else ttl
+        stale = self.default_stale if stale is None else stale
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if key is not None:
+                    cache_key = (name, key(kwargs))
+                else:
+                    cache_key = (name, tuple(sorted((k, v) for k, v in kwargs.items() if isinstance(v, _PLAIN_TYPES))))
+                entry = self._entries.get(cache_key)
+                now = time.monotonic()
+                if entry is not None and now < entry.stale_until:
+                    self._entries.move_to_end(cache_key)
+                    if now < entry.fresh_until:
+                        return self._respond(cache_key, entry, "HIT")
+                    self._refresh_in_background(cache_key, func, args, kwargs, ttl, stale)
+                    return self._respond(cache_key, entry, "STALE")
+                # The result of this caller's own computation, even if a newer one was stored since
+                response, computed_entry = await self._compute(cache_key, func, args, kwargs, ttl, stale)
+                return self._respond(cache_key, computed_entry, "MISS") if computed_entry is not None else response
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,244 @@
+"""
+Durable write-behind journal for scans while the database is unreachable.
+
+When a scan fails because MongoDB cannot be reached (connection errors, server selection
+or operation timeouts), a scan whose event token and QR signature already checked out
+is appended to a local SQLite journal and acknowledged as pending. For the next
+`degraded_seconds` further scans go straight to the journal instead of waiting on the
+database again.
+
+Appends are group-committed: concurrent scans share one transaction, and the write
+returns only once SQLite has synced it to disk (synchronous=FULL). The journal holds at
+most one pending row per (team, event), so a team scanned twice during an outage is
+rejected locally just like online.
+
+A background drainer hands the oldest pending rows to `apply_batch` every
+`drain_interval` seconds. Applied rows are deleted. Rows rejected by the database (for
+example an unknown team or an expired event) are kept with their reason. A database
+error leaves them pending for the next round.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+
+def database_unavailable(error: Exception) -> bool:
+    """True for errors that mean MongoDB could not be reached in time, not that it refused the write"""
+    return isinstance(error, ConnectionFailure) or (isinstance(error, PyMongoError) and getattr(error, "timeout", False))
+
+
+class DuplicateScan(Exception):
+    """The same team is already journaled for this event."""
+
+
+class ScanJournal:
+    def __init__(self, path: str, batch_size: int = 200, drain_interval: float = 2, degraded_seconds: float = 15):
+        self.path = path
+        self.batch_size = batch_size
+        self.drain_interval = drain_interval
+        self.degraded_seconds = degraded_seconds
+        self.degraded_until = 0
+        self.last_error = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan-journal")
+        self._connection = None
+        self._pending_keys = set()
+        self._appends = []
+        self._flush_event = None
+        self._tasks = []
+        self._applied = deque()  # (monotonic time, rows applied) of recent drains, for the rate
+        self.applied_total = 0
+        self.rejected_total = 0
+
+    # --- SQLite (always on the journal thread) ---
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=FULL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                team_key TEXT NOT NULL,
+                event_id TEXT NOT NULL,
+                qr_code TEXT NOT NULL,
+                volunteer TEXT,
+                scanned_at TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                reason TEXT
+            )
+        """)
+        # Rejected rows are kept for inspection and must not block a later scan of the pair
+        connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS pending_scan ON scans (team_key, event_id) WHERE state = 'pending'")
+        connection.commit()
+        self._connection = connection
+        return [tuple(row) for row in connection.execute("SELECT team_key, event_id FROM scans WHERE state = 'pending'")]
+
+    def _write(self, rows):
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO scans (team_key, event_id, qr_code, volunteer, scanned_at) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def _pending_batch(self):
+        cursor = self._connection.execute(
+            "SELECT id, team_key, event_id, qr_code, volunteer, scanned_at FROM scans "
+            "WHERE state = 'pending' ORDER BY id LIMIT ?", (self.batch_size,))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def _settle(self, applied_ids, rejected, failed_ids):
+        with self._connection:
+            self._connection.executemany("DELETE FROM scans WHERE id = ?", [(row_id,) for row_id in applied_ids])
+            self._connection.executemany("UPDATE scans SET state = 'rejected', reason = ? WHERE id = ?",
+                                         [(reason, row_id) for row_id, reason in rejected.items()])
+            self._connection.executemany("UPDATE scans SET attempts = attempts + 1 WHERE id = ?",
+                                         [(row_id,) for row_id in failed_ids])
+
+    def _counts(self):
+        counts = dict(self._connection.execute("SELECT state, COUNT(*) FROM scans GROUP BY state").fetchall())
+        oldest = self._connection.execute("SELECT MIN(scanned_at) FROM scans WHERE state = 'pending'").fetchone()[0]
+        return counts, oldest
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # --- Lifecycle ---
+
+    async def start(self, apply_batch):
+        """Open the journal and start draining it through apply_batch(rows) -> {row id: reject reason or None}"""
+        self._pending_keys = set(await self._run(self._open))
+        self._flush_event = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._flush_forever()), asyncio.create_task(self._drain_forever(apply_batch))]
+        if self._pending_keys:
+            print(f"Scan journal: {len(self._pending_keys)} pending scans to replay")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._appends:
+            await self._flush()
+        if self._connection is not None:
+            await self._run(self._connection.close)
+        self._executor.shutdown(wait=True)
+
+    # --- Degraded mode ---
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self.degraded_until
+
+    def mark_degraded(self, error: Exception):
+        if not self.degraded:
+            print(f"Scan journal: database unavailable ({error}); journaling scans for {self.degraded_seconds}s")
+        self.degraded_until = time.monotonic() + self.degraded_seconds
+        self.last_error = str(error)
+
+    def is_pending(self, team_key: str, event_id: str) -> bool:
+        return (team_key, event_id) in self._pending_keys
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending_keys)
+
+    # --- Appending ---
+
+    async def append(self, team_key: str, event_id: str, qr_code: str, volunteer: str) -> dict:
+        """Durably journal a scan; raises DuplicateScan if the team is already journaled for the event"""
+        key = (team_key, event_id)
+        if key in self._pending_keys:
+            raise DuplicateScan(key)
+        self._pending_keys.add(key)
+        scanned_at = datetime.utcnow().isoformat()
+        done = asyncio.get_running_loop().create_future()
+        self._appends.append(((team_key, event_id, qr_code, volunteer, scanned_at), done))
+        self._flush_event.set()
+        try:
+            await done
+        except Exception:
+            self._pending_keys.discard(key)
+            raise
+        return {"event_id": event_id, "volunteer": volunteer, "scanned_at": scanned_at}
+
+    async def _flush(self):
+        appends, self._appends = self._appends, []
+        try:
+            await self._run(self._write, [row for row, _ in appends])
+        except Exception as write_e:
+            for _, done in appends:
+                done.set_exception(write_e)
+            return
+        for _, done in appends:
+            done.set_result(None)
+
+    async def _flush_forever(self):
+        while True:
+            await self._flush_event.wait()
+            self._flush_event.clear()
+            # Everything appended while the previous commit was syncing goes into this one
+            await self._flush()
+
+    # --- Draining ---
+
+    async def _drain_forever(self, apply_batch):
+        while True:
+            try:
+                drained = await self.drain_once(apply_batch)
+            except Exception as drain_e:
+                print(f"Scan journal: drain failed: {drain_e}")
+                drained = 0
+            if drained < self.batch_size:
+                await asyncio.sleep(self.drain_interval)
+
+    async def drain_once(self, apply_batch) -> int:
+        """Replay one batch of pending scans; returns how many rows were settled"""
+        if not self._pending_keys:
+            return 0
+        rows = await self._run(self._pending_batch)
+        if not rows:
+            return 0
+        try:
+            outcomes = await apply_batch(rows)
+        except Exception as apply_e:
+            if not database_unavailable(apply_e):
+                raise
+            self.mark_degraded(apply_e)
+            await self._run(self._settle, [], {}, [row["id"] for row in rows])
+            return 0
+        applied = [row_id for row_id, reason in outcomes.items() if reason is None]
+        rejected = {row_id: reason for row_id, reason in outcomes.items() if reason is not None}
+        await self._run(self._settle, applied, rejected, [])
+        for row in rows:
+            if row["id"] in outcomes:
+                self._pending_keys.discard((row["team_key"], row["event_id"]))
+        # The database answered: new scans can go to it directly again
+        self.degraded_until = 0
+        self.applied_total += len(applied)
+        self.rejected_total += len(rejected)
+        self._applied.append((time.monotonic(), len(applied)))
+        return len(outcomes)
+
+    async def stats(self) -> dict:
+        now = time.monotonic()
+        while self._applied and self._applied[0][0] < now - 60:
+            self._applied.popleft()
+        counts, oldest = await self._run(self._counts)
+        return {
+            "degraded": self.degraded,
+            "pending": counts.get("pending", 0),
+            "rejected": counts.get("rejected", 0),
+            "oldest_pending_at": oldest,
+            "drained_last_minute": sum(count for _, count in self._applied),
+            "applied_total": self.applied_total,
+            "rejected_total": self.rejected_total,
+            "last_error": self.last_error,
+        }
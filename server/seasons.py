@@ -0,0 +1,101 @@
+"""
+Season rollover: moves the finished season's teams and events out of the live
+collections into `teams_archive` / `events_archive`, tagged with the season name.
+
+Documents are moved in batches, copy then delete: each batch is upserted into the
+archive by _id before it is deleted from the live collection, so a crash at any point
+loses nothing and re-running the rollover simply continues. Progress is checkpointed
+in the `seasons` collection, which also pins the time the rollover started. Teams and
+events carry a `created_at` set on insert; only documents created up to that time (or
+older ones without the field) are moved, so the new season's documents never are.
+ObjectIds are not used as the boundary: they are only roughly ordered across worker
+processes and hosts, so a team created in the same second could sort below it.
+Attendance lives on the team documents (events_participated) and moves with them.
+"""
+import asyncio
+from datetime import datetime
+
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+# Live collection -> archive collection, in the order they are moved
+ARCHIVED_COLLECTIONS = [("teams", "teams_archive"), ("events", "events_archive")]
+
+
+def season_documents(boundary: datetime) -> dict:
+    """Filter for the documents of the season that ends at `boundary`"""
+    return {"$or": [{"created_at": {"$lte": boundary}}, {"created_at": {"$exists": False}}]}
+
+
+class RolloverConflict(Exception):
+    """Another season's rollover has not finished yet."""
+
+
+class SeasonArchiver:
+    def __init__(self, storage, batch_size: int = 500, pause_seconds: float = 0):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.seasons = storage.collection("seasons")
+
+    async def ensure_indexes(self):
+        # At most one rollover in flight
+        await self.seasons.create_index("state", unique=True, partialFilterExpression={"state": "running"})
+        await self.storage.collection("teams_archive").create_index([("season", 1), ("points", -1)])
+        await self.storage.collection("teams_archive").create_index([("season", 1), ("team_id", 1)])
+        await self.storage.collection("events_archive").create_index([("season", 1), ("event_id", 1)])
+
+    async def begin(self, season: str, started_by: str) -> dict:
+        """Create the checkpoint for a new rollover, or return the one to resume"""
+        running = await self.seasons.find_one({"state": "running", "_id": {"$ne": season}})
+        if running:
+            raise RolloverConflict(running["_id"])
+        existing = await self.seasons.find_one({"_id": season})
+        if existing:
+            # Resuming (or already done): keep the original boundaries
+            return existing
+        try:
+            await self.seasons.insert_one({
+                "_id": season,
+                "state": "running",
+                # Also the boundary: documents created up to here belong to this season
+                "started_at": datetime.utcnow(),
+                "started_by": started_by,
+                "moved": {live_name: 0 for live_name, _ in ARCHIVED_COLLECTIONS},
+            })
+        except DuplicateKeyError:
+            existing = await self.seasons.find_one({"_id": season})
+            if existing is None:
+                # Lost the race against another season's rollover
+                running = await self.seasons.find_one({"state": "running"})
+                raise RolloverConflict(running["_id"] if running else None)
+            return existing
+        return await self.seasons.find_one({"_id": season})
+
+    async def run(self, season: str):
+        """Move every document created up to the pinned start time; safe to call again after a crash"""
+        checkpoint = await self.seasons.find_one({"_id": season})
+        if checkpoint is None or checkpoint["state"] == "done":
+            return checkpoint
+        season_filter = season_documents(checkpoint["started_at"])
+        for live_name, archive_name in ARCHIVED_COLLECTIONS:
+            live = self.storage.collection(live_name)
+            archive = self.storage.collection(archive_name)
+            while True:
+                batch = await live.find(season_filter).sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+                await archive.bulk_write(
+                    [ReplaceOne({"_id": doc["_id"]}, {**doc, "season": season}, upsert=True) for doc in batch],
+                    ordered=False
+                )
+                deleted = await live.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+                await self.seasons.update_one(
+                    {"_id": season},
+                    {"$inc": {f"moved.{live_name}": deleted.deleted_count}, "$set": {"updated_at": datetime.utcnow()}}
+                )
+                if self.pause_seconds:
+                    # Leave room for live traffic between batches
+                    await asyncio.sleep(self.pause_seconds)
+        await self.seasons.update_one({"_id": season}, {"$set": {"state": "done", "finished_at": datetime.utcnow()}})
+        return await self.seasons.find_one({"_id": season})
@@ -0,0 +1,205 @@
+"""
+Slow MongoDB operation log.
+
+`SlowQueryLog` is a PyMongo CommandListener passed to the Motor client. Every command
+that takes at least `threshold_ms` is kept in a bounded ring buffer with its duration,
+the endpoint that issued it and its shape: the command with every literal value
+replaced by "?", so `{"members.email": "a@iiitb.ac.in"}` and `{"members.email":
+"b@iiitb.ac.in"}` are one shape and no user data is stored. Field names, sort and
+projection specs and pipeline field references are kept.
+
+The first time a shape is slow, `explain` with executionStats verbosity is run for it in the
+background (off the request path) and its summary (winning plan stage, keys and
+documents examined) is attached to every entry of that shape. Explain results are kept
+for at most `max_shapes` shapes.
+
+The endpoint comes from a context variable set by `SlowQueryMiddleware`; Motor copies
+the context into its executor threads, so the listener sees the request that issued the
+command. Only the MongoDB backend is observed; the embedded engine has no commands.
+"""
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from datetime import datetime
+
+from bson import json_util
+from pymongo import monitoring
+
+current_endpoint = ContextVar("current_endpoint", default=None)
+
+# Commands whose plan explain can describe
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Session / transport fields that are not part of the operation
+_STRIPPED_FIELDS = {"lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "readConcern",
+                    "writeConcern", "autocommit", "startTransaction", "apiVersion", "comment"}
+# Values under these keys are field specs or small knobs, not user data
+_VERBATIM_KEYS = {"sort", "projection", "hint", "key", "fields", "$sort", "$project", "$limit", "$skip",
+                  "limit", "skip", "batchSize", "from", "localField", "foreignField", "as", "$count"}
+
+
+def redact(value, key=None):
+    """Command shape: literals become "?", lists collapse to their distinct item shapes"""
+    if key in _VERBATIM_KEYS:
+        return value
+    if isinstance(value, dict):
+        return {k: redact(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = redact(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    if isinstance(value, str) and value.startswith("$"):
+        # Field path in an aggregation expression
+        return value
+    return "?"
+
+
+def _shape_id(database, command_name, shape):
+    text = json.dumps([database, command_name, shape], sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def _plan_stages(plan):
+    """Stage names of a winning plan, outermost first"""
+    stages = []
+    while isinstance(plan, dict):
+        stages.append(plan.get("stage") or plan.get("queryPlan", {}).get("stage"))
+        plan = plan.get("inputStage") or plan.get("queryPlan", {}).get("inputStage")
+    return [stage for stage in stages if stage]
+
+
+def summarize_explain(result):
+    """Winning plan and executionStats totals; aggregations report the first $cursor stage"""
+    planner = result.get("queryPlanner")
+    stats = result.get("executionStats")
+    if planner is None:
+        for stage in result.get("stages", []):
+            if "$cursor" in stage:
+                planner = stage["$cursor"].get("queryPlanner")
+                stats = stage["$cursor"].get("executionStats")
+                break
+    planner = planner or {}
+    stats = stats or {}
+    stages = _plan_stages(planner.get("winningPlan"))
+    return {
+        "namespace": planner.get("namespace"),
+        "plan": stages,
+        "collection_scan": "COLLSCAN" in stages,
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+    }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float, capacity: int = 500, explain: bool = True, max_shapes: int = 200):
+        self.threshold_ms = threshold_ms
+        self.entries = deque(maxlen=capacity)
+        self.explain = explain
+        self.max_shapes = max_shapes
+        self.explains = OrderedDict()
+        self._in_flight = {}
+        self._client = None
+        self._loop = None
+
+    def attach(self, client):
+        """Enable explain capture through this Motor client; call on the event loop"""
+        self._client = client
+        self._loop = asyncio.get_running_loop()
+
+    # --- CommandListener (called on the driver's threads) ---
+
+    def started(self, event):
+        if event.command_name == "explain":
+            return
+        self._in_flight[(event.connection_id, event.request_id)] = (event.command, current_endpoint.get())
+
+    def succeeded(self, event):
+        self._finished(event, None)
+
+    def failed(self, event):
+        self._finished(event, getattr(event, "failure", {}).get("errmsg") or "failed")
+
+    def _finished(self, event, failure):
+        started = self._in_flight.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if started is None or duration_ms < self.threshold_ms:
+            return
+        command, endpoint = started
+        name = event.command_name
+        shape = {k: redact(v, k) for k, v in command.items() if k not in _STRIPPED_FIELDS and k != name}
+        # Verbatim specs may hold BSON types; keep entries plain JSON
+        shape = json.loads(json_util.dumps(shape))
+        shape_id = _shape_id(event.database_name, name, shape)
+        self.entries.append({
+            "at": datetime.utcnow().isoformat(),
+            "database": event.database_name,
+            "collection": command.get(name) if isinstance(command.get(name), str) else None,
+            "command": name,
+            "shape": shape,
+            "shape_id": shape_id,
+            "duration_ms": round(duration_ms, 2),
+            "endpoint": endpoint,
+            "failure": failure,
+        })
+        if self.explain and name in EXPLAINABLE_COMMANDS and shape_id not in self.explains and self._loop is not None:
+            self.explains[shape_id] = {"state": "pending"}
+            while len(self.explains) > self.max_shapes:
+                self.explains.popitem(last=False)
+            explained = {k: v for k, v in command.items() if k not in _STRIPPED_FIELDS}
+            self._loop.call_soon_threadsafe(self._schedule_explain, shape_id, event.database_name, explained)
+
+    # --- Explain capture ---
+
+    def _schedule_explain(self, shape_id, database, command):
+        asyncio.ensure_future(self._explain(shape_id, database, command))
+
+    async def _explain(self, shape_id, database, command):
+        try:
+            result = await self._client[database].command({"explain": command, "verbosity": "executionStats"})
+            # Plain JSON so the admin endpoint can return it as is
+            result = json.loads(json_util.dumps(result))
+            record = {"state": "done", "summary": summarize_explain(result), "result": result}
+        except Exception as explain_e:
+            record = {"state": "error", "error": str(explain_e)}
+        if shape_id in self.explains:
+            self.explains[shape_id] = {**record, "captured_at": datetime.utcnow().isoformat()}
+
+    # --- Queries ---
+
+    def recent(self, limit: int = 100, min_ms: float = 0, command: str = None, endpoint: str = None):
+        """Newest entries first, each with the explain summary of its shape"""
+        results = []
+        for entry in reversed(list(self.entries)):
+            if entry["duration_ms"] < min_ms or (command and entry["command"] != command) \
+                    or (endpoint and entry["endpoint"] != endpoint):
+                continue
+            explained = self.explains.get(entry["shape_id"], {})
+            results.append({**entry, "explain": {k: v for k, v in explained.items() if k != "result"} or None})
+            if len(results) >= limit:
+                break
+        return results
+
+    def explain_for(self, shape_id: str):
+        return self.explains.get(shape_id)
+
+
+class SlowQueryMiddleware:
+    """Pure ASGI middleware recording "METHOD /path" for the commands a request issues."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        token = current_endpoint.set(f"{scope.get('method', 'WS')} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_endpoint.reset(token)
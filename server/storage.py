@@ -0,0 +1,1630 @@
+"""
+Storage backends for the teams, events, volunteers and users collections.
+
+The endpoints only ever talk to collection objects handed out by a storage backend:
+
+- MongoStorage returns plain Motor collections backed by MongoDB / Atlas.
+- EmbeddedStorage keeps every collection in process memory behind the same async
+  collection API (find / find_one / insert / update / delete / find_one_and_update /
+  aggregate / bulk_write / create_index ...). Every write is appended to a write-ahead
+  log before the call returns, in the same event loop step that applies it, so no other
+  request sees an unlogged change. Snapshots are taken periodically, and the snapshot
+  plus the log are replayed on startup to recover after a crash.
+
+The embedded engine implements the subset of the MongoDB query, update and aggregation
+language that this application uses. It is meant for single-node campus deployments and
+for running the app without any external services.
+"""
+import asyncio
+import bisect
+import contextlib
+import glob
+import math
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId, json_util
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+COLLECTION_NAMES = ("teams", "events", "volunteers", "users")
+
+
+def collection_options(profile: dict) -> dict:
+    """Translate an operation profile into Collection.with_options() arguments"""
+    from pymongo.read_concern import ReadConcern
+    from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+    from pymongo.write_concern import WriteConcern
+
+    read_preferences = {
+        "primary": Primary, "primaryPreferred": PrimaryPreferred, "secondary": Secondary,
+        "secondaryPreferred": SecondaryPreferred, "nearest": Nearest,
+    }
+    options = {}
+    if "w" in profile or "j" in profile:
+        options["write_concern"] = WriteConcern(w=profile.get("w"), j=profile.get("j"),
+                                                wtimeout=profile.get("timeout_ms"))
+    if "read_concern" in profile:
+        options["read_concern"] = ReadConcern(profile["read_concern"])
+    if "read_preference" in profile:
+        mode = profile["read_preference"]
+        if mode not in read_preferences:
+            raise ValueError(f"Unknown read preference '{mode}'")
+        if mode == "primary":
+            options["read_preference"] = Primary()
+        else:
+            options["read_preference"] = read_preferences[mode](max_staleness=profile.get("max_staleness_seconds", -1))
+    return options
+
+
+class MongoStorage:
+    """
+    Motor-backed storage; collections are native AsyncIOMotorCollection objects.
+
+    `profiles` maps operation profile names to write concern / read concern / read
+    preference / timeout settings; collection(name, profile) applies them.
+    """
+
+    def __init__(self, uri: str, database_name: str, profiles: dict = None, **client_options):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        self.client = AsyncIOMotorClient(uri, **client_options)
+        self.db = self.client[database_name]
+        self.profiles = profiles or {}
+        # Validate every profile up front so a bad setting fails at startup
+        self._profile_options = {name: collection_options(profile) for name, profile in self.profiles.items()}
+        self._profiled_collections = {}
+
+    def collection(self, name: str, profile: str = None):
+        if profile is None:
+            return self.db[name]
+        key = (name, profile)
+        if key not in self._profiled_collections:
+            if profile not in self._profile_options:
+                raise ValueError(f"Unknown operation profile '{profile}'")
+            self._profiled_collections[key] = self.db[name].with_options(**self._profile_options[profile])
+        return self._profiled_collections[key]
+
+    def timeout(self, profile: str):
+        """Context manager bounding every operation inside it by the profile's timeout_ms"""
+        import pymongo
+
+        timeout_ms = self.profiles.get(profile, {}).get("timeout_ms")
+        return pymongo.timeout(timeout_ms / 1000) if timeout_ms else contextlib.nullcontext()
+
+    @property
+    def teams(self):
+        return self.collection("teams")
+
+    @property
+    def events(self):
+        return self.collection("events")
+
+    @property
+    def volunteers(self):
+        return self.collection("volunteers")
+
+    @property
+    def users(self):
+        return self.collection("users")
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        self.client.close()
+
+
+# --- Document helpers ---
+
+_MISSING = object()
+
+
+def _clone(value):
+    """Deep copy of a BSON-like value (dicts, lists and immutable scalars)"""
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clone(item) for item in value]
+    return value
+
+
+def _path_values(value, parts):
+    """All values reachable at a dotted path, fanning out through arrays the way MongoDB does"""
+    if not parts:
+        return [value]
+    head, rest = parts[0], parts[1:]
+    if isinstance(value, dict):
+        return _path_values(value[head], rest) if head in value else []
+    if isinstance(value, list):
+        found = []
+        if head.isdigit():
+            index = int(head)
+            if index < len(value):
+                found.extend(_path_values(value[index], rest))
+        for item in value:
+            if isinstance(item, dict):
+                found.extend(_path_values(item, parts))
+        return found
+    return []
+
+
+def _flatten(values):
+    """Path values plus the elements of any array values"""
+    flat = []
+    for value in values:
+        flat.append(value)
+        if isinstance(value, list):
+            flat.extend(value)
+    return flat
+
+
+def _type_order(value):
+    if value is None or value is _MISSING:
+        return 0
+    if isinstance(value, bool):
+        return 7
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, list):
+        return 4
+    if isinstance(value, ObjectId):
+        return 6
+    if isinstance(value, datetime):
+        return 8
+    return 9
+
+
+def _sort_key(value):
+    order = _type_order(value)
+    if order == 0:
+        return (0, 0)
+    if order in (3, 4, 9):
+        return (order, repr(value))
+    return (order, value)
+
+
+def _compare(candidate, target, op):
+    if _type_order(candidate) != _type_order(target) or _type_order(target) == 0:
+        return False
+    left, right = _sort_key(candidate), _sort_key(target)
+    if op == "$gt":
+        return left > right
+    if op == "$gte":
+        return left >= right
+    if op == "$lt":
+        return left < right
+    return left <= right
+
+
+def _index_key(value):
+    """Hashable key for a value; keeps True distinct from 1"""
+    if isinstance(value, (dict, list)):
+        return ("doc", json_util.dumps(value, sort_keys=True))
+    if isinstance(value, bool):
+        return ("bool", value)
+    return value
+
+
+def _sort_documents(documents, sort_spec):
+    for field, direction in reversed(sort_spec):
+        parts = field.split(".")
+
+        def key(doc, parts=parts):
+            values = _path_values(doc, parts)
+            return _sort_key(values[0] if values else _MISSING)
+
+        documents.sort(key=key, reverse=direction < 0)
+    return documents
+
+
+def _normalize_sort(key_or_list, direction=None):
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [(field, value) for field, value in key_or_list]
+
+
+# --- Query matching ---
+
+def _is_operator_document(value):
+    return isinstance(value, dict) and bool(value) and all(key.startswith("$") for key in value)
+
+
+def _values_equal(values, target):
+    if target is None:
+        return not values or any(value is None for value in values)
+    for value in values:
+        if _index_key(value) == _index_key(target):
+            return True
+        if isinstance(value, list) and not isinstance(target, list):
+            if any(_index_key(item) == _index_key(target) for item in value):
+                return True
+    return False
+
+
+def _regex_match(values, pattern, options=""):
+    flags = 0
+    if "i" in options:
+        flags |= re.IGNORECASE
+    if "m" in options:
+        flags |= re.MULTILINE
+    compiled = pattern if isinstance(pattern, re.Pattern) else re.compile(pattern, flags)
+    return any(isinstance(value, str) and compiled.search(value) for value in _flatten(values))
+
+
+def _match_operator(values, op, argument, condition):
+    if op == "$eq":
+        return _values_equal(values, argument)
+    if op == "$ne":
+        return not _values_equal(values, argument)
+    if op in ("$gt", "$gte", "$lt", "$lte"):
+        return any(_compare(value, argument, op) for value in _flatten(values))
+    if op == "$in":
+        return any(_values_equal(values, target) for target in argument)
+    if op == "$nin":
+        return not any(_values_equal(values, target) for target in argument)
+    if op == "$all":
+        return all(_values_equal(values, target) for target in argument)
+    if op == "$exists":
+        return bool(values) == bool(argument)
+    if op == "$size":
+        return any(isinstance(value, list) and len(value) == argument for value in values)
+    if op == "$regex":
+        return _regex_match(values, argument, condition.get("$options", ""))
+    if op == "$options":
+        return True
+    if op == "$not":
+        return not all(_match_operator(values, inner_op, inner_arg, argument) for inner_op, inner_arg in argument.items())
+    if op == "$elemMatch":
+        for value in values:
+            if not isinstance(value, list):
+                continue
+            for item in value:
+                if _is_operator_document(argument):
+                    if all(_match_operator([item], inner_op, inner_arg, argument) for inner_op, inner_arg in argument.items()):
+                        return True
+                elif isinstance(item, dict) and matches(item, argument):
+                    return True
+        return False
+    raise OperationFailure(f"Unsupported query operator {op}")
+
+
+def matches(document, query) -> bool:
+    """Evaluate a MongoDB query filter against a document"""
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$expr":
+            if not _truthy(evaluate(condition, document)):
+                return False
+        else:
+            values = _path_values(document, key.split("."))
+            if _is_operator_document(condition):
+                if not all(_match_operator(values, op, argument, condition) for op, argument in condition.items()):
+                    return False
+            elif isinstance(condition, re.Pattern):
+                if not _regex_match(values, condition):
+                    return False
+            elif not _values_equal(values, condition):
+                return False
+    return True
+
+
+_RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte"}
+
+
+def _is_range(condition):
+    return _is_operator_document(condition) and set(condition) <= _RANGE_OPERATORS
+
+
+def _requires_value(condition):
+    """True when a document without the field (or with null) can never match the condition"""
+    if condition is _MISSING or condition is None:
+        return False
+    if not _is_operator_document(condition):
+        return True
+    for op, argument in condition.items():
+        if op == "$eq" and argument is not None:
+            return True
+        if op == "$in" and argument and None not in argument:
+            return True
+        if op in _RANGE_OPERATORS and argument is not None:
+            return True
+        if op == "$exists" and argument:
+            return True
+    return False
+
+
+def _implies(query, expression):
+    """Conservatively, whether every document matching query also matches a partial index filter"""
+    for field, required in expression.items():
+        condition = query.get(field, _MISSING)
+        if condition == required:
+            continue
+        if required == {"$exists": True} and _requires_value(condition):
+            continue
+        return False
+    return True
+
+
+# --- Updates ---
+
+def _walk_to_parent(document, path, create):
+    parts = path.split(".")
+    node = document
+    for part in parts[:-1]:
+        if isinstance(node, list):
+            index = int(part)
+            if index >= len(node):
+                return None, None
+            node = node[index]
+            continue
+        if part not in node or not isinstance(node[part], (dict, list)):
+            if not create:
+                return None, None
+            node[part] = {}
+        node = node[part]
+    return node, parts[-1]
+
+
+def _get_field(document, path):
+    parent, key = _walk_to_parent(document, path, create=False)
+    if isinstance(parent, dict):
+        return parent.get(key, _MISSING)
+    if isinstance(parent, list) and key.isdigit() and int(key) < len(parent):
+        return parent[int(key)]
+    return _MISSING
+
+
+def _set_field(document, path, value):
+    parent, key = _walk_to_parent(document, path, create=True)
+    if isinstance(parent, list):
+        index = int(key)
+        parent.extend([None] * (index + 1 - len(parent)))
+        parent[index] = value
+    elif parent is not None:
+        parent[key] = value
+
+
+def _unset_field(document, path):
+    parent, key = _walk_to_parent(document, path, create=False)
+    if isinstance(parent, dict):
+        parent.pop(key, None)
+
+
+def _array_field(document, path, op):
+    current = _get_field(document, path)
+    if current is _MISSING:
+        current = []
+        _set_field(document, path, current)
+    if not isinstance(current, list):
+        raise OperationFailure(f"Cannot apply {op} to non-array field '{path}'")
+    return current
+
+
+def _pull_matches(item, condition):
+    if _is_operator_document(condition):
+        return all(_match_operator([item], op, argument, condition) for op, argument in condition.items())
+    if isinstance(condition, dict):
+        return isinstance(item, dict) and matches(item, condition)
+    return _index_key(item) == _index_key(condition)
+
+
+def apply_update(document, update, inserting=False):
+    """Apply a MongoDB update document to `document` in place"""
+    for op, fields in update.items():
+        for path, argument in fields.items():
+            if op == "$set":
+                _set_field(document, path, _clone(argument))
+            elif op == "$setOnInsert":
+                if inserting:
+                    _set_field(document, path, _clone(argument))
+            elif op == "$unset":
+                _unset_field(document, path)
+            elif op == "$inc":
+                current = _get_field(document, path)
+                _set_field(document, path, (0 if current is _MISSING or current is None else current) + argument)
+            elif op in ("$min", "$max"):
+                current = _get_field(document, path)
+                if current is _MISSING or (op == "$min" and _sort_key(argument) < _sort_key(current)) \
+                        or (op == "$max" and _sort_key(argument) > _sort_key(current)):
+                    _set_field(document, path, _clone(argument))
+            elif op in ("$push", "$addToSet"):
+                array = _array_field(document, path, op)
+                items = argument["$each"] if isinstance(argument, dict) and "$each" in argument else [argument]
+                for item in items:
+                    if op == "$addToSet" and any(_index_key(existing) == _index_key(item) for existing in array):
+                        continue
+                    array.append(_clone(item))
+            elif op == "$pull":
+                current = _get_field(document, path)
+                if isinstance(current, list):
+                    current[:] = [item for item in current if not _pull_matches(item, argument)]
+            elif op == "$pullAll":
+                current = _get_field(document, path)
+                if isinstance(current, list):
+                    removed = {_index_key(item) for item in argument}
+                    current[:] = [item for item in current if _index_key(item) not in removed]
+            else:
+                raise OperationFailure(f"Unsupported update operator {op}")
+
+
+def _is_replacement(update):
+    return not any(key.startswith("$") for key in update)
+
+
+def _upsert_seed(query):
+    """Equality fields of a filter become the starting document of an upsert"""
+    seed = {}
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            for clause in condition:
+                seed.update(_upsert_seed(clause))
+        elif key.startswith("$"):
+            continue
+        elif _is_operator_document(condition):
+            if "$eq" in condition:
+                _set_field(seed, key, _clone(condition["$eq"]))
+        else:
+            _set_field(seed, key, _clone(condition))
+    return seed
+
+
+# --- Projection ---
+
+def _copy_path(source, target, parts):
+    head, rest = parts[0], parts[1:]
+    if head not in source:
+        return
+    value = source[head]
+    if not rest:
+        target[head] = _clone(value)
+    elif isinstance(value, dict):
+        _copy_path(value, target.setdefault(head, {}), rest)
+    elif isinstance(value, list):
+        items = [item for item in value if isinstance(item, dict)]
+        projected = target.setdefault(head, [{} for _ in items])
+        for item, projected_item in zip(items, projected):
+            _copy_path(item, projected_item, rest)
+
+
+def _drop_path(document, parts):
+    head, rest = parts[0], parts[1:]
+    if not rest:
+        document.pop(head, None)
+        return
+    value = document.get(head)
+    if isinstance(value, dict):
+        _drop_path(value, rest)
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict):
+                _drop_path(item, rest)
+
+
+def project(document, projection):
+    """Apply a find() projection, returning a new document"""
+    if not projection:
+        return _clone(document)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = projection.get("_id", 1)
+    fields = {field: flag for field, flag in projection.items() if field != "_id"}
+    if any(fields.values()) or (fields == {} and include_id and projection.get("_id") == 1):
+        result = {}
+        if include_id and "_id" in document:
+            result["_id"] = document["_id"]
+        for field, flag in fields.items():
+            if flag:
+                _copy_path(document, result, field.split("."))
+        return result
+    result = _clone(document)
+    if not include_id:
+        result.pop("_id", None)
+    for field in fields:
+        _drop_path(result, field.split("."))
+    return result
+
+
+# --- Aggregation expressions ---
+
+def _truthy(value):
+    return value not in (None, False, 0, _MISSING)
+
+
+def _expression_path(value, parts):
+    for index, part in enumerate(parts):
+        if isinstance(value, dict):
+            if part not in value:
+                return None
+            value = value[part]
+        elif isinstance(value, list):
+            rest = parts[index:]
+            collected = []
+            for item in value:
+                if isinstance(item, dict):
+                    resolved = _expression_path(item, rest)
+                    if resolved is not None:
+                        collected.append(resolved)
+            return collected
+        else:
+            return None
+    return value
+
+
+def _numeric(values):
+    return [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+
+
+def evaluate(expression, document, variables=None):
+    """Evaluate an aggregation expression against a document"""
+    if isinstance(expression, str) and expression.startswith("$$"):
+        name, _, rest = expression[2:].partition(".")
+        scope = {"ROOT": document, "CURRENT": document, **(variables or {})}
+        if name not in scope:
+            raise OperationFailure(f"Unknown variable $${name}")
+        return _expression_path(scope[name], rest.split(".")) if rest else scope[name]
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _expression_path(document, expression[1:].split("."))
+    if isinstance(expression, list):
+        return [evaluate(item, document, variables) for item in expression]
+    if isinstance(expression, dict):
+        if len(expression) == 1 and next(iter(expression)).startswith("$"):
+            op, argument = next(iter(expression.items()))
+            if op not in _EXPRESSION_OPERATORS:
+                raise OperationFailure(f"Unsupported expression operator {op}")
+            return _EXPRESSION_OPERATORS[op](argument, document, variables)
+        return {key: evaluate(value, document, variables) for key, value in expression.items()}
+    return expression
+
+
+def _args(argument, document, variables):
+    if not isinstance(argument, list):
+        argument = [argument]
+    return [evaluate(item, document, variables) for item in argument]
+
+
+def _sum_operator(argument, document, variables):
+    if not isinstance(argument, list):
+        value = evaluate(argument, document, variables)
+        return sum(_numeric(value)) if isinstance(value, list) else (sum(_numeric([value])))
+    return sum(_numeric(_args(argument, document, variables)))
+
+
+def _comparison_operator(op):
+    def operator(argument, document, variables):
+        left, right = _args(argument, document, variables)
+        if op == "$eq":
+            return _index_key(left) == _index_key(right)
+        if op == "$ne":
+            return _index_key(left) != _index_key(right)
+        left_key, right_key = _sort_key(left), _sort_key(right)
+        return {"$gt": left_key > right_key, "$gte": left_key >= right_key,
+                "$lt": left_key < right_key, "$lte": left_key <= right_key}[op]
+    return operator
+
+
+def _cond_operator(argument, document, variables):
+    if isinstance(argument, dict):
+        argument = [argument["if"], argument["then"], argument["else"]]
+    condition, then_value, else_value = argument
+    chosen = then_value if _truthy(evaluate(condition, document, variables)) else else_value
+    return evaluate(chosen, document, variables)
+
+
+def _if_null_operator(argument, document, variables):
+    for value in _args(argument, document, variables):
+        if value is not None:
+            return value
+    return None
+
+
+def _map_operator(argument, document, variables):
+    items = evaluate(argument["input"], document, variables) or []
+    name = argument.get("as", "this")
+    return [evaluate(argument["in"], document, {**(variables or {}), name: item}) for item in items]
+
+
+def _filter_operator(argument, document, variables):
+    items = evaluate(argument["input"], document, variables) or []
+    name = argument.get("as", "this")
+    return [item for item in items
+            if _truthy(evaluate(argument["cond"], document, {**(variables or {}), name: item}))]
+
+
+def _first_value(argument, document, variables):
+    values = _args(argument, document, variables)
+    return values[0] if values else None
+
+
+_EXPRESSION_OPERATORS = {
+    "$literal": lambda argument, document, variables: argument,
+    "$sum": _sum_operator,
+    "$add": lambda argument, document, variables: sum(_numeric(_args(argument, document, variables))),
+    "$subtract": lambda argument, document, variables: (lambda a, b: (a or 0) - (b or 0))(*_args(argument, document, variables)),
+    "$multiply": lambda argument, document, variables: math.prod(_numeric(_args(argument, document, variables))),
+    "$size": lambda argument, document, variables: len(_first_value(argument, document, variables) or []),
+    "$eq": _comparison_operator("$eq"),
+    "$ne": _comparison_operator("$ne"),
+    "$gt": _comparison_operator("$gt"),
+    "$gte": _comparison_operator("$gte"),
+    "$lt": _comparison_operator("$lt"),
+    "$lte": _comparison_operator("$lte"),
+    "$and": lambda argument, document, variables: all(_truthy(value) for value in _args(argument, document, variables)),
+    "$or": lambda argument, document, variables: any(_truthy(value) for value in _args(argument, document, variables)),
+    "$not": lambda argument, document, variables: not _truthy(_first_value(argument, document, variables)),
+    "$in": lambda argument, document, variables: (lambda value, array: any(_index_key(value) == _index_key(item) for item in (array or [])))(*_args(argument, document, variables)),
+    "$cond": _cond_operator,
+    "$ifNull": _if_null_operator,
+    "$map": _map_operator,
+    "$filter": _filter_operator,
+    "$arrayElemAt": lambda argument, document, variables: (lambda array, index: array[index] if array and -len(array) <= index < len(array) else None)(*_args(argument, document, variables)),
+    "$max": lambda argument, document, variables: max(_numeric(_flatten(_args(argument, document, variables))), default=None),
+    "$min": lambda argument, document, variables: min(_numeric(_flatten(_args(argument, document, variables))), default=None),
+}
+
+
+# --- Aggregation pipeline ---
+
+def _project_stage(document, specification):
+    plain = {}
+    computed = {}
+    for field, value in specification.items():
+        if value in (0, 1, True, False) and not isinstance(value, str):
+            plain[field] = value
+        else:
+            computed[field] = value
+    if computed and not any(plain.get(field) for field in plain if field != "_id"):
+        plain = {field: flag for field, flag in plain.items() if field == "_id"}
+        result = {"_id": document["_id"]} if plain.get("_id", 1) and "_id" in document else {}
+    else:
+        result = project(document, plain)
+    for field, expression in computed.items():
+        _set_field(result, field, evaluate(expression, document))
+    return result
+
+
+def _group_stage(documents, specification):
+    groups = {}
+    for document in documents:
+        group_id = evaluate(specification["_id"], document)
+        key = _index_key(group_id)
+        if key not in groups:
+            groups[key] = {"_id": group_id, "__values": {field: [] for field in specification if field != "_id"}}
+        for field, accumulator in specification.items():
+            if field == "_id":
+                continue
+            (op, expression), = accumulator.items()
+            groups[key]["__values"][field].append(evaluate(expression, document))
+    results = []
+    for group in groups.values():
+        result = {"_id": group["_id"]}
+        for field, values in group["__values"].items():
+            (op, _), = specification[field].items()
+            numbers = _numeric(values)
+            if op == "$sum":
+                result[field] = sum(numbers)
+            elif op == "$avg":
+                result[field] = sum(numbers) / len(numbers) if numbers else None
+            elif op == "$min":
+                result[field] = min(values, key=_sort_key) if values else None
+            elif op == "$max":
+                result[field] = max(values, key=_sort_key) if values else None
+            elif op == "$push":
+                result[field] = values
+            elif op == "$addToSet":
+                result[field] = list({_index_key(value): value for value in values}.values())
+            elif op == "$first":
+                result[field] = values[0] if values else None
+            elif op == "$last":
+                result[field] = values[-1] if values else None
+            else:
+                raise OperationFailure(f"Unsupported accumulator {op}")
+        results.append(result)
+    return results
+
+
+def _lookup_stage(storage, documents, specification):
+    foreign = storage.collection(specification["from"])._all_documents()
+    local_field = specification.get("localField")
+    foreign_field = specification.get("foreignField")
+    by_key = {}
+    if foreign_field:
+        for candidate in foreign:
+            for value in _flatten(_path_values(candidate, foreign_field.split("."))) or [None]:
+                by_key.setdefault(_index_key(value), []).append(candidate)
+    results = []
+    for document in documents:
+        if local_field:
+            joined = {}
+            for value in _flatten(_path_values(document, local_field.split("."))) or [None]:
+                for candidate in by_key.get(_index_key(value), []):
+                    joined[id(candidate)] = candidate
+            matched = [_clone(candidate) for candidate in joined.values()]
+        else:
+            matched = [_clone(candidate) for candidate in foreign]
+        if specification.get("pipeline"):
+            matched = run_pipeline(storage, matched, specification["pipeline"])
+        document = dict(document)
+        document[specification["as"]] = matched
+        results.append(document)
+    return results
+
+
+def _unwind_stage(documents, specification):
+    if isinstance(specification, str):
+        specification = {"path": specification}
+    path = specification["path"][1:]
+    preserve = specification.get("preserveNullAndEmptyArrays", False)
+    results = []
+    for document in documents:
+        value = _get_field(document, path)
+        if isinstance(value, list) and value:
+            for item in value:
+                unwound = _clone(document)
+                _set_field(unwound, path, item)
+                results.append(unwound)
+        elif isinstance(value, list) or value is _MISSING or value is None:
+            if preserve:
+                unwound = _clone(document)
+                if isinstance(value, list):
+                    _unset_field(unwound, path)
+                results.append(unwound)
+        else:
+            results.append(document)
+    return results
+
+
+def run_pipeline(storage, documents, pipeline):
+    """Run aggregation stages over a list of documents"""
+    for stage in pipeline:
+        (name, specification), = stage.items()
+        if name == "$match":
+            documents = [document for document in documents if matches(document, specification)]
+        elif name == "$project":
+            documents = [_project_stage(document, specification) for document in documents]
+        elif name in ("$addFields", "$set"):
+            updated = []
+            for document in documents:
+                document = _clone(document)
+                for field, expression in specification.items():
+                    _set_field(document, field, evaluate(expression, document))
+                updated.append(document)
+            documents = updated
+        elif name == "$unset":
+            fields = [specification] if isinstance(specification, str) else specification
+            documents = [project(document, {field: 0 for field in fields}) for document in documents]
+        elif name == "$lookup":
+            documents = _lookup_stage(storage, documents, specification)
+        elif name == "$unwind":
+            documents = _unwind_stage(documents, specification)
+        elif name == "$group":
+            documents = _group_stage(documents, specification)
+        elif name == "$sort":
+            documents = _sort_documents(list(documents), _normalize_sort(specification))
+        elif name == "$skip":
+            documents = documents[specification:]
+        elif name == "$limit":
+            documents = documents[:specification]
+        elif name == "$count":
+            documents = [{specification: len(documents)}]
+        elif name == "$replaceRoot":
+            documents = [evaluate(specification["newRoot"], document) for document in documents]
+        else:
+            raise OperationFailure(f"Unsupported aggregation stage {name}")
+    return documents
+
+
+# --- Embedded collections ---
+
+class EmbeddedCursor:
+    """Async cursor over an in-memory result set, chainable like a Motor cursor."""
+
+    def __init__(self, producer):
+        self._producer = producer
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    def max_time_ms(self, milliseconds):
+        return self
+
+    def hint(self, index):
+        return self
+
+    def _results(self):
+        return self._producer(self._sort, self._skip, self._limit)
+
+    async def to_list(self, length=None):
+        results = self._results()
+        return results if not length else results[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._results():
+            yield document
+
+    def close(self):
+        pass
+
+
+class _Index:
+    def __init__(self, name, keys, unique=False, sparse=False, partial_filter=None, expire_after=None):
+        self.name = name
+        self.keys = keys
+        self.fields = [field for field, _ in keys]
+        self.unique = unique
+        self.sparse = sparse
+        self.partial_filter = partial_filter
+        self.expire_after = expire_after
+        self.entries = {}
+        # Single-field indexes also keep their keys in value order, for range scans and sorts
+        self.sort_keys = []
+        self.ordered = []
+        # Set once a document holds an array (or several values) under the key
+        self.multikey = False
+
+    def spec(self):
+        return {
+            "name": self.name, "keys": self.keys, "unique": self.unique, "sparse": self.sparse,
+            "partialFilterExpression": self.partial_filter, "expireAfterSeconds": self.expire_after,
+        }
+
+    def keys_for(self, document):
+        if self.partial_filter and not matches(document, self.partial_filter):
+            return []
+        per_field = []
+        for field in self.fields:
+            values = _path_values(document, field.split("."))
+            flat = []
+            for value in values:
+                if isinstance(value, list):
+                    flat.extend(value)
+                    self.multikey = True
+                else:
+                    flat.append(value)
+            if len(values) > 1:
+                self.multikey = True
+            if not flat:
+                if self.sparse:
+                    return []
+                flat = [None]
+            per_field.append({_index_key(value): value for value in flat})
+        if len(per_field) == 1:
+            return list(per_field[0].items())
+        # Compound keys only index the first value of each field
+        return [(tuple(next(iter(keys)) for keys in per_field), [next(iter(keys.values())) for keys in per_field])]
+
+    def add(self, document):
+        for key, value in self.keys_for(document):
+            owners = self.entries.get(key)
+            if owners is None:
+                owners = self.entries[key] = set()
+                if len(self.fields) == 1:
+                    sort_key = _sort_key(value)
+                    position = bisect.bisect_right(self.sort_keys, sort_key)
+                    self.sort_keys.insert(position, sort_key)
+                    self.ordered.insert(position, key)
+            owners.add(document["_id"])
+
+    def remove(self, document):
+        for key, value in self.keys_for(document):
+            owners = self.entries.get(key)
+            if owners:
+                owners.discard(document["_id"])
+                if not owners:
+                    del self.entries[key]
+                    if len(self.fields) == 1:
+                        sort_key = _sort_key(value)
+                        start = bisect.bisect_left(self.sort_keys, sort_key)
+                        stop = bisect.bisect_right(self.sort_keys, sort_key)
+                        position = start + self.ordered[start:stop].index(key)
+                        del self.sort_keys[position]
+                        del self.ordered[position]
+
+    def bounds(self, condition):
+        """[start, stop) positions in self.ordered of the keys a $gt/$gte/$lt/$lte condition accepts"""
+        start, stop = 0, len(self.ordered)
+        for op, target in condition.items():
+            order = _type_order(target)
+            if order == 0:
+                return 0, 0
+            # Range operators only match values of the target's type
+            start = max(start, bisect.bisect_left(self.sort_keys, (order,)))
+            stop = min(stop, bisect.bisect_left(self.sort_keys, (order + 1,)))
+            target_key = _sort_key(target)
+            if op == "$gt":
+                start = max(start, bisect.bisect_right(self.sort_keys, target_key))
+            elif op == "$gte":
+                start = max(start, bisect.bisect_left(self.sort_keys, target_key))
+            elif op == "$lt":
+                stop = min(stop, bisect.bisect_left(self.sort_keys, target_key))
+            else:
+                stop = min(stop, bisect.bisect_right(self.sort_keys, target_key))
+        return start, max(start, stop)
+
+    def check(self, document, collection_name):
+        if not self.unique:
+            return
+        for key, value in self.keys_for(document):
+            owners = self.entries.get(key, ())
+            if any(owner != document["_id"] for owner in owners):
+                key_value = dict(zip(self.fields, value if isinstance(value, list) else [value]))
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {collection_name} index: {self.name} dup key: {key_value}",
+                    11000,
+                    {"keyPattern": dict(self.keys), "keyValue": key_value},
+                )
+
+
+class EmbeddedCollection:
+    """In-memory collection with the async Motor collection API used by the app."""
+
+    def __init__(self, storage, name):
+        self._storage = storage
+        self.name = name
+        self._documents = {}
+        self._indexes = {}
+
+    @property
+    def full_name(self):
+        return f"embedded.{self.name}"
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _all_documents(self):
+        return list(self._documents.values())
+
+    # Stored documents are never mutated in place: every write stores a fresh copy,
+    # which lets snapshots share references with the live collection.
+
+    def _index_for(self, field, query, ordered=False):
+        """A single-field index holding every document that can match query; ordered: usable for sorting"""
+        for index in self._indexes.values():
+            if index.fields != [field] or (ordered and index.multikey):
+                continue
+            # Sparse and partial indexes leave documents out, which is fine only if the query does too
+            if index.sparse and not _requires_value(query.get(field, _MISSING)):
+                continue
+            if index.partial_filter and not _implies(query, index.partial_filter):
+                continue
+            return index
+        return None
+
+    def _candidates(self, query):
+        if not query:
+            return list(self._documents.values())
+        for field, condition in query.items():
+            if field.startswith("$"):
+                continue
+            if _is_range(condition):
+                index = self._index_for(field, query)
+                if index is None:
+                    continue
+                ids = {}
+                for key in index.ordered[slice(*index.bounds(condition))]:
+                    ids.update(dict.fromkeys(index.entries[key]))
+                return [self._documents[document_id] for document_id in ids]
+            if _is_operator_document(condition):
+                if set(condition) - {"$in", "$eq"}:
+                    continue
+                targets = condition["$in"] if "$in" in condition else [condition["$eq"]]
+            else:
+                targets = [condition]
+            if field == "_id":
+                return [self._documents[target] for target in targets if _index_key(target) in self._documents]
+            # Index keys are array elements, so a whole-array target cannot be looked up directly
+            if any(isinstance(target, list) for target in targets):
+                continue
+            index = self._index_for(field, query)
+            if index is not None:
+                ids = set()
+                for target in targets:
+                    ids.update(index.entries.get(_index_key(target), ()))
+                return [self._documents[document_id] for document_id in ids]
+        return list(self._documents.values())
+
+    def _matching(self, query, sort=None, limit=0):
+        """Matching stored documents (not copies) in sort order; limit 0 returns all of them"""
+        query = query or {}
+        if sort and len(sort) == 1:
+            field, direction = sort[0]
+            index = self._index_for(field, query, ordered=True)
+            if index is not None:
+                return self._matching_in_order(index, query, direction, limit)
+        documents = []
+        for document in self._candidates(query):
+            if matches(document, query):
+                documents.append(document)
+                if limit and not sort and len(documents) >= limit:
+                    break
+        if sort:
+            documents = _sort_documents(documents, sort)
+        return documents[:limit] if limit else documents
+
+    def _matching_in_order(self, index, query, direction, limit):
+        """Walk a single-valued index in key order, so a sorted find stops after `limit` matches"""
+        condition = query.get(index.fields[0])
+        start, stop = index.bounds(condition) if _is_range(condition) else (0, len(index.ordered))
+        positions = range(start, stop) if direction > 0 else range(stop - 1, start - 1, -1)
+        documents = []
+        for position in positions:
+            for document_id in index.entries[index.ordered[position]]:
+                document = self._documents[document_id]
+                if matches(document, query):
+                    documents.append(document)
+                    if limit and len(documents) >= limit:
+                        return documents
+        return documents
+
+    def _count(self, query):
+        if query and len(query) == 1:
+            (field, condition), = query.items()
+            if not field.startswith("$") and _is_range(condition):
+                index = self._index_for(field, query, ordered=True)
+                if index is not None:
+                    # Each document sits under exactly one key, and every key in range matches
+                    return sum(len(index.entries[key]) for key in index.ordered[slice(*index.bounds(condition))])
+        return len(self._matching(query))
+
+    def _store(self, document, previous=None, changes=None):
+        for index in self._indexes.values():
+            index.check(document, self.name)
+        if previous is not None:
+            for index in self._indexes.values():
+                index.remove(previous)
+        for index in self._indexes.values():
+            index.add(document)
+        self._documents[document["_id"]] = document
+        if changes is not None:
+            changes.append(["put", document])
+
+    def _discard(self, document, changes=None):
+        for index in self._indexes.values():
+            index.remove(document)
+        del self._documents[document["_id"]]
+        if changes is not None:
+            changes.append(["del", document["_id"]])
+
+    def _journal(self, changes):
+        if changes:
+            self._storage._journal(self.name, changes)
+
+    def _insert(self, document, changes):
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        if _index_key(document["_id"]) in self._documents:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.name} index: _id_ dup key: {{ _id: {document['_id']!r} }}",
+                11000, {"keyPattern": {"_id": 1}, "keyValue": {"_id": document["_id"]}},
+            )
+        self._store(_clone(document), changes=changes)
+        return document["_id"]
+
+    def _update(self, query, update, upsert, multi, changes, sort=None):
+        """Returns (matched, modified, upserted_id, before, after) for the first matched document"""
+        targets = self._matching(query, _normalize_sort(sort), limit=0 if multi else 1)
+        matched = modified = 0
+        before = after = None
+        for previous in targets:
+            if _is_replacement(update):
+                document = _clone(update)
+                document["_id"] = previous["_id"]
+            else:
+                document = _clone(previous)
+                apply_update(document, update)
+            matched += 1
+            if before is None:
+                before, after = previous, document
+            if document != previous:
+                self._store(document, previous, changes)
+                modified += 1
+        if not targets and upsert:
+            document = _upsert_seed(query)
+            if _is_replacement(update):
+                document = {**({"_id": document["_id"]} if "_id" in document else {}), **_clone(update)}
+            else:
+                apply_update(document, update, inserting=True)
+            upserted_id = self._insert(document, changes)
+            return 0, 0, upserted_id, None, self._documents[_index_key(upserted_id)]
+        return matched, modified, None, before, after
+
+    # --- Reads ---
+
+    async def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        documents = self._matching(filter, _normalize_sort(sort), limit=1)
+        return project(documents[0], projection) if documents else None
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, **kwargs):
+        def producer(cursor_sort, cursor_skip, cursor_limit):
+            start = cursor_skip or skip
+            count = cursor_limit or limit
+            documents = self._matching(filter, cursor_sort or _normalize_sort(sort), limit=start + abs(count) if count else 0)
+            documents = documents[start:]
+            if count:
+                documents = documents[:abs(count)]
+            return [project(document, projection) for document in documents]
+        return EmbeddedCursor(producer)
+
+    async def count_documents(self, filter=None, skip=0, limit=0, **kwargs):
+        count = max(self._count(filter) - skip, 0)
+        return min(count, limit) if limit else count
+
+    async def estimated_document_count(self, **kwargs):
+        return len(self._documents)
+
+    async def distinct(self, key, filter=None, **kwargs):
+        values = {}
+        for document in self._matching(filter):
+            for value in _path_values(document, key.split(".")):
+                for item in (value if isinstance(value, list) else [value]):
+                    values.setdefault(_index_key(item), item)
+        return list(values.values())
+
+    def aggregate(self, pipeline, **kwargs):
+        def producer(cursor_sort, cursor_skip, cursor_limit):
+            stages = list(pipeline)
+            # A leading $match (and $limit) is served from the indexes. Stages never modify
+            # their input documents, so only the results are copied out of the collection.
+            if stages and "$match" in stages[0]:
+                limit = stages[1].get("$limit", 0) if len(stages) > 1 else 0
+                documents = self._matching(stages.pop(0)["$match"], limit=limit)
+            else:
+                documents = self._all_documents()
+            documents = run_pipeline(self._storage, documents, stages)
+            if cursor_sort:
+                documents = _sort_documents(documents, cursor_sort)
+            documents = documents[cursor_skip:]
+            documents = documents[:cursor_limit] if cursor_limit else documents
+            return [_clone(document) for document in documents]
+        return EmbeddedCursor(producer)
+
+    # --- Writes ---
+
+    async def insert_one(self, document, **kwargs):
+        changes = []
+        try:
+            inserted_id = self._insert(document, changes)
+        finally:
+            self._journal(changes)
+        return InsertOneResult(inserted_id, True)
+
+    async def insert_many(self, documents, ordered=True, **kwargs):
+        changes = []
+        inserted_ids = []
+        errors = []
+        try:
+            for position, document in enumerate(documents):
+                try:
+                    inserted_ids.append(self._insert(document, changes))
+                except DuplicateKeyError as error:
+                    errors.append({"index": position, "code": 11000, "errmsg": str(error), "op": document})
+                    if ordered:
+                        break
+        finally:
+            self._journal(changes)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted_ids), "nUpserted": 0,
+                                  "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+                                  "writeConcernErrors": []})
+        return InsertManyResult(inserted_ids, True)
+
+    async def _update_result(self, filter, update, upsert, multi, sort=None):
+        changes = []
+        try:
+            matched, modified, upserted_id, _, _ = self._update(filter, update, upsert, multi, changes, sort)
+        finally:
+            self._journal(changes)
+        raw = {"n": matched + (1 if upserted_id is not None else 0), "nModified": modified}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True)
+
+    async def update_one(self, filter, update, upsert=False, sort=None, **kwargs):
+        return await self._update_result(filter, update, upsert, False, sort)
+
+    async def update_many(self, filter, update, upsert=False, **kwargs):
+        return await self._update_result(filter, update, upsert, True)
+
+    async def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        return await self._update_result(filter, replacement, upsert, False)
+
+    async def delete_one(self, filter, **kwargs):
+        changes = []
+        try:
+            documents = self._matching(filter, limit=1)
+            for document in documents:
+                self._discard(document, changes)
+        finally:
+            self._journal(changes)
+        return DeleteResult({"n": len(documents)}, True)
+
+    async def delete_many(self, filter, **kwargs):
+        changes = []
+        try:
+            documents = self._matching(filter)
+            for document in documents:
+                self._discard(document, changes)
+        finally:
+            self._journal(changes)
+        return DeleteResult({"n": len(documents)}, True)
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                                  return_document=False, **kwargs):
+        changes = []
+        try:
+            _, _, _, before, after = self._update(filter, update, upsert, False, changes, sort)
+        finally:
+            self._journal(changes)
+        document = after if return_document else before
+        return project(document, projection) if document is not None else None
+
+    async def find_one_and_replace(self, filter, replacement, projection=None, sort=None, upsert=False,
+                                   return_document=False, **kwargs):
+        return await self.find_one_and_update(filter, replacement, projection, sort, upsert, return_document)
+
+    async def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        changes = []
+        try:
+            documents = self._matching(filter, _normalize_sort(sort), limit=1)
+            for document in documents:
+                self._discard(document, changes)
+        finally:
+            self._journal(changes)
+        return project(documents[0], projection) if documents else None
+
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        totals = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+        errors = []
+        changes = []
+        try:
+            for position, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc, changes)
+                        totals["nInserted"] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        multi = isinstance(request, UpdateMany)
+                        matched, modified, upserted_id, _, _ = self._update(
+                            request._filter, request._doc, request._upsert, multi, changes)
+                        totals["nMatched"] += matched
+                        totals["nModified"] += modified
+                        if upserted_id is not None:
+                            totals["nUpserted"] += 1
+                            totals["upserted"].append({"index": position, "_id": upserted_id})
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        documents = self._matching(request._filter, limit=1 if isinstance(request, DeleteOne) else 0)
+                        for document in documents:
+                            self._discard(document, changes)
+                        totals["nRemoved"] += len(documents)
+                    else:
+                        raise OperationFailure(f"Unsupported bulk operation {type(request).__name__}")
+                except DuplicateKeyError as error:
+                    errors.append({"index": position, "code": 11000, "errmsg": str(error)})
+                    if ordered:
+                        break
+        finally:
+            self._journal(changes)
+        if errors:
+            raise BulkWriteError({**totals, "writeErrors": errors, "writeConcernErrors": []})
+        return BulkWriteResult(totals, True)
+
+    # --- Indexes ---
+
+    def _build_index(self, specification):
+        index = _Index(specification["name"], [tuple(key) for key in specification["keys"]],
+                       specification.get("unique", False), specification.get("sparse", False),
+                       specification.get("partialFilterExpression"), specification.get("expireAfterSeconds"))
+        for document in self._documents.values():
+            index.check(document, self.name)
+            index.add(document)
+        self._indexes[index.name] = index
+        return index
+
+    async def create_index(self, keys, unique=False, sparse=False, name=None, partialFilterExpression=None,
+                           expireAfterSeconds=None, **kwargs):
+        keys = _normalize_sort(keys, 1)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        if name in self._indexes:
+            return name
+        specification = {"name": name, "keys": keys, "unique": unique, "sparse": sparse,
+                         "partialFilterExpression": partialFilterExpression,
+                         "expireAfterSeconds": expireAfterSeconds}
+        self._build_index(specification)
+        self._storage._journal(self.name, [["index", specification]])
+        return name
+
+    async def drop_index(self, name, **kwargs):
+        if self._indexes.pop(name, None) is not None:
+            self._storage._journal(self.name, [["drop_index", name]])
+
+    async def index_information(self):
+        information = {"_id_": {"key": [("_id", 1)]}}
+        for index in self._indexes.values():
+            information[index.name] = {"key": index.keys, "unique": index.unique}
+        return information
+
+    async def drop(self):
+        self._documents.clear()
+        self._indexes.clear()
+        self._storage._journal(self.name, [["drop"]])
+
+    def _expire(self, now):
+        changes = []
+        for index in self._indexes.values():
+            if index.expire_after is None:
+                continue
+            cutoff = now - timedelta(seconds=index.expire_after)
+            field = index.fields[0]
+            for document in list(self._documents.values()):
+                values = [value for value in _path_values(document, field.split(".")) if isinstance(value, datetime)]
+                if values and min(values) < cutoff and document["_id"] in self._documents:
+                    self._discard(document, changes)
+        self._journal(changes)
+
+    # --- Recovery ---
+
+    def _replay(self, change):
+        kind = change[0]
+        if kind == "put":
+            document = change[1]
+            previous = self._documents.get(_index_key(document["_id"]))
+            if previous is not None:
+                for index in self._indexes.values():
+                    index.remove(previous)
+            for index in self._indexes.values():
+                index.add(document)
+            self._documents[document["_id"]] = document
+        elif kind == "del":
+            document = self._documents.get(_index_key(change[1]))
+            if document is not None:
+                self._discard(document)
+        elif kind == "index":
+            if change[1]["name"] not in self._indexes:
+                self._build_index(change[1])
+        elif kind == "drop_index":
+            self._indexes.pop(change[1], None)
+        elif kind == "drop":
+            self._documents.clear()
+            self._indexes.clear()
+
+
+class EmbeddedStorage:
+    """
+    In-process storage engine with an append-only write-ahead log.
+
+    Every write is journaled as a single WAL line (a list of document puts/deletes)
+    before the call returns. The log is fsynced inline when fsync_interval_ms is 0,
+    otherwise in the background at that interval (group commit). A snapshot of all
+    collections is written every `snapshot_every` records or `snapshot_interval`
+    seconds; the WAL segments it covers are then removed. Startup loads the latest
+    snapshot and replays any newer WAL records, discarding a torn final line.
+    """
+
+    SNAPSHOT_FILE = "snapshot.json"
+    WAL_FILE = "wal.log"
+
+    def __init__(self, data_dir: str, fsync_interval_ms: int = 50, snapshot_every: int = 10000,
+                 snapshot_interval: int = 300):
+        self.data_dir = data_dir
+        self.fsync_interval_ms = fsync_interval_ms
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self._collections = {}
+        self._seq = 0
+        self._records_since_snapshot = 0
+        self._last_snapshot = time.monotonic()
+        self._dirty = False
+        self._snapshot_task = None
+        self._background_task = None
+        os.makedirs(data_dir, exist_ok=True)
+        self._recover()
+        self._wal = open(self._path(self.WAL_FILE), "a", encoding="utf-8")
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def collection(self, name: str, profile: str = None) -> EmbeddedCollection:
+        # Operation profiles only tune replica set behaviour; a single node ignores them
+        if name not in self._collections:
+            self._collections[name] = EmbeddedCollection(self, name)
+        return self._collections[name]
+
+    def timeout(self, profile: str):
+        return contextlib.nullcontext()
+
+    @property
+    def teams(self):
+        return self.collection("teams")
+
+    @property
+    def events(self):
+        return self.collection("events")
+
+    @property
+    def volunteers(self):
+        return self.collection("volunteers")
+
+    @property
+    def users(self):
+        return self.collection("users")
+
+    # --- Write-ahead log ---
+
+    def _journal(self, collection_name, changes):
+        self._seq += 1
+        self._wal.write(json_util.dumps({"seq": self._seq, "c": collection_name, "ch": changes}) + "\n")
+        self._wal.flush()
+        if self.fsync_interval_ms <= 0:
+            os.fsync(self._wal.fileno())
+        else:
+            self._dirty = True
+        self._records_since_snapshot += 1
+        if self._records_since_snapshot >= self.snapshot_every and self._snapshot_task is None:
+            try:
+                self._snapshot_task = asyncio.get_running_loop().create_task(self.snapshot())
+            except RuntimeError:
+                pass
+
+    def _replay_wal(self, path, snapshot_seq):
+        valid_bytes = 0
+        with open(path, "rb") as wal:
+            for line in wal:
+                try:
+                    record = json_util.loads(line.decode("utf-8"))
+                except ValueError:
+                    print(f"Embedded storage: discarding torn WAL record in {path} at byte {valid_bytes}")
+                    break
+                valid_bytes += len(line)
+                if record["seq"] <= snapshot_seq:
+                    continue
+                collection = self.collection(record["c"])
+                for change in record["ch"]:
+                    collection._replay(change)
+                self._seq = max(self._seq, record["seq"])
+                self._records_since_snapshot += 1
+        if valid_bytes < os.path.getsize(path):
+            with open(path, "r+b") as wal:
+                wal.truncate(valid_bytes)
+
+    def _recover(self):
+        snapshot_seq = 0
+        snapshot_path = self._path(self.SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "r", encoding="utf-8") as snapshot_file:
+                snapshot = json_util.loads(snapshot_file.read())
+            snapshot_seq = self._seq = snapshot["seq"]
+            for name, data in snapshot["collections"].items():
+                collection = self.collection(name)
+                for document in data["documents"]:
+                    collection._replay(["put", document])
+                for specification in data["indexes"]:
+                    collection._replay(["index", specification])
+        # Rotated segments (wal-<seq>.log) are older than the live log
+        segments = sorted(glob.glob(self._path("wal-*.log")), key=lambda path: int(re.findall(r"wal-(\d+)\.log$", path)[0]))
+        for path in segments + [self._path(self.WAL_FILE)]:
+            if os.path.exists(path):
+                self._replay_wal(path, snapshot_seq)
+        if self._seq:
+            print(f"Embedded storage recovered {sum(len(c._documents) for c in self._collections.values())} documents up to WAL sequence {self._seq}")
+
+    def _fsync(self):
+        if self._dirty:
+            self._dirty = False
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+
+    # --- Snapshots ---
+
+    @staticmethod
+    def _write_snapshot(path, seq, state):
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as snapshot_file:
+            snapshot_file.write(json_util.dumps({"seq": seq, "collections": state}))
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary_path, path)
+        directory = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    async def snapshot(self):
+        """Persist every collection and drop the WAL segments the snapshot covers"""
+        try:
+            # Capture a consistent state and rotate the log without yielding to other tasks
+            seq = self._seq
+            state = {
+                name: {"documents": list(collection._documents.values()),
+                       "indexes": [index.spec() for index in collection._indexes.values()]}
+                for name, collection in self._collections.items()
+            }
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            self._dirty = False
+            self._wal.close()
+            segment = self._path(f"wal-{seq}.log")
+            os.replace(self._path(self.WAL_FILE), segment)
+            self._wal = open(self._path(self.WAL_FILE), "a", encoding="utf-8")
+            self._records_since_snapshot = 0
+            self._last_snapshot = time.monotonic()
+
+            await asyncio.to_thread(self._write_snapshot, self._path(self.SNAPSHOT_FILE), seq, state)
+            for path in glob.glob(self._path("wal-*.log")):
+                if int(re.findall(r"wal-(\d+)\.log$", path)[0]) <= seq:
+                    os.remove(path)
+        finally:
+            self._snapshot_task = None
+
+    # --- Lifecycle ---
+
+    async def _background(self):
+        interval = self.fsync_interval_ms / 1000 if self.fsync_interval_ms > 0 else 1.0
+        last_expiry = 0.0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self._fsync()
+                now = time.monotonic()
+                if now - last_expiry >= 60:
+                    last_expiry = now
+                    for collection in list(self._collections.values()):
+                        collection._expire(datetime.utcnow())
+                if (self._records_since_snapshot and now - self._last_snapshot >= self.snapshot_interval
+                        and self._snapshot_task is None):
+                    self._snapshot_task = asyncio.get_running_loop().create_task(self.snapshot())
+            except Exception as background_e:
+                print(f"Embedded storage background error: {background_e}")
+
+    async def start(self):
+        if self._background_task is None:
+            self._background_task = asyncio.get_running_loop().create_task(self._background())
+
+    async def close(self):
+        if self._background_task is not None:
+            self._background_task.cancel()
+            self._background_task = None
+        if self._snapshot_task is not None:
+            await self._snapshot_task
+        if self._records_since_snapshot:
+            await self.snapshot()
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self._wal.close()
@@ -0,0 +1,43 @@
+"""The app runs against a throwaway embedded store; tests pick who is calling with client.act_as()."""
+import os
+import sys
+import tempfile
+
+for name, value in {
+    "CLIENT_ID": "test", "CLIENT_SECRET": "test", "TENANT_ID": "test",
+    "SESSION_SECRET_KEY": "test-session", "SECRET_KEY": "test-secret",
+    "STORAGE_BACKEND": "embedded", "SCAN_JOURNAL_ENABLED": "true",
+    # Keep the drainer from replaying the journal while the tests run
+    "SCAN_JOURNAL_DRAIN_INTERVAL_SECONDS": "3600",
+}.items():
+    os.environ[name] = value
+os.environ["EMBEDDED_DATA_DIR"] = tempfile.mkdtemp(prefix="embedded-")
+os.environ["SCAN_JOURNAL_PATH"] = os.path.join(tempfile.mkdtemp(prefix="journal-"), "scan_journal.sqlite3")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    # One app lifetime for the whole run: shutdown closes the embedded store for good
+    caller = {}
+    main.app.dependency_overrides[main.get_current_user] = lambda: caller
+
+    def act_as(name, role):
+        caller.clear()
+        caller.update({"name": name, "email": f"{name.lower()}@iiitb.ac.in", "rollNumber": name.upper(), "role": role})
+
+    with TestClient(main.app) as test_client:
+        test_client.act_as = act_as
+        yield test_client
+    main.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def client(app_client):
+    yield app_client
+    app_client.cookies.clear()
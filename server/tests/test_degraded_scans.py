@@ -0,0 +1,81 @@
+"""Scans while MongoDB is unreachable go to the scan journal, with or without an Idempotency-Key."""
+from datetime import datetime
+
+from pymongo.errors import ServerSelectionTimeoutError
+
+import main
+
+
+class UnreachableCollection:
+    """Every operation fails the way Motor does when no server can be selected."""
+
+    def __getattr__(self, name):
+        async def unreachable(*args, **kwargs):
+            raise ServerSelectionTimeoutError("No servers found yet")
+        return unreachable
+
+
+def test_keyed_scan_is_journaled_while_mongo_is_down(client, monkeypatch):
+    client.act_as("Admin", "admin")
+    event = client.post("/api/events", json={"event_name": "Quiz", "points": 10, "secret_code": "abc"}).json()["event"]
+    client.act_as("Alice", "participant")
+    team = client.post("/api/create_team", json={"team_name": "Offline"}).json()["team"]
+    client.act_as("Vol", "volunteer")
+    token = client.post("/api/volunteer/authorize", json={"event_id": event["event_id"], "secret_code": "abc"}).json()["token"]
+
+    async def award_scan_unreachable(*args):
+        raise ServerSelectionTimeoutError("No servers found yet")
+
+    monkeypatch.setattr(main, "award_scan", award_scan_unreachable)
+    # Leave the journal healthy for the tests that run after this one
+    monkeypatch.setattr(main.scan_journal, "degraded_until", main.scan_journal.degraded_until)
+    monkeypatch.setattr(main.idempotency_store, "collection", UnreachableCollection())
+
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "scan-1"}
+    response = client.post("/api/volunteer/scan", json={"team_id": team["qr_id"]}, headers=headers)
+    assert response.status_code == 202
+    assert response.json()["pending"] is True
+
+    # A retry cannot be replayed without the store, but the journal still refuses the second scan
+    retry = client.post("/api/volunteer/scan", json={"team_id": team["qr_id"]}, headers=headers)
+    assert retry.status_code == 400
+
+
+def journaled_row(row_id, event_id, qr_code):
+    return {"id": row_id, "team_key": f"qr:{qr_code}", "event_id": event_id, "qr_code": qr_code,
+            "volunteer": "vol@iiitb.ac.in", "scanned_at": datetime.utcnow().isoformat()}
+
+
+def test_replay_rejects_scans_for_events_expired_since(client):
+    client.act_as("Admin", "admin")
+    event = client.post("/api/events", json={"event_name": "Expires", "points": 10, "secret_code": "abc"}).json()["event"]
+    client.act_as("Bob", "participant")
+    team = client.post("/api/create_team", json={"team_name": "Late"}).json()["team"]
+    client.act_as("Admin", "admin")
+    client.put(f"/api/events/{event['event_id']}", json={"secret_code": "abc", "expired": True})
+
+    outcomes = client.portal.call(main.apply_journaled_scans, [journaled_row(1, event["event_id"], team["qr_id"])])
+    assert outcomes == {1: "Event expired"}
+    stored = client.portal.call(main.teams_collection.find_one, {"team_id": team["team_id"]})
+    assert stored["points"] == 0
+
+
+def test_replay_of_an_already_counted_scan_is_not_reported_as_applied(client):
+    client.act_as("Admin", "admin")
+    event = client.post("/api/events", json={"event_name": "Counted", "points": 10, "secret_code": "abc"}).json()["event"]
+    client.act_as("Carol", "participant")
+    team = client.post("/api/create_team", json={"team_name": "Twice"}).json()["team"]
+    client.act_as("Dan", "participant")
+    other = client.post("/api/create_team", json={"team_name": "Once"}).json()["team"]
+    # Counted online after the row was journaled
+    client.portal.call(main.award_scan, event["event_id"], "vol@iiitb.ac.in", team["qr_id"])
+
+    outcomes = client.portal.call(main.apply_journaled_scans, [
+        journaled_row(1, event["event_id"], team["qr_id"]),
+        journaled_row(2, event["event_id"], other["qr_id"]),
+    ])
+    assert outcomes == {1: "Team already participated in this event", 2: None}
+    stored = client.portal.call(main.teams_collection.find_one, {"team_id": team["team_id"]})
+    assert stored["points"] == 10
+    stored_event = client.portal.call(main.event_collection.find_one, {"event_id": event["event_id"]})
+    assert stored_event["participants"] == 2
@@ -0,0 +1,218 @@
+"""EmbeddedStorage: crash recovery from the WAL and snapshots, unique indexes, updates and $lookup."""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from storage import EmbeddedStorage
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def crash(storage):
+    """Drop the engine the way a killed process would: no snapshot, no clean close."""
+    storage._wal.close()
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    return str(tmp_path / "embedded")
+
+
+def open_storage(data_dir):
+    # Inline fsync: every acknowledged write is on disk before the call returns
+    return EmbeddedStorage(data_dir, fsync_interval_ms=0)
+
+
+async def all_teams(storage):
+    return await storage.teams.find({}, {"_id": 0}).sort("team_id", 1).to_list(None)
+
+
+def test_wal_is_replayed_after_a_crash(data_dir):
+    storage = open_storage(data_dir)
+
+    async def write():
+        await storage.teams.create_index("team_id", unique=True)
+        await storage.teams.insert_many([{"team_id": "t1", "points": 0}, {"team_id": "t2", "points": 0}])
+        await storage.teams.update_one({"team_id": "t1"}, {"$inc": {"points": 10}})
+        await storage.teams.delete_one({"team_id": "t2"})
+
+    run(write())
+    crash(storage)
+
+    recovered = open_storage(data_dir)
+    assert run(all_teams(recovered)) == [{"team_id": "t1", "points": 10}]
+    # The unique index came back with the data
+    with pytest.raises(DuplicateKeyError):
+        run(recovered.teams.insert_one({"team_id": "t1"}))
+    crash(recovered)
+
+
+def test_torn_last_wal_record_is_discarded(data_dir):
+    storage = open_storage(data_dir)
+    run(storage.teams.insert_one({"team_id": "t1", "points": 5}))
+    crash(storage)
+    wal_path = os.path.join(data_dir, EmbeddedStorage.WAL_FILE)
+    intact_size = os.path.getsize(wal_path)
+    # The process died halfway through appending the next record
+    with open(wal_path, "ab") as wal:
+        wal.write(b'{"seq": 2, "c": "teams", "ch": [["put", {"team_id": "t2"')
+
+    recovered = open_storage(data_dir)
+    assert run(all_teams(recovered)) == [{"team_id": "t1", "points": 5}]
+    assert os.path.getsize(wal_path) == intact_size
+
+    # New records are appended after the truncated tail and survive the next crash
+    run(recovered.teams.insert_one({"team_id": "t3", "points": 1}))
+    crash(recovered)
+    again = open_storage(data_dir)
+    assert run(all_teams(again)) == [{"team_id": "t1", "points": 5}, {"team_id": "t3", "points": 1}]
+    crash(again)
+
+
+def test_snapshot_plus_wal_tail(data_dir):
+    storage = open_storage(data_dir)
+
+    async def write():
+        await storage.teams.create_index("team_name", unique=True)
+        await storage.teams.insert_one({"team_id": "t1", "team_name": "Alpha", "points": 1})
+        await storage.snapshot()
+        # Only in the WAL written after the snapshot
+        await storage.teams.update_one({"team_id": "t1"}, {"$set": {"points": 2}})
+        await storage.teams.insert_one({"team_id": "t2", "team_name": "Beta", "points": 3})
+
+    run(write())
+    crash(storage)
+    assert os.path.exists(os.path.join(data_dir, EmbeddedStorage.SNAPSHOT_FILE))
+    # Segments covered by the snapshot were removed
+    assert not [name for name in os.listdir(data_dir) if name.startswith("wal-")]
+
+    recovered = open_storage(data_dir)
+    assert run(all_teams(recovered)) == [
+        {"team_id": "t1", "team_name": "Alpha", "points": 2},
+        {"team_id": "t2", "team_name": "Beta", "points": 3},
+    ]
+    with pytest.raises(DuplicateKeyError):
+        run(recovered.teams.insert_one({"team_id": "t3", "team_name": "Beta"}))
+    crash(recovered)
+
+
+def test_unique_violation_reports_key_pattern(data_dir):
+    storage = open_storage(data_dir)
+
+    async def scenario():
+        await storage.teams.create_index("team_name", unique=True)
+        await storage.teams.insert_one({"team_id": "t1", "team_name": "Alpha"})
+        with pytest.raises(DuplicateKeyError) as duplicate:
+            await storage.teams.insert_one({"team_id": "t2", "team_name": "Alpha"})
+        assert duplicate.value.details["keyPattern"] == {"team_name": 1}
+        assert duplicate.value.details["keyValue"] == {"team_name": "Alpha"}
+        # The rejected write changed nothing
+        assert await storage.teams.count_documents({}) == 1
+
+    run(scenario())
+    crash(storage)
+
+
+def test_partial_unique_index_only_covers_matching_documents(data_dir):
+    storage = open_storage(data_dir)
+
+    async def scenario():
+        await storage.teams.create_index("members.email", unique=True,
+                                         partialFilterExpression={"members.email": {"$exists": True}})
+        # Teams without members are outside the index, so any number of them is allowed
+        await storage.teams.insert_many([{"team_id": "t1", "members": []}, {"team_id": "t2", "members": []}])
+        await storage.teams.update_one({"team_id": "t1"}, {"$push": {"members": {"email": "a@iiitb.ac.in"}}})
+        with pytest.raises(DuplicateKeyError) as duplicate:
+            await storage.teams.update_one({"team_id": "t2"}, {"$push": {"members": {"email": "a@iiitb.ac.in"}}})
+        assert duplicate.value.details["keyPattern"] == {"members.email": 1}
+        assert await storage.teams.find_one({"team_id": "t2"}, {"_id": 0}) == {"team_id": "t2", "members": []}
+
+    run(scenario())
+    crash(storage)
+
+
+def test_update_operators_and_upsert(data_dir):
+    storage = open_storage(data_dir)
+
+    async def scenario():
+        teams = storage.teams
+        await teams.insert_one({"team_id": "t1", "points": 5, "events_participated": ["e1"]})
+        await teams.update_one({"team_id": "t1"}, {"$inc": {"points": 10}, "$push": {"events_participated": "e2"}})
+        await teams.update_one({"team_id": "t1"}, {"$pull": {"events_participated": "e1"}})
+        assert await teams.find_one({"team_id": "t1"}, {"_id": 0}) == \
+            {"team_id": "t1", "points": 15, "events_participated": ["e2"]}
+
+        # $setOnInsert applies only when the upsert inserts
+        update = {"$setOnInsert": {"points": 0}, "$inc": {"scans": 1}}
+        result = await teams.update_one({"team_id": "t2"}, update, upsert=True)
+        assert result.upserted_id is not None
+        result = await teams.update_one({"team_id": "t2"}, {**update, "$setOnInsert": {"points": 99}}, upsert=True)
+        assert result.upserted_id is None and result.modified_count == 1
+        assert await teams.find_one({"team_id": "t2"}, {"_id": 0}) == {"team_id": "t2", "points": 0, "scans": 2}
+
+    run(scenario())
+    crash(storage)
+
+
+def test_find_one_and_update_return_document(data_dir):
+    storage = open_storage(data_dir)
+
+    async def scenario():
+        teams = storage.teams
+        await teams.insert_one({"team_id": "t1", "points": 1})
+        before = await teams.find_one_and_update({"team_id": "t1"}, {"$inc": {"points": 1}}, {"_id": 0},
+                                                 return_document=ReturnDocument.BEFORE)
+        after = await teams.find_one_and_update({"team_id": "t1"}, {"$inc": {"points": 1}}, {"_id": 0},
+                                                return_document=ReturnDocument.AFTER)
+        assert before == {"team_id": "t1", "points": 1}
+        assert after == {"team_id": "t1", "points": 3}
+        assert await teams.find_one_and_update({"team_id": "missing"}, {"$inc": {"points": 1}}) is None
+        upserted = await teams.find_one_and_update({"team_id": "t2"}, {"$setOnInsert": {"points": 0}}, {"_id": 0},
+                                                   upsert=True, return_document=ReturnDocument.AFTER)
+        assert upserted == {"team_id": "t2", "points": 0}
+
+    run(scenario())
+    crash(storage)
+
+
+def test_lookup_with_local_field_and_pipeline(data_dir):
+    storage = open_storage(data_dir)
+
+    async def scenario():
+        await storage.events.insert_many([
+            {"event_id": "e1", "event_name": "Quiz", "points": 10, "secret_code": "x"},
+            {"event_id": "e2", "event_name": "Hunt", "points": 20, "secret_code": "y"},
+            {"event_id": "e3", "event_name": "Unvisited", "points": 30, "secret_code": "z"},
+        ])
+        await storage.teams.insert_many([
+            {"team_id": "t1", "events_participated": ["e1", "e2"]},
+            {"team_id": "t2", "events_participated": []},
+        ])
+        teams = await storage.teams.aggregate([
+            {"$match": {"team_id": {"$in": ["t1", "t2"]}}},
+            {"$lookup": {
+                "from": "events",
+                "localField": "events_participated",
+                "foreignField": "event_id",
+                "pipeline": [{"$project": {"_id": 0, "event_id": 1, "event_name": 1}}],
+                "as": "participated_events",
+            }},
+            {"$project": {"_id": 0, "team_id": 1, "participated_events": 1}},
+        ]).to_list(None)
+        by_team = {team["team_id"]: team["participated_events"] for team in teams}
+        assert sorted(by_team["t1"], key=lambda event: event["event_id"]) == [
+            {"event_id": "e1", "event_name": "Quiz"}, {"event_id": "e2", "event_name": "Hunt"}]
+        assert by_team["t2"] == []
+        # The pipeline ran on copies; the stored events keep their secret codes
+        assert (await storage.events.find_one({"event_id": "e1"}))["secret_code"] == "x"
+
+    run(scenario())
+    crash(storage)
@@ -0,0 +1,88 @@
+"""Idempotency-Key: replay, body mismatch, in-flight retries and lock takeover."""
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import main
+from idempotency import IdempotencyStore
+
+
+def scan_setup(client, name):
+    client.act_as("Admin", "admin")
+    event = client.post("/api/events", json={"event_name": f"Event {name}", "points": 10, "secret_code": "abc"}).json()["event"]
+    client.act_as(name, "participant")
+    team = client.post("/api/create_team", json={"team_name": f"Team {name}"}).json()["team"]
+    client.act_as("Vol", "volunteer")
+    token = client.post("/api/volunteer/authorize", json={"event_id": event["event_id"], "secret_code": "abc"}).json()["token"]
+    return team, {"Authorization": f"Bearer {token}"}
+
+
+def test_retry_with_the_same_key_replays_the_first_response(client):
+    team, headers = scan_setup(client, "Replay")
+    headers = {**headers, "Idempotency-Key": "replay-1"}
+
+    first = client.post("/api/volunteer/scan", json={"team_id": team["qr_id"]}, headers=headers)
+    retry = client.post("/api/volunteer/scan", json={"team_id": team["qr_id"]}, headers=headers)
+
+    assert first.status_code == 200 and "idempotent-replayed" not in first.headers
+    # Without the replay the second scan would be rejected as already participated
+    assert retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    stored = client.portal.call(main.teams_collection.find_one, {"team_id": team["team_id"]})
+    assert stored["points"] == 10
+
+
+def test_same_key_with_a_different_body_is_rejected(client):
+    team, headers = scan_setup(client, "Mismatch")
+    headers = {**headers, "Idempotency-Key": "mismatch-1"}
+
+    client.post("/api/volunteer/scan", json={"team_id": team["qr_id"]}, headers=headers)
+    other = client.post("/api/volunteer/scan", json={"team_id": team["qr_id"] + "x"}, headers=headers)
+
+    assert other.status_code == 422
+
+
+def test_retry_while_the_first_request_runs_gets_409(client, monkeypatch):
+    team, headers = scan_setup(client, "InFlight")
+    headers = {**headers, "Idempotency-Key": "in-flight-1"}
+    entered, release = threading.Event(), threading.Event()
+    award_scan = main.award_scan
+
+    async def slow_award_scan(*args):
+        entered.set()
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return await award_scan(*args)
+
+    monkeypatch.setattr(main, "award_scan", slow_award_scan)
+    responses = {}
+    first = threading.Thread(target=lambda: responses.setdefault(
+        "first", client.post("/api/volunteer/scan", json={"team_id": team["qr_id"]}, headers=headers)))
+    first.start()
+    assert entered.wait(5)
+
+    retry = client.post("/api/volunteer/scan", json={"team_id": team["qr_id"]}, headers=headers)
+    release.set()
+    first.join(5)
+
+    assert retry.status_code == 409
+    assert responses["first"].status_code == 200
+    after = client.post("/api/volunteer/scan", json={"team_id": team["qr_id"]}, headers=headers)
+    assert after.status_code == 200 and after.headers["idempotent-replayed"] == "true"
+
+
+def test_pending_key_is_taken_over_after_the_lock_timeout(client):
+    store = IdempotencyStore(main.storage.collection("idempotency_keys"), ttl_seconds=3600, lock_timeout_seconds=30)
+
+    assert client.portal.call(store.claim, "takeover-1", "body") is None
+    # A retry inside the lock timeout sees the pending record
+    assert client.portal.call(store.claim, "takeover-1", "body")["state"] == "pending"
+
+    # The first attempt died: its record stays pending past the lock timeout
+    stale = datetime.utcnow() - timedelta(seconds=60)
+    client.portal.call(store.collection.update_one, {"_id": "takeover-1"}, {"$set": {"started_at": stale}})
+    assert client.portal.call(store.claim, "takeover-1", "body") is None
+    record = client.portal.call(store.collection.find_one, {"_id": "takeover-1"})
+    assert record["started_at"] > stale
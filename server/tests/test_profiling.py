@@ -0,0 +1,60 @@
+"""ProfilingMiddleware: overlapping cprofile requests, and storing profiles off the event loop."""
+import asyncio
+
+from profiling import ProfileStore, ProfilingMiddleware
+
+
+def admin_scope(path):
+    return {"type": "http", "method": "GET", "path": path, "query_string": b"__profile=cprofile",
+            "headers": [], "session": {"user": {"role": "admin"}}}
+
+
+async def profiled_requests(middleware, paths):
+    release = asyncio.Event()
+    entered = []
+
+    async def app(scope, receive, send):
+        entered.append(scope["path"])
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    middleware.app = app
+    sent = {path: [] for path in paths}
+
+    async def request(path):
+        async def send(message):
+            sent[path].append(message)
+        await middleware(admin_scope(path), None, send)
+
+    tasks = [asyncio.create_task(request(path)) for path in paths]
+    while len(entered) < len(paths):
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*tasks)
+    return sent
+
+
+def test_overlapping_cprofile_requests_fall_back_to_sampling(tmp_path):
+    store = ProfileStore(str(tmp_path), max_files=10)
+    middleware = ProfilingMiddleware(None, store, sample_interval_ms=1)
+
+    sent = asyncio.run(profiled_requests(middleware, ["/first", "/second"]))
+
+    entries = {entry["path"]: entry for entry in store.list()}
+    assert entries["/first"]["mode"] == "cprofile"
+    assert entries["/second"]["mode"] == "sample"
+    assert entries["/second"]["requested_mode"] == "cprofile"
+    for path, entry in entries.items():
+        assert (tmp_path / entry["filename"]).exists()
+        assert (b"x-profile-id", entry["name"].encode()) in sent[path][0]["headers"]
+
+
+def test_cprofile_is_available_again_after_a_capture(tmp_path):
+    store = ProfileStore(str(tmp_path), max_files=10)
+    middleware = ProfilingMiddleware(None, store, sample_interval_ms=1)
+
+    asyncio.run(profiled_requests(middleware, ["/first"]))
+    asyncio.run(profiled_requests(middleware, ["/second"]))
+
+    assert {entry["path"]: entry["mode"] for entry in store.list()} == {"/first": "cprofile", "/second": "cprofile"}
@@ -0,0 +1,74 @@
+"""ResponseCache: single-flight misses, and invalidation of computations already running."""
+import asyncio
+
+import main
+from response_cache import ResponseCache
+
+
+def counting_endpoint(cache, release=None):
+    calls = []
+
+    @cache.cached("teams", ttl=60, stale=0)
+    async def endpoint():
+        calls.append(len(calls) + 1)
+        call = len(calls)
+        if release is not None:
+            await release.wait()
+        return {"call": call}
+
+    return endpoint, calls
+
+
+def test_concurrent_misses_share_one_computation():
+    async def scenario():
+        cache = ResponseCache(max_bytes=1 << 20)
+        release = asyncio.Event()
+        endpoint, calls = counting_endpoint(cache, release)
+        waiters = [asyncio.ensure_future(endpoint()) for _ in range(10)]
+        await asyncio.sleep(0)
+        release.set()
+        responses = await asyncio.gather(*waiters)
+        assert calls == [1]
+        assert {response.body for response in responses} == {b'{"call":1}'}
+        # Stored once the computation finished
+        assert (await endpoint()).headers["X-Cache"] == "HIT"
+
+    asyncio.run(scenario())
+
+
+def test_invalidation_during_a_computation_keeps_its_result_out_of_the_cache():
+    async def scenario():
+        cache = ResponseCache(max_bytes=1 << 20)
+        release = asyncio.Event()
+        endpoint, calls = counting_endpoint(cache, release)
+        before_write = asyncio.ensure_future(endpoint())
+        await asyncio.sleep(0)
+
+        cache.invalidate("teams")
+        # A caller arriving after the write does not join the stale computation
+        after_write = asyncio.ensure_future(endpoint())
+        await asyncio.sleep(0)
+        release.set()
+
+        assert (await before_write).body == b'{"call":1}'
+        assert (await after_write).body == b'{"call":2}'
+        assert calls == [1, 2]
+        cached = await endpoint()
+        assert cached.headers["X-Cache"] == "HIT" and cached.body == b'{"call":2}'
+
+    asyncio.run(scenario())
+
+
+def test_scans_refresh_the_cached_participant_counts(client):
+    client.act_as("Admin", "admin")
+    event = client.post("/api/events", json={"event_name": "Counted live", "points": 1, "secret_code": "abc"}).json()["event"]
+    client.act_as("Erin", "participant")
+    team = client.post("/api/create_team", json={"team_name": "Live count"}).json()["team"]
+
+    def participants():
+        events = client.get("/api/events").json()["events"]
+        return next(listed.get("participants", 0) for listed in events if listed["event_id"] == event["event_id"])
+
+    assert participants() == 0
+    client.portal.call(main.perform_scan, event["event_id"], "vol@iiitb.ac.in", team["qr_id"])
+    assert participants() == 1
@@ -0,0 +1,99 @@
+"""/ws/volunteer/scan: authentication, scanning, binary frames and backpressure."""
+import asyncio
+import threading
+import time
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import main
+
+
+@pytest.fixture
+def channel(client, monkeypatch):
+    """(event, team, token) with the WebSocket session belonging to a volunteer"""
+    session_user = {"name": "Vol", "email": "vol@iiitb.ac.in", "rollNumber": "VOL", "role": "volunteer"}
+    monkeypatch.setitem(main.app.dependency_overrides, main.websocket_user, lambda: session_user)
+    client.act_as("Admin", "admin")
+    event = client.post("/api/events", json={"event_name": f"WS {time.monotonic()}", "points": 7, "secret_code": "abc"}).json()["event"]
+    client.act_as(f"Ws{time.monotonic_ns()}", "participant")
+    team = client.post("/api/create_team", json={"team_name": f"WS team {time.monotonic_ns()}"}).json()["team"]
+    client.act_as("Vol", "volunteer")
+    token = client.post("/api/volunteer/authorize", json={"event_id": event["event_id"], "secret_code": "abc"}).json()["token"]
+    client.session_user = session_user
+    return event, team, token
+
+
+def test_session_role_and_event_token_are_checked(client, channel):
+    _, _, token = channel
+    with client.websocket_connect("/ws/volunteer/scan") as websocket:
+        websocket.send_json({"type": "auth", "token": token + "x"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 1008
+
+    client.session_user["role"] = "participant"
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect("/ws/volunteer/scan"):
+            pass
+    assert refused.value.code == 1008
+
+
+def test_scan_over_the_channel(client, channel):
+    event, team, token = channel
+    with client.websocket_connect("/ws/volunteer/scan") as websocket:
+        websocket.send_json({"type": "auth", "token": token})
+        assert websocket.receive_json() == {"type": "ready", "event_id": event["event_id"]}
+
+        websocket.send_json({"id": "a", "team_id": team["qr_id"]})
+        result = websocket.receive_json()
+        assert result["id"] == "a" and result["ok"] is True and result["points_awarded"] == 7
+
+        websocket.send_json({"id": "b", "team_id": team["qr_id"]})
+        repeat = websocket.receive_json()
+        assert repeat["ok"] is False and repeat["status"] == 400
+
+        websocket.send_json({"type": "ping", "id": "p"})
+        assert websocket.receive_json() == {"type": "pong", "id": "p"}
+
+
+@pytest.mark.parametrize("authenticated", [False, True])
+def test_binary_frames_close_the_channel(client, channel, authenticated):
+    _, _, token = channel
+    with client.websocket_connect("/ws/volunteer/scan") as websocket:
+        if authenticated:
+            websocket.send_json({"type": "auth", "token": token})
+            websocket.receive_json()
+        websocket.send_bytes(b"\x00\x01")
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 1003
+
+
+def test_a_full_scan_queue_stops_reading_the_socket(client, channel, monkeypatch):
+    _, team, token = channel
+    monkeypatch.setattr(main, "WS_SCAN_CONCURRENCY", 1)
+    monkeypatch.setattr(main, "WS_SCAN_QUEUE_SIZE", 2)
+    release = threading.Event()
+
+    async def slow_scan(event_id, volunteer_email, qr_code):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return {"scanned": qr_code}
+
+    monkeypatch.setattr(main, "perform_scan", slow_scan)
+    with client.websocket_connect("/ws/volunteer/scan") as websocket:
+        websocket.send_json({"type": "auth", "token": token})
+        websocket.receive_json()
+        # One scan runs, two wait in the queue, and the reader blocks handing over the fourth
+        for scan_id in range(1, 5):
+            websocket.send_json({"id": scan_id, "team_id": team["qr_id"]})
+        websocket.send_json({"type": "ping", "id": "p"})
+        time.sleep(0.2)
+        release.set()
+
+        frames = [websocket.receive_json() for _ in range(5)]
+    # The ping was not read, let alone answered, until the queue had room again
+    assert frames[0] == {"id": 1, "ok": True, "scanned": team["qr_id"]}
+    assert sorted(frame["id"] for frame in frames if "ok" in frame) == [1, 2, 3, 4]
+    assert {"type": "pong", "id": "p"} in frames
@@ -0,0 +1,36 @@
+"""Season rollover boundary: creation time, not ObjectId order."""
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from seasons import SeasonArchiver
+from storage import EmbeddedStorage
+
+
+def test_rollover_moves_documents_created_before_it_started(tmp_path):
+    async def scenario():
+        storage = EmbeddedStorage(str(tmp_path))
+        archiver = SeasonArchiver(storage, batch_size=2)
+        teams = storage.teams
+        earlier = datetime.utcnow() - timedelta(days=1)
+        await teams.insert_many([
+            {"team_id": f"old-{i}", "team_name": f"Old {i}", "points": i, "created_at": earlier} for i in range(5)
+        ] + [{"team_id": "legacy", "team_name": "Legacy", "points": 0}])
+        await storage.events.insert_one({"event_id": "e-old", "event_name": "Old", "created_at": earlier})
+
+        await archiver.begin("2025", "admin@iiitb.ac.in")
+        # Another worker's team, created after the rollover began but with an ObjectId from the same second
+        # that sorts below the ones already stored
+        await teams.insert_one({"_id": ObjectId.from_datetime(earlier), "team_id": "new", "team_name": "New",
+                                "points": 0, "created_at": datetime.utcnow() + timedelta(milliseconds=1)})
+        checkpoint = await archiver.run("2025")
+
+        assert checkpoint["state"] == "done"
+        assert checkpoint["moved"] == {"teams": 6, "events": 1}
+        assert [team["team_id"] for team in await teams.find({}).to_list(None)] == ["new"]
+        archived = await storage.collection("teams_archive").find({"season": "2025"}).to_list(None)
+        assert sorted(team["team_id"] for team in archived) == ["legacy"] + [f"old-{i}" for i in range(5)]
+        await storage.close()
+
+    asyncio.run(scenario())
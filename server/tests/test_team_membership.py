@@ -0,0 +1,82 @@
+"""Atomic team join/leave: the member cap, no duplicate members, and deleting an emptied team."""
+import asyncio
+
+import httpx
+from fastapi import Request
+
+import main
+
+
+def header_user(request: Request):
+    name = request.headers["x-test-user"]
+    return {"name": name, "email": f"{name.lower()}@iiitb.ac.in", "rollNumber": name.upper(), "role": "participant"}
+
+
+async def concurrent_joins(join_code, names):
+    """Send every join at once, each as its own user, on the app's event loop."""
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await asyncio.gather(*(
+            http.post("/api/join_team_by_code", json={"join_code": join_code}, headers={"x-test-user": name})
+            for name in names
+        ))
+
+
+def create_team(client, owner, team_name):
+    client.act_as(owner, "participant")
+    return client.post("/api/create_team", json={"team_name": team_name}).json()["team"]
+
+
+def test_racing_joins_for_the_last_slot_admit_exactly_one(client, monkeypatch):
+    team = create_team(client, "CapOwner", "Capped")
+    client.act_as("CapSecond", "participant")
+    assert client.post("/api/join_team_by_code", json={"join_code": team["join_code"]}).status_code == 200
+
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_current_user, header_user)
+    racers = [f"CapRacer{i}" for i in range(8)]
+    responses = client.portal.call(concurrent_joins, team["join_code"], racers)
+
+    assert sorted(response.status_code for response in responses) == [200] + [400] * 7
+    assert all("Team is full" in response.json()["message"] for response in responses if response.status_code == 400)
+    stored = client.portal.call(main.teams_collection.find_one, {"team_id": team["team_id"]})
+    assert len(stored["members"]) == main.MAX_TEAM_SIZE
+
+
+def test_concurrent_joins_by_one_user_add_them_once(client, monkeypatch):
+    team = create_team(client, "DupOwner", "NoDuplicates")
+
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_current_user, header_user)
+    responses = client.portal.call(concurrent_joins, team["join_code"], ["DupJoiner"] * 4)
+
+    assert sorted(response.status_code for response in responses) == [200, 400, 400, 400]
+    stored = client.portal.call(main.teams_collection.find_one, {"team_id": team["team_id"]})
+    assert [member["email"] for member in stored["members"]] == ["dupowner@iiitb.ac.in", "dupjoiner@iiitb.ac.in"]
+
+
+def test_member_of_another_team_cannot_join(client):
+    create_team(client, "Loyal", "First")
+    other = create_team(client, "OtherOwner", "Second")
+
+    client.act_as("Loyal", "participant")
+    response = client.post("/api/join_team_by_code", json={"join_code": other["join_code"]})
+
+    assert response.status_code == 400
+    assert response.json()["message"] == "Already belongs to another team"
+
+
+def test_last_member_leaving_deletes_the_team(client):
+    team = create_team(client, "Leaver", "Emptied")
+    client.act_as("Stayer", "participant")
+    client.post("/api/join_team_by_code", json={"join_code": team["join_code"]})
+
+    response = client.post("/api/leave_team", json={"team_id": team["team_id"]})
+    assert response.json()["team"]["members"][0]["email"] == "leaver@iiitb.ac.in"
+
+    client.act_as("Leaver", "participant")
+    response = client.post("/api/leave_team", json={"team_id": team["team_id"]})
+    assert response.status_code == 200
+    assert response.json()["team"] is None
+    assert client.portal.call(main.teams_collection.find_one, {"team_id": team["team_id"]}) is None
+
+    # The name is free again once the team is gone
+    assert create_team(client, "Leaver", "Emptied")["team_name"] == "Emptied"
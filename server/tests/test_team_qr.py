@@ -0,0 +1,98 @@
+"""Signed team QR payloads: verification, tampering, legacy codes and key versions."""
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+TEAM_ID = str(uuid.UUID("12345678-1234-5678-1234-567812345678"))
+
+
+def test_signed_code_resolves_to_its_team():
+    qr_id = main.generate_team_qr_id(TEAM_ID)
+
+    assert qr_id.startswith(f"{main.QR_SIGNING_KEY_VERSION}.")
+    assert main.verify_team_qr_id(qr_id) == TEAM_ID
+    assert main.team_lookup_filter(qr_id) == {"team_id": TEAM_ID}
+
+
+def tampered_codes():
+    version, team_text, signature_text = main.generate_team_qr_id(TEAM_ID).split(".")
+    other_team = main._b64encode(uuid.uuid4().bytes)
+    flipped = ("A" if signature_text[0] != "A" else "B") + signature_text[1:]
+    return {
+        "other team, same signature": f"{version}.{other_team}.{signature_text}",
+        "flipped signature": f"{version}.{team_text}.{flipped}",
+        "truncated signature": f"{version}.{team_text}.{signature_text[:-2]}",
+        "missing signature": f"{version}.{team_text}",
+        "truncated team": f"{version}.{team_text[:-3]}.{signature_text}",
+        "extra part": f"{version}.{team_text}.{signature_text}.x",
+        "non-numeric version": f"v{version}.{team_text}.{signature_text}",
+        "not base64": f"{version}.{team_text}.!!{signature_text[2:]}",
+    }
+
+
+@pytest.mark.parametrize("case", sorted(tampered_codes()))
+def test_tampered_or_truncated_codes_are_rejected(case):
+    qr_id = tampered_codes()[case]
+
+    assert main.verify_team_qr_id(qr_id) is None
+    with pytest.raises(HTTPException) as rejected:
+        main.team_lookup_filter(qr_id)
+    assert rejected.value.status_code == 400
+
+
+def test_legacy_sixteen_character_codes_are_still_accepted():
+    legacy = main.generate_legacy_team_qr_id(TEAM_ID)
+
+    assert len(legacy) == 16
+    assert main.team_lookup_filter(legacy) == {"$or": [{"qr_id": legacy}, {"legacy_qr_id": legacy}]}
+    for malformed in (legacy[:15], legacy + "A", legacy[:15] + "."):
+        with pytest.raises(HTTPException):
+            main.team_lookup_filter(malformed)
+
+
+def test_legacy_code_scans_the_team_it_was_issued_to(client):
+    team_id = str(uuid.uuid4())
+    legacy = main.generate_legacy_team_qr_id(team_id)
+    client.portal.call(main.teams_collection.insert_one, {
+        "team_id": team_id, "team_name": "Legacy QR", "qr_id": legacy, "members": [], "points": 0,
+        "events_participated": [],
+    })
+    client.act_as("Admin", "admin")
+    event = client.post("/api/events", json={"event_name": "Legacy scan", "points": 5, "secret_code": "abc"}).json()["event"]
+
+    result = client.portal.call(main.award_scan, event["event_id"], "vol@iiitb.ac.in", legacy)
+
+    assert result["team_points"] == 5
+
+
+def test_rotated_key_versions(monkeypatch):
+    monkeypatch.setattr(main, "QR_KEYS", {1: b"retiring key", 2: b"current key"})
+    monkeypatch.setattr(main, "QR_SIGNING_KEY_VERSION", 2)
+    old_code = main.generate_team_qr_id(TEAM_ID, version=1)
+    new_code = main.generate_team_qr_id(TEAM_ID)
+
+    # Codes from both configured versions verify; only the old one is due an upgrade
+    assert new_code.startswith("2.")
+    assert main.verify_team_qr_id(old_code) == main.verify_team_qr_id(new_code) == TEAM_ID
+    assert main.qr_id_needs_upgrade(old_code) and not main.qr_id_needs_upgrade(new_code)
+    assert main.qr_id_upgrade({"team_id": TEAM_ID, "qr_id": old_code}) == {"qr_id": new_code}
+
+    # A signature only verifies under the key version it names
+    _, team_text, signature_text = old_code.split(".")
+    assert main.verify_team_qr_id(f"2.{team_text}.{signature_text}") is None
+
+    # Once a version is retired its codes stop verifying
+    monkeypatch.setattr(main, "QR_KEYS", {2: b"current key"})
+    assert main.verify_team_qr_id(old_code) is None
+
+
+def test_upgrading_an_unsigned_code_keeps_it_scannable():
+    legacy = main.generate_legacy_team_qr_id(TEAM_ID)
+
+    update = main.qr_id_upgrade({"team_id": TEAM_ID, "qr_id": legacy})
+
+    assert update == {"qr_id": main.generate_team_qr_id(TEAM_ID), "legacy_qr_id": legacy}
+    assert main.qr_id_needs_upgrade(legacy) and main.qr_id_needs_upgrade(None)
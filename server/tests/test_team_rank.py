@@ -0,0 +1,20 @@
+"""team_rank_summary never ranks a team against a stale copy of itself."""
+import main
+
+
+def test_lagging_copy_of_the_team_is_not_its_own_neighbour(client):
+    client.portal.call(main.teams_collection.insert_many, [
+        {"team_id": "rank-a", "team_name": "Rank A", "points": 20000},
+        {"team_id": "rank-self", "team_name": "Rank Self", "points": 22000},
+    ])
+    # The replica still shows 22000 while the team has already reached 25000
+    summary = client.portal.call(main.team_rank_summary, "rank-self", 25000)
+    assert summary["rank"] == 1
+    assert summary["previous_team"] == "Rank A"
+    assert summary["lead_over_previous_rank"] == 5000
+
+    # After a downward adjustment the replica can show the team above its real points
+    summary = client.portal.call(main.team_rank_summary, "rank-self", 21000)
+    assert summary["rank"] == 1
+    assert summary["next_team"] is None
+    assert summary["previous_team"] == "Rank A"